@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import time
+import warnings
+warnings.filterwarnings("ignore")
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import default_collate
+from torchvision import transforms
+
+from utility import noise, noise_functions
+from utility.benchmarking import percentile
+from utility.phantoms import write_phantoms
+from utility.special_utils import loadData
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the data pipeline: every loading stage on its own and loadData end to end')
+    parser.add_argument('--source', default=None, help='directory of images to build the synthetic datasets from, phantoms if not given')
+    parser.add_argument('--pool', type=int, default=64, help='distinct phantoms generated when no source is given')
+    parser.add_argument('--source-size', type=int, default=512, help='side of the phantoms')
+    parser.add_argument('--image-size', type=int, default=256, help='the resolution loadData resizes to')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000], help='dataset sizes in files')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, 8])
+    parser.add_argument('--backends', nargs='+', choices=['png', 'cache', 'shards'], default=['png', 'cache', 'shards'])
+    parser.add_argument('--noise', action='store_true', help='apply the training noise in the end-to-end runs')
+    parser.add_argument('--max-batches', type=int, default=200, help='batches read per end-to-end measurement')
+    parser.add_argument('--max-cache-gb', type=float, default=20, help='skip the cache backend when its array would be larger')
+    parser.add_argument('--iters', type=int, default=50, help='repetitions of every stage timing')
+    parser.add_argument('--work-dir', default='benchmarks/data', help='where the synthetic datasets, caches and shards are written')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic datasets for the next run')
+    parser.add_argument('--output', default=None, help='JSON file, benchmarks/data-<host>-<time>.json by default')
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu')
+    output = args.output or os.path.join('benchmarks', f'data-{platform.node()}-{time.strftime("%Y%m%d-%H%M%S")}.json')
+    report = {
+        'host': platform.node(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'torch': torch.__version__,
+        'device': str(device), 'image_size': args.image_size, 'batch_size': args.batch_size, 'stages': {}, 'end_to_end': [],
+    }
+
+    # ------------------------------ Source pool ---------------------------- #
+    pool_dir = os.path.join(args.work_dir, f'pool_{args.source_size}')
+    if args.source:
+        pool = sorted(os.path.join(args.source, name) for name in os.listdir(args.source))
+    else:
+        if not os.path.isdir(pool_dir) or len(os.listdir(pool_dir)) != args.pool:
+            write_phantoms(pool_dir, args.pool, args.source_size, workers=1)
+        pool = sorted(os.path.join(pool_dir, name) for name in os.listdir(pool_dir))
+
+    def make_dataset(size):
+        '''A directory of size files hard-linked to the pool, so a million files costs inodes rather than disk'''
+        directory = os.path.join(args.work_dir, f'files_{size}')
+        if os.path.isdir(directory) and len(os.listdir(directory)) == size:
+            return directory
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        for i in range(size):
+            source, target = os.path.abspath(pool[i % len(pool)]), os.path.join(directory, f'{i:07d}.png')
+            try:
+                os.link(source, target)
+            except OSError:
+                # e.g. the pool is on another file system
+                os.symlink(source, target)
+        return directory
+
+    # ------------------------------- Stages -------------------------------- #
+    def time_stage(name, function, inputs):
+        '''Times function on every input in turn, repeating the inputs for args.iters calls'''
+        latencies = []
+        for i in range(args.iters):
+            x = inputs[i % len(inputs)]
+            start = time.perf_counter()
+            function(x)
+            latencies.append(time.perf_counter() - start)
+        report['stages'][name] = {'mean_ms': sum(latencies) / len(latencies) * 1000, 'p50_ms': percentile(latencies, 50) * 1000,
+                                  'p95_ms': percentile(latencies, 95) * 1000}
+        print(f'{name:<44}{report["stages"][name]["mean_ms"]:>10.3f}{report["stages"][name]["p50_ms"]:>10.3f}{report["stages"][name]["p95_ms"]:>10.3f}')
+
+    def decode(path):
+        with Image.open(path) as image:
+            return image.convert('L')
+
+    print(f'Stages on {args.source_size}px sources resized to {args.image_size}px, batch size {args.batch_size}, device {device}\n')
+    print(f'{"Stage":<44}{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}')
+    decoded = [decode(path) for path in pool[:16]]
+    resize = transforms.Resize((args.image_size, args.image_size))
+    resized = [resize(image) for image in decoded]
+    tensors = [transforms.ToTensor()(image) for image in resized]
+    arrays = [np.asarray(image, dtype=np.float64)[:, :, None] for image in resized]
+    samples = [(t, t) for t in tensors] * (args.batch_size // len(tensors) + 1)
+
+    time_stage('PIL decode', decode, pool[:16])
+    time_stage('resize', resize, decoded)
+    time_stage('ToTensor', transforms.ToTensor(), resized)
+    # the noise of loadData, with its parameters
+    time_stage('noise.gaussian_blur', lambda x: noise.gaussian_blur(x, kernel_size=15, sigma=1), tensors)
+    time_stage('noise.add_poisson_noise', lambda x: noise.add_poisson_noise(x, 0.1), tensors)
+    time_stage('noise.add_speckle_noise', noise.add_speckle_noise, tensors)
+    time_stage('noise.add_salt_and_pepper_noise', lambda x: noise.add_salt_and_pepper_noise(x, 0.05, 0.05), tensors)
+    for name in ['addGaussianNoise', 'addSaltPepperNoise', 'addPoissonNoise', 'addSpeckleNoise']:
+        time_stage(f'noise_functions.{name}', getattr(noise_functions, name), arrays)
+    for name in ['addGaussianNoiseTensor', 'addSaltPepperNoiseTensor', 'addPoissonNoiseTensor', 'addSpeckleNoiseTensor']:
+        time_stage(f'noise_functions.{name}', getattr(noise_functions, name), tensors)
+    time_stage(f'collate ({args.batch_size} images)', lambda _: default_collate(samples[:args.batch_size]), [None])
+    batch = default_collate(samples[:args.batch_size])[0]
+    if device.type == 'cpu':
+        # no device to copy to, a copy within host memory is the closest stand-in
+        time_stage(f'transfer ({args.batch_size} images, host copy)', lambda x: x.clone(), [batch])
+    else:
+        def transfer(x):
+            x.to(device, non_blocking=False)
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+            elif device.type == 'mps':
+                torch.mps.synchronize()
+        time_stage(f'transfer ({args.batch_size} images, to {device.type})', transfer, [batch])
+
+    # ----------------------------- End to end ------------------------------ #
+    def measure(directory, backend, workers):
+        '''Builds the loaders, then reads up to args.max_batches training batches'''
+        start = time.perf_counter()
+        train_loader, _, _ = loadData(directory, args.batch_size, test_size=0.2, color='gray', noise=args.noise, backend=backend,
+                                      num_workers=workers, image_size=args.image_size, cache_dir=directory + '_cache')
+        setup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        iterator = iter(train_loader)
+        next(iterator)
+        first = time.perf_counter() - start
+        images, start = 0, time.perf_counter()
+        for i, (x, _) in enumerate(iterator):
+            images += len(x)
+            if i + 2 >= args.max_batches:
+                break
+        steady = time.perf_counter() - start
+        del iterator, train_loader
+        return {'setup_s': setup, 'first_batch_s': first, 'images': images, 'images_per_s': images / steady if steady else 0.0}
+
+    print(f'\nloadData end to end, {args.max_batches} batches per run (setup includes listing, splitting and building the cache or shards)\n')
+    print(f'{"Backend":<9}{"Files":>9}{"Workers":>9}{"Setup s":>10}{"1st batch s":>13}{"img/s":>10}')
+    for size in args.sizes:
+        directory = make_dataset(size)
+        for backend in args.backends:
+            if backend == 'cache' and size * args.image_size ** 2 > args.max_cache_gb * 1e9:
+                print(f'{backend:<9}{size:>9}  skipped, the cache would exceed {args.max_cache_gb} GB')
+                continue
+            for workers in args.workers:
+                result = {'backend': backend, 'files': size, 'workers': workers, **measure(directory, backend, workers)}
+                report['end_to_end'].append(result)
+                print(f'{backend:<9}{size:>9}{workers:>9}{result["setup_s"]:>10.2f}{result["first_batch_s"]:>13.2f}{result["images_per_s"]:>10.1f}')
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+            shutil.rmtree(directory + '_cache', ignore_errors=True)
+
+    # a backend saturates at the worker count after which another step adds less than 10%
+    print('\nSaturation:')
+    for backend in args.backends:
+        for size in args.sizes:
+            runs = sorted((r for r in report['end_to_end'] if r['backend'] == backend and r['files'] == size), key=lambda r: r['workers'])
+            if not runs:
+                continue
+            saturated = next((a for a, b in zip(runs, runs[1:]) if b['images_per_s'] < a['images_per_s'] * 1.1), runs[-1])
+            print(f'  {backend:<7} {size:>8} files: {saturated["images_per_s"]:.1f} images/s at {saturated["workers"]} workers')
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+
+# DataLoader workers and spawned processes import this module, only the main process runs the benchmark
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import subprocess
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def time_command(args, repeats):
+    '''
+    Runs a python command in fresh interpreters and times each run
+
+    Args:
+        args: the arguments passed to the python interpreter
+        repeats: the number of cold runs
+
+    Returns:
+        timings: the wall time in seconds of every run
+    '''
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def slowest_imports(statement, n=10):
+    '''
+    Lists the root packages with the largest cumulative import time, wherever they were imported from
+
+    Args:
+        statement: the python statement to profile with -X importtime
+        n: the number of imports to list
+
+    Returns:
+        imports: (cumulative seconds, module) pairs sorted from slowest
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], check=True, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if '.' not in name and not name.startswith('_'):
+            imports.append((int(cumulative) / 1e6, name))
+    return sorted(imports, reverse=True)[:n]
+
+
+# ----------------------- Cold-start measurements ----------------------- #
+repeats = 5
+with tempfile.TemporaryDirectory() as tmp:
+    noisy_path = os.path.join(tmp, 'noisy.png')
+    Image.fromarray((np.random.default_rng(0).random((256, 256)) * 255).astype(np.uint8)).save(noisy_path)
+
+    cases = [
+        ('python interpreter', ['-c', 'pass']),
+        ('import torch', ['-c', 'import torch']),
+        ('import utility.utils', ['-c', 'import utility.utils']),
+        ('from models import SkidNet, UNet', ['-c', 'from models import SkidNet, UNet']),
+        ('plotting, SSIM and split libraries', ['-c', 'import matplotlib.pyplot, skimage.metrics, sklearn.model_selection, cv2, tqdm']),
+        ('denoise.py --model SkidNet_3', ['denoise.py', noisy_path, os.path.join(tmp, 'out.png'), '--model', 'SkidNet_3']),
+        ('denoise.py --model Cascade_3', ['denoise.py', noisy_path, os.path.join(tmp, 'out.png'), '--model', 'Cascade_3']),
+    ]
+
+    print(f'Cold start over {repeats} fresh interpreters:')
+    print(f'{"Command":<40}{"min (s)":>10}{"median (s)":>12}')
+    for name, args in cases:
+        timings = time_command(args, repeats)
+        print(f'{name:<40}{min(timings):>10.3f}{statistics.median(timings):>12.3f}')
+
+# ---------------------- Slowest imported packages ---------------------- #
+print('\nSlowest packages imported by the denoise path:')
+for seconds, name in slowest_imports('import utility.inference; from models import SkidNet, UNet, Cascade'):
+    print(f'{seconds:>8.3f} s  {name}')
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import platform
+import time
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+import torch.nn as nn
+
+from models.registry import REGISTRY, build_model
+from utility.benchmarking import measure_latency, measure_train_step, percentile
+
+
+parser = argparse.ArgumentParser(description='Benchmark inference and training throughput of the models on random inputs')
+parser.add_argument('--models', nargs='+', choices=sorted(REGISTRY), default=['SkidNet_3', 'Unet_3', 'Cascade_3', 'baseline', 'SkidFCN', 'conv_autoencoder_without'])
+parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+parser.add_argument('--resolutions', type=int, nargs='+', default=[256, 512, 1024])
+parser.add_argument('--threads', type=int, nargs='+', default=[torch.get_num_threads()], help='intra-op thread counts to sweep')
+parser.add_argument('--warmup', type=int, default=3)
+parser.add_argument('--iters', type=int, default=10)
+parser.add_argument('--no-train', action='store_true', help='skip the training step measurements')
+parser.add_argument('--max-megapixels', type=float, default=8.5, help='skip configurations whose batch holds more pixels')
+parser.add_argument('--output', default=None, help='JSON file, benchmarks/<host>-<time>.json by default')
+args = parser.parse_args()
+
+output = args.output or os.path.join('benchmarks', f'{platform.node()}-{time.strftime("%Y%m%d-%H%M%S")}.json')
+report = {
+    'host': platform.node(), 'platform': platform.platform(), 'processor': platform.processor(),
+    'cpu_count': os.cpu_count(), 'torch': torch.__version__, 'python': platform.python_version(),
+    'warmup': args.warmup, 'iters': args.iters, 'results': [],
+}
+
+
+def summarise(latencies, batch_size):
+    return {
+        'images_per_s': batch_size * len(latencies) / sum(latencies),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+# ------------------------------- Sweep --------------------------------- #
+print(f'{"Model":<26}{"Batch":>6}{"Res":>6}{"Thr":>5}{"Infer img/s":>13}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"Train img/s":>13}')
+for name in args.models:
+    # random weights, the speed does not depend on the checkpoint
+    model = build_model(name)
+    channels = next(m for m in model.modules() if isinstance(m, nn.Conv2d)).in_channels
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for resolution in args.resolutions:
+            for batch_size in args.batch_sizes:
+                if batch_size * resolution ** 2 > args.max_megapixels * 1e6:
+                    continue
+                shape = (batch_size, channels, resolution, resolution)
+                result = {'model': name, 'batch_size': batch_size, 'resolution': resolution, 'threads': threads}
+                try:
+                    result['inference'] = summarise(measure_latency(model, shape, warmup=args.warmup, iters=args.iters), batch_size)
+                    if not args.no_train:
+                        result['train'] = summarise(measure_train_step(model, shape, warmup=args.warmup, iters=args.iters), batch_size)
+                except RuntimeError as error:
+                    # e.g. out of memory at the largest configurations
+                    result['error'] = str(error).splitlines()[0]
+                report['results'].append(result)
+
+                if 'error' in result:
+                    print(f'{name:<26}{batch_size:>6}{resolution:>6}{threads:>5}  failed: {result["error"]}')
+                    continue
+                inference, train = result['inference'], result.get('train', {})
+                print(f'{name:<26}{batch_size:>6}{resolution:>6}{threads:>5}{inference["images_per_s"]:>13.1f}{inference["p50_ms"]:>10.1f}'
+                      f'{inference["p95_ms"]:>10.1f}{inference["p99_ms"]:>10.1f}{train.get("images_per_s", float("nan")):>13.1f}')
+
+os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+with open(output, 'w') as f:
+    json.dump(report, f, indent=2)
+print(f'\nResults written to {output}')
@@ -0,0 +1,28 @@
+import argparse
+import warnings
+warnings.filterwarnings("ignore")
+
+from models.registry import REGISTRY, load_registered
+from utility.activation_stats import ActivationStatsCollector
+from utility.special_utils import loadData
+
+
+parser = argparse.ArgumentParser(description='Collect per-channel activation statistics of every layer over a dataset')
+parser.add_argument('--model', choices=sorted(REGISTRY), default='Cascade_3', help='registry name of the model')
+parser.add_argument('--data', default='data', help='directory of the images')
+parser.add_argument('--split', choices=['train', 'val', 'test'], default='val')
+parser.add_argument('--noise', action='store_true', help='add the training noise to the images')
+parser.add_argument('--batch-size', type=int, default=32)
+parser.add_argument('--max-batches', type=int, default=None)
+parser.add_argument('--bins', type=int, default=64, help='histogram bins per channel, a multiple of 4')
+parser.add_argument('--output', default='console_outputs/activation_stats.json', help='JSON file the statistics are saved to')
+args = parser.parse_args()
+
+loaders = dict(zip(['train', 'val', 'test'], loadData(args.data, args.batch_size, test_size=0.2, color='gray', noise=args.noise)))
+model = load_registered(args.model)
+
+collector = ActivationStatsCollector(model, bins=args.bins).run(loaders[args.split], max_batches=args.max_batches)
+collector.close()
+print(collector.format_report())
+collector.save(args.output)
+print(f'\nStatistics of {len(collector.stats)} layer outputs saved to {args.output}')
@@ -0,0 +1,65 @@
+import argparse
+import os
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+
+from models.registry import load_registered
+from utility.cascade_executor import CascadeExecutor, run_sequential
+from utility.streaming import iter_sources, decode
+
+
+parser = argparse.ArgumentParser(description='Compare the pipelined cascade executor with the sequential loop')
+parser.add_argument('--source', default=None, help='directory or tar archive of images, random batches if not given')
+parser.add_argument('--batches', type=int, default=8, help='number of random batches')
+parser.add_argument('--batch-size', type=int, default=8)
+parser.add_argument('--size', type=int, default=256, help='height and width of the images')
+parser.add_argument('--threads', type=int, nargs=2, default=None, help='intra-op threads of the SkidNet and UNet stages')
+parser.add_argument('--max-pending', type=int, default=2, help='batches allowed to wait between two stages')
+args = parser.parse_args()
+
+
+def batches():
+    '''Decodes the source into batches on the loading thread, or draws random ones'''
+    if args.source is None:
+        generator = torch.Generator().manual_seed(0)
+        for _ in range(args.batches):
+            yield torch.rand(args.batch_size, 1, args.size, args.size, generator=generator)
+        return
+
+    batch = []
+    for _, payload in iter_sources(args.source):
+        batch.append(decode(payload, args.size))
+        if len(batch) == args.batch_size:
+            yield torch.cat(batch)
+            batch = []
+    if batch:
+        yield torch.cat(batch)
+
+
+skidnet, unet = load_registered('SkidNet_3'), load_registered('Unet_3')
+stages = [('SkidNet', skidnet), ('UNet', unet)]
+print(f'Batch size: {args.batch_size} | Resolution: {args.size} | CPU threads: {torch.get_num_threads()} | cores: {os.cpu_count()}\n')
+
+# warm-up so neither run pays for the first allocations
+with torch.no_grad():
+    unet(skidnet(torch.rand(1, 1, args.size, args.size)))
+
+# ------------------------------ Comparison ----------------------------- #
+sequential_outputs, sequential = run_sequential(stages, batches())
+executor = CascadeExecutor(stages, max_pending=args.max_pending, threads=args.threads)
+pipelined_outputs = list(executor.run(batches()))
+pipelined = executor.stats()
+
+images = sum(len(output) for output in sequential_outputs)
+difference = max((a - b).abs().max().item() for a, b in zip(sequential_outputs, pipelined_outputs))
+
+print(f'{"Stage":<12}{"Sequential busy s":>20}{"util":>8}{"Pipelined busy s":>20}{"util":>8}')
+for name in sequential['stages']:
+    s, p = sequential['stages'][name], pipelined['stages'][name]
+    print(f'{name:<12}{s["busy_s"]:>20.2f}{s["utilisation"]:>8.0%}{p["busy_s"]:>20.2f}{p["utilisation"]:>8.0%}')
+
+print(f'\nSequential: {sequential["wall_s"]:.2f} s | {images / sequential["wall_s"]:.1f} images/s')
+print(f'Pipelined:  {pipelined["wall_s"]:.2f} s | {images / pipelined["wall_s"]:.1f} images/s')
+print(f'Speed-up: {sequential["wall_s"] / pipelined["wall_s"]:.2f}x | max output difference {difference:.2e}')
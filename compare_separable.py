@@ -0,0 +1,45 @@
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+
+from models.SkiDwithSkipUnet import SkidNet
+from models.SuperMRI import UNet
+from models.Separable import load_partial_state_dict
+from utility.benchmarking import measure_latency
+from utility.profiling import count_macs
+
+
+# ------------------------- Comparison Settings ------------------------- #
+resolution = 256
+batch_size = 8
+print(f'Resolution: {resolution} | Batch size: {batch_size} | CPU threads: {torch.get_num_threads()}\n')
+
+# Widest separable SkidNet whose MACs do not exceed the dense SkidNet
+dense_macs = count_macs(SkidNet(), (1, 1, resolution, resolution))
+matched_width = 32
+while count_macs(SkidNet(width=matched_width + 8, separable=True), (1, 1, resolution, resolution)) <= dense_macs:
+    matched_width += 8
+
+variants = [
+    ('SkidNet', lambda: SkidNet(), 'saved_models/SkidNet_3.pth'),
+    ('SkidNet-DS', lambda: SkidNet(separable=True), 'saved_models/SkidNet_3.pth'),
+    (f'SkidNet-DS (width {matched_width}, MAC matched)', lambda: SkidNet(width=matched_width, separable=True), None),
+    ('UNet', lambda: UNet(use_attention_gate=True), 'saved_models/Unet_3.pth'),
+    ('UNet-DS', lambda: UNet(use_attention_gate=True, separable=True), 'saved_models/Unet_3.pth'),
+]
+
+# -------------------------- Measuring the cost ------------------------- #
+print(f'{"Model":<40}{"Params":>12}{"GMACs/img":>12}{"ms/batch":>12}{"img/s":>10}{"Init from ckpt":>18}')
+for name, build, checkpoint in variants:
+    model = build()
+    initialised = '-'
+    if checkpoint:
+        copied, decomposed, skipped = load_partial_state_dict(model, torch.load(checkpoint, map_location='cpu'))
+        initialised = f'{len(copied) + len(decomposed)}/{len(copied) + len(decomposed) + len(skipped)}'
+
+    params = sum(p.numel() for p in model.parameters())
+    macs = count_macs(model, (1, 1, resolution, resolution))
+    latencies = measure_latency(model, (batch_size, 1, resolution, resolution))
+    latency = sum(latencies) / len(latencies)
+    print(f'{name:<40}{params:>12,}{macs / 1e9:>12.3f}{latency * 1000:>12.1f}{batch_size / latency:>10.1f}{initialised:>18}')
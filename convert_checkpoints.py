@@ -0,0 +1,34 @@
+import argparse
+import glob
+import os
+import time
+
+import torch
+
+from utility.checkpoints import convert_checkpoint, load_checkpoint
+
+
+parser = argparse.ArgumentParser(description='Convert pickled .pth state dicts into memory-mappable .safetensors files')
+parser.add_argument('checkpoints', nargs='*', help='the .pth files to convert, saved_models/ and saved_models/old_models/ by default')
+parser.add_argument('--force', action='store_true', help='convert again even when the .safetensors file is up to date')
+args = parser.parse_args()
+
+checkpoints = args.checkpoints or sorted(glob.glob('saved_models/*.pth') + glob.glob('saved_models/old_models/*.pth'))
+
+# ----------------------- Converting the checkpoints -------------------- #
+print(f'{"Checkpoint":<60}{"torch.load (ms)":>17}{"mmap load (ms)":>16}{"identical":>11}')
+for checkpoint in checkpoints:
+    converted = os.path.splitext(checkpoint)[0] + '.safetensors'
+    if args.force or not os.path.exists(converted) or os.path.getmtime(converted) < os.path.getmtime(checkpoint):
+        convert_checkpoint(checkpoint, converted)
+
+    start = time.perf_counter()
+    original = torch.load(checkpoint, map_location='cpu')
+    pickle_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mapped = load_checkpoint(converted)
+    mmap_time = time.perf_counter() - start
+
+    identical = original.keys() == mapped.keys() and all(torch.equal(original[key], mapped[key]) for key in original)
+    print(f'{checkpoint:<60}{pickle_time * 1000:>17.2f}{mmap_time * 1000:>16.2f}{str(identical):>11}')
@@ -0,0 +1,53 @@
+import argparse
+import time
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+
+from models.registry import REGISTRY, load_registered
+from utility.cropping import denoise_cropped, denoise_tiled
+from utility.noise_estimation import image_psnr
+from utility.streaming import iter_sources, decode
+
+
+parser = argparse.ArgumentParser(description='Measure how much compute cropping to the anatomy saves')
+parser.add_argument('source', help='directory or tar archive of radiographs')
+parser.add_argument('--model', choices=sorted(REGISTRY), default='Cascade_3', help='registry name of the model')
+parser.add_argument('--size', type=int, default=256, help='height and width the images are resized to')
+parser.add_argument('--batch-size', type=int, default=8)
+parser.add_argument('--threshold', type=float, default=0.05, help='intensity above which a pixel is anatomy')
+parser.add_argument('--tile', type=int, default=64, help='side of the tiles of the tiled mode')
+parser.add_argument('--halo', type=int, default=16, help='context around every tile')
+args = parser.parse_args()
+
+model = load_registered(args.model)
+images = torch.cat([decode(payload, args.size) for _, payload in iter_sources(args.source)])
+batches = torch.split(images, args.batch_size)
+print(f'{len(images)} images | model {args.model} | resolution {args.size} | batch size {args.batch_size}\n')
+
+modes = [
+    ('Full frame', lambda x: (model(x), 0.0)),
+    ('Cropped', lambda x: denoise_cropped(model, x, args.threshold)),
+    ('Tiled', lambda x: denoise_tiled(model, x, args.tile, args.halo, args.threshold)),
+]
+
+# ------------------------------ Comparison ----------------------------- #
+with torch.no_grad():
+    model(batches[0])
+    reference = None
+    print(f'{"Mode":<12}{"Skipped":>10}{"ms/img":>10}{"Saving":>10}{"PSNR vs full frame":>22}')
+    for name, run in modes:
+        outputs, skipped = [], []
+        start = time.perf_counter()
+        for x in batches:
+            output, fraction = run(x)
+            outputs.append(output)
+            skipped.append(fraction * len(x))
+        elapsed = (time.perf_counter() - start) / len(images)
+        outputs = torch.cat(outputs)
+
+        if reference is None:
+            reference, full_elapsed = outputs, elapsed
+        agreement = image_psnr(outputs, reference).clamp(max=99).mean().item()
+        print(f'{name:<12}{sum(skipped) / len(images):>10.0%}{elapsed * 1000:>10.1f}{1 - elapsed / full_elapsed:>10.0%}{agreement:>22.2f}')
@@ -0,0 +1,16 @@
+import argparse
+
+from models.registry import REGISTRY, load_registered
+from utility.inference import denoise_image, write_image
+
+
+parser = argparse.ArgumentParser(description='Denoise a single radiograph with a saved model')
+parser.add_argument('input', help='path of the noisy image')
+parser.add_argument('output', help='path the denoised image is written to')
+parser.add_argument('--model', choices=sorted(REGISTRY), default='Cascade_3', help='registry name of the model')
+parser.add_argument('--size', type=int, default=256, help='height and width the image is resized to')
+args = parser.parse_args()
+
+# Only the architectures that are used get imported
+model = load_registered(args.model)
+write_image(denoise_image(model, args.input, args.size), args.output)
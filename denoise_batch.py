@@ -0,0 +1,119 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import torch
+
+from models.registry import REGISTRY, load_registered
+from utility.streaming import BoundedExecutor, iter_sources, decode, write_atomic, existing_outputs, output_name
+
+
+parser = argparse.ArgumentParser(description='Stream a directory or tar archive of radiographs through a denoiser')
+parser.add_argument('source', help='directory of images or tar archive (optionally compressed)')
+parser.add_argument('output_dir', help='directory the denoised PNGs are written to, mirroring the source layout')
+parser.add_argument('--model', choices=sorted(REGISTRY), default='Cascade_3', help='registry name of the model')
+parser.add_argument('--size', type=int, default=256, help='height and width the images are resized to')
+parser.add_argument('--batch-size', type=int, default=16)
+parser.add_argument('--readers', type=int, default=4, help='threads reading and decoding images')
+parser.add_argument('--writers', type=int, default=4, help='threads encoding and writing images')
+parser.add_argument('--max-pending', type=int, default=64, help='images allowed in flight between two stages')
+parser.add_argument('--threads', type=int, default=None, help='intra-op threads used for inference')
+parser.add_argument('--report-every', type=float, default=10.0, help='seconds between progress reports')
+args = parser.parse_args()
+
+if args.threads:
+    torch.set_num_threads(args.threads)
+model = load_registered(args.model)
+
+# --------------------------- Pipeline stages --------------------------- #
+# read + decode (thread pool) -> batch + inference (main thread) -> encode + write (thread pool),
+# every hand-over is bounded so a slow stage holds back the ones before it
+done = existing_outputs(args.output_dir)
+decoded = queue.Queue(maxsize=args.max_pending)
+readers = BoundedExecutor(args.readers, args.max_pending)
+writers = BoundedExecutor(args.writers, args.max_pending)
+counts = {'skipped': 0, 'failed': 0, 'written': 0}
+lock = threading.Lock()
+# an error that stopped the producer, so a source read only partly does not look like a finished run
+source_error = []
+
+
+def produce():
+    '''Walks the source in the background and queues the decoding futures in order'''
+    try:
+        seen = set()
+        for name, payload in iter_sources(args.source):
+            output = output_name(args.output_dir, name)
+            if output is None or output in seen:
+                with lock:
+                    counts['failed'] += 1
+                print(f'Failed {name}: ' + ('it would be written outside the output directory' if output is None else f'another image already maps to {output}'))
+                continue
+            seen.add(output)
+            if output in done:
+                with lock:
+                    counts['skipped'] += 1
+                continue
+            decoded.put((output, readers.submit(decode, payload, args.size)))
+    except Exception as error:
+        source_error.append(error)
+    finally:
+        decoded.put(None)
+
+
+def written(future):
+    with lock:
+        if future.exception() is not None:
+            counts['failed'] += 1
+            print(f'Failed to write an image: {future.exception()}')
+        else:
+            counts['written'] += 1
+
+
+def run_batch(batch):
+    names = [name for name, _ in batch]
+    with torch.no_grad():
+        outputs = model(torch.cat([image for _, image in batch]))
+    for name, output in zip(names, outputs):
+        writers.submit(write_atomic, output, os.path.join(args.output_dir, name)).add_done_callback(written)
+
+
+# ----------------------------- Denoising ------------------------------- #
+start = last_report = time.time()
+threading.Thread(target=produce, daemon=True).start()
+
+batch = []
+while True:
+    item = decoded.get()
+    if item is None:
+        break
+    name, future = item
+    try:
+        batch.append((name, future.result()))
+    except Exception as error:
+        with lock:
+            counts['failed'] += 1
+        print(f'Failed to decode {name}: {error}')
+        continue
+
+    if len(batch) == args.batch_size:
+        run_batch(batch)
+        batch = []
+
+    if time.time() - last_report >= args.report_every:
+        last_report = time.time()
+        print(f'{counts["written"]} written | {counts["skipped"]} skipped | {counts["failed"]} failed | {counts["written"] / (last_report - start):.1f} images/s')
+
+if batch:
+    run_batch(batch)
+writers.shutdown(wait=True)
+readers.shutdown(wait=True)
+
+elapsed = time.time() - start
+print(f'Done in {elapsed:.1f} s | {counts["written"]} written | {counts["skipped"]} skipped | {counts["failed"]} failed | {counts["written"] / elapsed:.1f} images/s')
+if source_error:
+    print(f'Reading {args.source} failed, the run is incomplete: {source_error[0]}')
+    sys.exit(1)
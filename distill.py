@@ -0,0 +1,119 @@
+import time
+import tqdm
+import warnings
+warnings.filterwarnings("ignore")
+
+from utility.utils import *
+from utility.benchmarking import measure_latency
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from models import Autoencoder, SkidNet
+from models.registry import load_registered
+
+
+def distillation_loss(student_output, teacher_output, actual, criterion, alpha=0.5):
+    '''
+    Blends the loss against the teacher output with the loss against the ground truth
+
+    Args:
+        student_output: the output of the student model
+        teacher_output: the output of the frozen teacher cascade
+        actual: the clean ground truth images
+        criterion: the reconstruction loss used for both terms
+        alpha: the weight of the teacher term, 1 - alpha weights the ground truth term
+
+    Returns:
+        loss: the combined distillation loss
+    '''
+    return alpha * criterion(student_output, teacher_output) + (1 - alpha) * criterion(student_output, actual)
+
+
+# ------------------------ Initialize the teacher ----------------------- #
+device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
+print(f'Device: {device}\n')
+
+teacher = load_registered('Cascade_3', device)
+for param in teacher.parameters():
+    param.requires_grad = False
+
+# ------------------------ Initialize the student ----------------------- #
+# 'skidnet' trains a slim SkidNet, 'autoencoder' a widened shallow Autoencoder
+student_name = 'skidnet'
+if student_name == 'skidnet':
+    student = SkidNet(width=8)
+else:
+    student = Autoencoder(widths=(64, 32))
+student.to(device)
+print("The number of parameters in the teacher: ", sum(p.numel() for p in teacher.parameters()))
+print("The number of parameters in the student: ", sum(p.numel() for p in student.parameters()))
+
+data_dir = 'data/'
+batch_size = 32
+train_loader, val_loader, test_loader = loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=True)
+print('Data Loading Complete!')
+
+# ---------------- Define the loss function and optimizer --------------- #
+criterion = nn.MSELoss()
+optimizer = optim.Adam(student.parameters(), lr=0.001)
+alpha = 0.5
+
+# ------------------------- Distilling the model ------------------------ #
+check_loss = 999
+to_train = 1
+num_epochs = 10
+save_path = f'saved_models/student_{student_name}.pth'
+if to_train:
+    for epoch in range(num_epochs):
+        start = time.time()
+        total_train_loss = 0.0
+
+        student.train()
+        for i, mod in enumerate(tqdm.tqdm(train_loader, total=len(train_loader))):
+            modif, actual = mod
+            modif, actual = modif.to(device), actual.to(device)
+
+            with torch.no_grad():
+                teacher_output = teacher(modif)
+
+            optimizer.zero_grad()
+            output = student(modif)
+            loss = distillation_loss(output, teacher_output, actual, criterion, alpha)
+
+            loss.backward()
+            optimizer.step()
+
+            total_train_loss += loss.item()
+
+        avg_train_loss = total_train_loss / len(train_loader)
+        avg_val_loss, psnr = PSNR(student, val_loader, device, loss_report=True, loss_criterion=criterion)
+        if avg_val_loss < check_loss:
+            check_loss = avg_val_loss
+            print('Saving New Best Model')
+            torch.save(student.state_dict(), save_path)
+
+        print(f'Time taken for epoch: {time.time() - start}')
+        print(f'Epoch [{epoch + 1}/{num_epochs}]  |  Train Loss: {avg_train_loss}  |  Val Loss: {avg_val_loss}  |  Val PSNR: {psnr}\n')
+
+student.load_state_dict(torch.load(save_path, map_location=device))
+print('Student Loaded\n')
+
+# ---------------------- Quality gap to the teacher --------------------- #
+print('Calculating PSNR and SSIM of the teacher and the student:')
+teacher_psnr = PSNR(teacher, test_loader, device)
+student_psnr = PSNR(student, test_loader, device)
+teacher_ssim = SSIM(teacher, test_loader, device)
+student_ssim = SSIM(student, test_loader, device)
+print(f'Teacher PSNR: {teacher_psnr:.4f} | Student PSNR: {student_psnr:.4f} | Gap: {teacher_psnr - student_psnr:.4f}')
+print(f'Teacher SSIM: {teacher_ssim:.4f} | Student SSIM: {student_ssim:.4f} | Gap: {teacher_ssim - student_ssim:.4f}\n')
+
+# ----------------------- Speedup over the teacher ---------------------- #
+print('Measuring latency of the teacher and the student:')
+for shape in [(1, 1, 256, 256), (batch_size, 1, 256, 256)]:
+    teacher_latencies = measure_latency(teacher, shape, device)
+    student_latencies = measure_latency(student, shape, device)
+    teacher_latency = sum(teacher_latencies) / len(teacher_latencies)
+    student_latency = sum(student_latencies) / len(student_latencies)
+    print(f'Batch {shape[0]} | Teacher: {teacher_latency * 1000:.2f} ms | Student: {student_latency * 1000:.2f} ms | Speedup: {teacher_latency / student_latency:.2f}x')
@@ -0,0 +1,90 @@
+import argparse
+import time
+import tqdm
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from models import EarlyExitUNet
+from models.Separable import load_partial_state_dict
+from utility.noise_estimation import image_psnr
+from utility.special_utils import loadData
+
+
+parser = argparse.ArgumentParser(description='Train the exit heads of the early exit UNet jointly and measure quality against latency per exit')
+parser.add_argument('--noisy', default='intermediate_data/Skid_MSE', help='directory of the SkidNet outputs the UNet is fed')
+parser.add_argument('--clean', default='intermediate_data/Skid_MSE_og2', help='directory of the matching clean images')
+parser.add_argument('--epochs', type=int, default=5)
+parser.add_argument('--batch-size', type=int, default=32)
+parser.add_argument('--lr', type=float, default=1e-4)
+parser.add_argument('--final-weight', type=float, default=2.0, help='loss weight of the last exit, the shallower exits have weight 1')
+parser.add_argument('--save', default='saved_models/Unet_EE.pth')
+parser.add_argument('--plot', default=None, help='path the quality vs latency curve is saved to')
+args = parser.parse_args()
+
+# --------------------------- Reading the Data -------------------------- #
+train_loader, val_loader, test_loader = loadData(args.noisy, args.batch_size, test_size=0.2, color='gray', noise=False)
+train_original, val_original, test_original = loadData(args.clean, args.batch_size, test_size=0.2, color='gray', noise=False)
+print('Data Loading Complete!')
+
+device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
+print(f'Device: {device}\n')
+
+# All the UNet weights come from Unet_3, only the exit heads start from zero
+model = EarlyExitUNet(use_attention_gate=True)
+copied, _, skipped = load_partial_state_dict(model, torch.load('saved_models/Unet_3.pth', map_location='cpu'))
+print(f'Initialised {len(copied)} tensors from Unet_3.pth | new: {", ".join(skipped)}\n')
+model.to(device)
+
+# ----------------------------- Joint Training -------------------------- #
+weights = [1.0] * (model.num_exits - 1) + [args.final_weight]
+criterion = nn.MSELoss()
+optimizer = optim.Adam(model.parameters(), lr=args.lr)
+for epoch in range(args.epochs):
+    start = time.time()
+    model.train()
+    for real, mod in tqdm.tqdm(zip(train_original, train_loader), total=len(train_original)):
+        actual, _ = real
+        modif, _ = mod
+        actual, modif = actual.to(device), modif.to(device)
+
+        optimizer.zero_grad()
+        loss = sum(w * criterion(output, actual) for w, output in zip(weights, model.forward_exits(modif))) / sum(weights)
+        loss.backward()
+        optimizer.step()
+
+    print(f'Epoch [{epoch + 1}/{args.epochs}]  |  Loss: {loss.item():.5f}  |  Time: {time.time() - start:.1f} s')
+if args.epochs:
+    torch.save(model.state_dict(), args.save)
+    print(f'Saved {args.save}\n')
+
+# ------------------------ Quality vs latency curve --------------------- #
+model.eval()
+total_psnr, count = torch.zeros(model.num_exits), 0
+with torch.no_grad():
+    for real, mod in zip(test_original, test_loader):
+        actual, _ = real
+        modif, _ = mod
+        outputs = model.forward_exits(modif.to(device))
+        total_psnr += torch.stack([image_psnr(output, actual.to(device)).sum().cpu() for output in outputs])
+        count += len(actual)
+psnr = (total_psnr / count).tolist()
+latency = model.calibrate((1, 1, 256, 256))
+
+print(f'{"Exit":<6}{"Resolution":>12}{"ms/img":>10}{"PSNR":>10}')
+for i in range(model.num_exits):
+    resolution = 256 // 2 ** (model.num_exits - 1 - i)
+    print(f'{i:<6}{f"{resolution}x{resolution}":>12}{latency[i] * 1000:>10.1f}{psnr[i]:>10.2f}')
+
+if args.plot:
+    import matplotlib.pyplot as plt
+    plt.plot([t * 1000 for t in latency], psnr, marker='o')
+    for i, (t, p) in enumerate(zip(latency, psnr)):
+        plt.annotate(f'exit {i}', (t * 1000, p))
+    plt.xlabel('Latency per image (ms)')
+    plt.ylabel('PSNR (dB)')
+    plt.title('Early exit UNet: quality vs latency')
+    plt.savefig(args.plot)
@@ -0,0 +1,40 @@
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+
+from models.registry import load_registered
+from utility.benchmarking import measure_latency
+from utility.onnx_backend import export_onnx, ONNXModel, check_parity, tune_intra_op_threads
+
+
+# ---------------------------- Loading Models --------------------------- #
+models = {name: load_registered(name) for name in ['SkidNet_3', 'Unet_3', 'Cascade_3']}
+
+# ---------------------------- Export to ONNX --------------------------- #
+onnx_dir = 'saved_models/onnx'
+for name, model in models.items():
+    path = export_onnx(model, f'{onnx_dir}/{name}.onnx')
+    print(f'Exported {name} to {path}')
+print()
+
+# -------------------------- Parity with torch -------------------------- #
+# Different batch sizes and resolutions exercise the dynamic axes
+torch.manual_seed(2024)
+sample_batches = [torch.rand(1, 1, 256, 256), torch.rand(4, 1, 256, 256), torch.rand(2, 1, 512, 512)]
+for name, model in models.items():
+    max_diff, passed = check_parity(model, ONNXModel(f'{onnx_dir}/{name}.onnx'), sample_batches)
+    print(f'{name:<12} max |torch - onnx| = {max_diff:.2e}  {"PASS" if passed else "FAIL"}')
+print()
+
+# -------------------------- Latency comparison ------------------------- #
+for batch_size in [1, 8]:
+    shape = (batch_size, 1, 256, 256)
+    for name, model in models.items():
+        path = f'{onnx_dir}/{name}.onnx'
+        threads, _ = tune_intra_op_threads(path, shape)
+        torch_latencies = measure_latency(model, shape)
+        onnx_latencies = measure_latency(ONNXModel(path, intra_op_threads=threads), shape)
+        torch_latency = sum(torch_latencies) / len(torch_latencies)
+        onnx_latency = sum(onnx_latencies) / len(onnx_latencies)
+        print(f'Batch {batch_size} | {name:<12} | torch: {torch_latency * 1000:8.2f} ms | onnxruntime ({threads} threads): {onnx_latency * 1000:8.2f} ms | Speedup: {torch_latency / onnx_latency:.2f}x')
@@ -1,7 +1,11 @@
-from models.SuperMRI import *
-from models.SkiDwithSkipUnet import *
-from models.SuperMRI import *
-import torchvision
+import time
+
+import cv2
+import numpy as np
+import matplotlib.pyplot as plt
+
+from models.registry import load_registered
+from utility.attention_maps import export_attention_maps
 from utility.utils import *
 
 
@@ -15,44 +19,30 @@ class SaveFeatures():
         self.hook.remove()
 
 
-train_loader, val_loader, test_loader = loadData("data/", 1, test_size=0.5, color='gray', noise=True)
+batch_size = 32
+output_dir = 'attention_maps'
+train_loader, val_loader, test_loader = loadData("data/", batch_size, test_size=0.5, color='gray', noise=True)
 
 # ------------------------------ Load model ----------------------------- #
-model = UNet(use_attention_gate=True, max_blocks=6)
-model.load_state_dict(torch.load('saved_models/Unet_3.pth'))
-model.eval()
-
-# Evaluate model 
+model = load_registered('Unet_3')
 print("The number of parameters in the model: ", sum(p.numel() for p in model.parameters()))
-generated_images, original_images = [], []
-with torch.no_grad():
-    for i, data in enumerate(test_loader):
-        img, _ = data
-        img = img.to("cpu")
-        output = model(img)
-        original_images.append(img[0])
-        generated_images.append(output[0])
-        break
-
-
-# ------------------------ Attention gate output ------------------------ #
-final_conv_layer = model.up_blocks[1].attention_gate.norm
-activated_features = SaveFeatures(final_conv_layer)
-
-denoised_img = model(img)
-
-# ------------------------- Calculate gradients ------------------------- #
-model.zero_grad()
-criterion = nn.MSELoss()
-loss = criterion(denoised_img, original_images[0].cpu().squeeze())
-loss.backward()
-activations = activated_features.features
-
-heatmap = torch.mean(activations, dim=1).squeeze()
-heatmap = np.maximum(heatmap.cpu().detach().numpy(), 0)
+
+# ------------------------ Attention gate outputs ----------------------- #
+# One no_grad pass per batch records the masks of all gates, the heatmaps do not need gradients
+start = time.time()
+paths = export_attention_maps(model, test_loader, output_dir)
+print(f'Attention maps of {len(test_loader.dataset)} images written to {output_dir}/ in {time.time() - start:.1f} s')
+
+maps = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+for name, array in maps.items():
+    print(f'{name:<28} {str(array.shape):<20} mean attention {array.mean(dtype=np.float32):.3f}')
+
+# ------------------------ Plot the first test image -------------------- #
+img, _ = test_loader.dataset[0]
+heatmap = maps['up_blocks.1.attention_gate'][0].astype(np.float32)
 res_hm = cv2.resize(heatmap, (256, 256))
 
-plt.imshow(original_images[0].cpu().squeeze(), cmap='gray')
+plt.imshow(img.cpu().squeeze(), cmap='gray')
 plt.imshow(res_hm, alpha=0.2, cmap='jet')
 plt.axis('off')
-plt.show()
\ No newline at end of file
+plt.show()
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import time
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader
+
+from models.registry import REGISTRY, build_model
+from utility.hard_example_sampler import HardExampleSampler
+from utility.phantoms import write_phantoms
+from utility.utils import loadData, seeded_PSNR
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the wall-clock time to a target validation PSNR of uniform and hard-example sampling')
+    parser.add_argument('--model', choices=sorted(REGISTRY), default='baseline', help='trained from random weights')
+    parser.add_argument('--data', default=None, help='the data directory, phantoms generated into benchmarks/hard_examples by default')
+    parser.add_argument('--image-size', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--samplers', nargs='+', choices=['fixed', 'shuffled', 'hard'], default=['fixed', 'shuffled', 'hard'],
+                        help="'fixed' is the order of loadData, 'shuffled' uniform random, 'hard' the hard-example sampler")
+    parser.add_argument('--target-psnr', type=float, default=24.0)
+    parser.add_argument('--budget-s', type=float, default=300, help='training seconds per sampler')
+    parser.add_argument('--eval-every', type=int, default=20, help='training steps between validations')
+    parser.add_argument('--uniform', type=float, default=0.3, help='share of uniform draws of the hard-example sampler')
+    parser.add_argument('--decay', type=float, default=0.7)
+    parser.add_argument('--power', type=float, default=1.0)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON file of the PSNR curves')
+    args = parser.parse_args()
+
+    device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
+    data_dir = args.data or os.path.join('benchmarks', 'hard_examples')
+    if args.data is None and not os.path.isdir(data_dir):
+        write_phantoms(data_dir, 1000, args.image_size, seed=args.seed)
+    train_loader, val_loader, _ = loadData(data_dir, args.batch_size, test_size=0.2, color='gray', noise=True, image_size=args.image_size)
+
+    def validate(model):
+        # the same noise for every validation, so the curves differ only by the model
+        psnr = seeded_PSNR(model, val_loader, device, args.seed)
+        model.train()
+        return psnr
+
+    results = {}
+    print(f'{len(train_loader.dataset)} training images at {args.image_size}px, target {args.target_psnr} dB, {args.budget_s:.0f} s per sampler\n')
+    for name in args.samplers:
+        torch.manual_seed(args.seed)
+        model = build_model(args.model).to(device).train()
+        optimizer = optim.Adam(model.parameters(), lr=args.lr)
+        criterion = nn.MSELoss()
+        sampler = None
+        if name == 'hard':
+            sampler = HardExampleSampler(len(train_loader.dataset), args.batch_size, uniform=args.uniform, decay=args.decay, power=args.power, seed=args.seed)
+            loader = sampler.loader(train_loader)
+        elif name == 'shuffled':
+            loader = DataLoader(train_loader.dataset, batch_size=args.batch_size, shuffle=True, generator=torch.Generator().manual_seed(args.seed))
+        else:
+            loader = train_loader
+
+        # only training time counts towards the budget and the time to target, validation is excluded
+        trained, steps, curve, reached = 0.0, 0, [], None
+        while trained < args.budget_s and reached is None:
+            start = time.perf_counter()
+            for batch in loader:
+                modif, actual = batch[0].to(device), batch[1].to(device)
+                optimizer.zero_grad()
+                output = model(modif)
+                loss = sampler.weighted_loss(output, actual, batch) if sampler else criterion(output, actual)
+                loss.backward()
+                optimizer.step()
+                steps += 1
+                if steps % args.eval_every == 0:
+                    trained += time.perf_counter() - start
+                    curve.append((trained, steps, validate(model)))
+                    print(f'  {name:<9} step {steps:>5} | {trained:7.1f} s | val PSNR {curve[-1][2]:.2f} dB')
+                    if curve[-1][2] >= args.target_psnr:
+                        reached = trained
+                    if reached is not None or trained >= args.budget_s:
+                        break
+                    start = time.perf_counter()
+            else:
+                trained += time.perf_counter() - start
+        results[name] = {'time_to_target_s': reached, 'steps': steps, 'best_psnr': max((c[2] for c in curve), default=None), 'curve': curve}
+
+    print(f'\n{"Sampler":<10}{"Time to " + str(args.target_psnr) + " dB":>18}{"Steps":>8}{"Best PSNR":>11}')
+    for name, result in results.items():
+        reached = f'{result["time_to_target_s"]:.1f} s' if result['time_to_target_s'] is not None else 'not reached'
+        best = f'{result["best_psnr"]:.2f}' if result['best_psnr'] is not None else '-'
+        print(f'{name:<10}{reached:>18}{result["steps"]:>8}{best:>11}')
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,9 +14,7 @@ import torch.optim as optim
 import torchvision.transforms.functional as TF
 from torchvision import utils
 
-from models.AutoEncShallow import *
-from models.SkiDwithSkipUnet import *
-from models.SuperMRI import *
+from models import SkidNet
 
 data_dir = 'data/'
 batch_size = 32
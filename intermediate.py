@@ -1,3 +1,4 @@
+import os
 import time
 import random
 import tqdm
@@ -11,22 +12,30 @@ import torch.optim as optim
 import torchvision.transforms.functional as TF
 from torchvision import utils
 
-from models.AutoEncShallow import *
-from models.SkiDwithSkipUnet import *
-from models.SuperMRI import *
+from models import UNet
+from models.Separable import load_partial_state_dict
+from utility.train_profiler import StepProfiler
+from utility.telemetry import RunRecorder, profile_metrics
+from utility.planner import apply_plan
 
 import warnings
 warnings.filterwarnings("ignore")
 
 
-# Initialize the autoencoder
-model = UNet(use_attention_gate=True)
+# Initialize the autoencoder, the depthwise-separable variant starts from the dense checkpoint
+separable = False
+model_path = 'saved_models/Unet_DS.pth' if separable else 'saved_models/Unet_3.pth'
+model = UNet(use_attention_gate=True, separable=separable)
+if separable:
+	load_partial_state_dict(model, torch.load('saved_models/Unet_3.pth', map_location='cpu'))
 # model.load_state_dict(torch.load('final/Unet_3.pth'))
 
+model_name = os.path.splitext(os.path.basename(model_path))[0]
 data_dir = 'data/'
-batch_size = 32
-mid_train_loader, mid_val_loader, mid_test_loader = loadData('intermediate_data/Skid_MSE', batch_size, test_size=0.2, color='gray', noise=False)
-mid_train_original, mid_val_original, mid_test_original = loadData('intermediate_data/Skid_MSE_og2', batch_size, test_size=0.2, color='gray', noise=False)
+# threads, batch size and loader workers calibrated for this host by plan.py, 32 and no workers without a plan
+batch_size, num_workers = apply_plan(model_name, 256, 'train', batch_size=32, device=getDevice())
+mid_train_loader, mid_val_loader, mid_test_loader = loadData('intermediate_data/Skid_MSE', batch_size, test_size=0.2, color='gray', noise=False, num_workers=num_workers)
+mid_train_original, mid_val_original, mid_test_original = loadData('intermediate_data/Skid_MSE_og2', batch_size, test_size=0.2, color='gray', noise=False, num_workers=num_workers)
 print('Data Loading Complete!')
 # showImages(mid_train_loader, 5)
 # showImages(mid_train_original, 5)
@@ -44,31 +53,44 @@ optimizer = optim.Adam(model.parameters(), lr=0.001)
 check_loss = 999
 to_train = 0
 num_epochs = 50
+profile_steps = None # e.g. (10, 15) captures a torch.profiler trace of steps 10 to 14
+profiler = StepProfiler(device, trace_steps=profile_steps)
 if to_train:
+	recorder = RunRecorder(model_name, 'train', config={'batch_size': batch_size, 'num_workers': num_workers, 'threads': torch.get_num_threads(), 'lr': 0.001, 'epochs': num_epochs, 'separable': separable, 'device': str(device)})
 	for epoch in range(num_epochs):
 		start = time.time()
-		for i, (real, mod) in enumerate(tqdm.tqdm(zip(mid_train_original, mid_train_loader), total=len(mid_train_original))):
-			actual, _ = real
-			_, modif = mod
+		profiler.start_epoch()
+		for i, (real, mod) in enumerate(tqdm.tqdm(profiler.iterate(zip(mid_train_original, mid_train_loader)), total=len(mid_train_original))):
+			with profiler.phase('h2d'):
+				actual, _ = real
+				_, modif = mod
+				actual, modif = actual.to(device), modif.to(device)
 			optimizer.zero_grad()
 
-			output = model(modif)
-			loss = criterion(output, actual)
+			with profiler.phase('forward'):
+				output = model(modif)
+			with profiler.phase('loss'):
+				loss = criterion(output, actual)
 
-			loss.backward()
-			optimizer.step()
+			with profiler.phase('backward'):
+				loss.backward()
+			with profiler.phase('optimizer'):
+				optimizer.step()
+		summary = profiler.end_epoch()
+		print(profiler.format_summary(summary))
 
 		if loss.item() < check_loss:
 			check_loss = loss.item()
 			print(f'Saving New Best Model')
-			torch.save(model.state_dict(), 'saved_models/Unet_3.pth')
+			torch.save(model.state_dict(), model_path)
 
 		print(f'Time taken for epoch: {time.time() - start}')
 		print(f'Epoch [{epoch + 1}/{num_epochs}]  |  Loss: {loss.item()}\n')
+		recorder.log_epoch(epoch + 1, loss=loss.item(), **profile_metrics(summary))
 		
 # Load the model and test the autoencoder on test set
-model = UNet(use_attention_gate=True)
-model.load_state_dict(torch.load('saved_models/Unet_3.pth'))
+model = UNet(use_attention_gate=True, separable=separable)
+model.load_state_dict(torch.load(model_path))
 model.to(device)
 print('Model Loaded\n')
 
@@ -84,8 +106,9 @@ print(f'PSNR on Test: {psnr}\n')
 
 # SSIM of Model
 print(f'Calculating SSIM of Model:')
-psnr = SSIM_pipeline(model, mid_test_original, mid_test_loader, device)
-print(f'SSIM on Test: {psnr}\n')
+ssim = SSIM_pipeline(model, mid_test_original, mid_test_loader, device)
+print(f'SSIM on Test: {ssim}\n')
+RunRecorder(model_name, 'eval', config={'batch_size': batch_size, 'device': str(device)}).finish(loss=test_loss, psnr=psnr, ssim=ssim)
 
 # Generate output for random images
 n = 5
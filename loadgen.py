@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+from utility.benchmarking import percentile
+
+
+parser = argparse.ArgumentParser(description='Send concurrent denoising requests to serve.py and report the latency')
+parser.add_argument('--host', default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8080)
+parser.add_argument('--model', default=None, help='registry name of the model, the first served model if not given')
+parser.add_argument('--image', default=None, help='image sent with every request, random noise if not given')
+parser.add_argument('--size', type=int, default=256, help='size of the random image')
+parser.add_argument('--concurrency', type=int, default=16, help='connections sending requests at the same time')
+parser.add_argument('--requests', type=int, default=500, help='total number of requests')
+args = parser.parse_args()
+
+if args.image:
+    with open(args.image, 'rb') as f:
+        payload = f.read()
+else:
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 256, (args.size, args.size), dtype=np.uint8)).save(buffer, format='PNG')
+    payload = buffer.getvalue()
+
+target = '/denoise' + (f'?model={args.model}' if args.model else '')
+
+
+async def request(reader, writer, method, path, body=b''):
+    '''Sends one request over an open connection and returns the status and the body of the response'''
+    writer.write(
+        f'{method} {path} HTTP/1.1\r\nHost: {args.host}\r\nContent-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        if key.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def worker(counter, latencies, failures):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        while next(counter) < args.requests:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, 'POST', target, payload)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures.append(status)
+    finally:
+        writer.close()
+
+
+async def main():
+    latencies, failures = [], []
+    counter = iter(range(args.requests + args.concurrency))
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(counter, latencies, failures) for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(latencies)} requests in {elapsed:.2f} s with {args.concurrency} connections | {len(latencies) / elapsed:.1f} req/s | {len(failures)} failed')
+    print(f'Client latency p50 {percentile(latencies, 50) * 1000:.1f} ms | p95 {percentile(latencies, 95) * 1000:.1f} ms | p99 {percentile(latencies, 99) * 1000:.1f} ms')
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    _, body = await request(reader, writer, 'GET', '/metrics')
+    writer.close()
+    print('Server metrics:')
+    print(json.dumps(json.loads(body), indent=2))
+
+
+asyncio.run(main())
@@ -1,3 +1,4 @@
+import os
 import time
 import random
 import tqdm
@@ -14,17 +15,29 @@ import torch.optim as optim
 import torchvision.transforms.functional as TF
 from torchvision import utils
 
-from models.AutoEncShallow import *
-from models.SkiDwithSkipUnet import *
-from models.SuperMRI import *
+from models import SkidNet
+from models.Separable import load_partial_state_dict
+from utility.train_profiler import StepProfiler
+from utility.telemetry import RunRecorder, profile_metrics
+from utility.planner import apply_plan
+from utility.async_validation import AsyncValidator
+from utility.hard_example_sampler import HardExampleSampler
+from utility.progressive import ProgressiveResizing, parse_schedule
 
 # ------------------------- Initialize the model ------------------------ #
-model = SkidNet()
+# The depthwise-separable variant starts from the dense checkpoint where shapes allow
+separable = False
+model_path = 'saved_models/SkidNet_DS.pth' if separable else 'saved_models/SkidNet_3.pth'
+model = SkidNet(separable=separable)
+if separable:
+	load_partial_state_dict(model, torch.load('saved_models/SkidNet_3.pth', map_location='cpu'))
 print("The number of parameters in the model: ", sum(p.numel() for p in model.parameters()))
 
+model_name = os.path.splitext(os.path.basename(model_path))[0]
 data_dir = 'data/'
-batch_size = 32
-train_loader, val_loader, test_loader = loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=True)
+# threads, batch size and loader workers calibrated for this host by plan.py, 32 and no workers without a plan
+batch_size, num_workers = apply_plan(model_name, 256, 'train', batch_size=32, device=getDevice())
+train_loader, val_loader, test_loader = loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=True, num_workers=num_workers)
 print('Data Loading Complete!')
 # showImages(train_loader, 5)
 
@@ -41,43 +54,75 @@ optimizer = optim.Adam(model.parameters(), lr=0.001)
 check_loss = 999
 to_train = 0
 num_epochs = 10
+max_lag = 1 # epochs training may run ahead of validation, 0 waits for every validation
+sequential_validation = False # True validates shuffled batches only until the confidence intervals decide, False runs the whole split
+hard_examples = False # draw batches tilted towards images with a high loss, see hard_examples.py
+progressive = None # e.g. '64:2,128:2' trains 2 epochs at 64px and 2 at 128px before 256px, see progressive_resize.py
+profile_steps = None # e.g. (10, 15) captures a torch.profiler trace of steps 10 to 14
+profiler = StepProfiler(device, trace_steps=profile_steps)
 if to_train:
+	recorder = RunRecorder(model_name, 'train', config={'batch_size': batch_size, 'num_workers': num_workers, 'threads': torch.get_num_threads(), 'lr': 0.001, 'epochs': num_epochs, 'separable': separable, 'device': str(device), 'max_lag': max_lag, 'sequential_validation': sequential_validation, 'hard_examples': hard_examples, 'progressive': progressive})
+
+	# Validation of every epoch runs on a snapshot in a worker process, the best snapshot is saved when its result arrives
+	validator = AsyncValidator('SkidNet', data_dir, batch_size, model_path, model_kwargs={'separable': separable}, noise=True, split='val', device=device,
+							   max_lag=max_lag, best_loss=check_loss, sequential={} if sequential_validation else None)
+
+	def report_validation(results):
+		for result in results:
+			if result['best']:
+				print(f'Saving New Best Model (epoch {result["epoch"]})')
+			if 'stopped' in result:
+				print(f'Validated on {result["images"]} images ({result["fraction"]:.0%}), stopped: {result["stopped"]}  |  Val Loss ± {result["val_loss_ci"]:.2g}  |  Val PSNR ± {result["psnr_ci"]:.2g}')
+			print(f'Epoch [{result["epoch"]}/{num_epochs}] validated in {result["seconds"]:.1f} s, {result["lag"]} epochs later  |  Val Loss: {result["val_loss"]}  |  Val PSNR: {result["psnr"]}  |  Val SSIM: {result["ssim"]}\n')
+			recorder.log_epoch(result['epoch'], val_loss=result['val_loss'], psnr=result['psnr'], ssim=result['ssim'])
+
+	# the hard-example sampler weights every image so the mean loss stays unbiased
+	sampler = HardExampleSampler(len(train_loader.dataset), batch_size) if hard_examples else None
+	# low resolution epochs read resized caches of the images, the final 256px epochs the train loader
+	resizing = ProgressiveResizing(data_dir, batch_size, 256, parse_schedule(progressive), final_loader=train_loader, num_workers=num_workers)
+	resizing.check(model)
+
 	for epoch in range(num_epochs):
 		start = time.time()
+		loader = resizing.loader(epoch)
+		epoch_loader = sampler.loader(loader) if sampler else loader
 		total_train_loss, total_psnr, total_val_loss = 0.0, 0.0, 0.0
 		
 		# Training phase
 		model.train()
-		for i, mod in enumerate(tqdm.tqdm(train_loader, total=len(train_loader))):
-			modif, actual = mod
+		profiler.start_epoch()
+		for i, mod in enumerate(tqdm.tqdm(profiler.iterate(epoch_loader), total=len(epoch_loader))):
+			with profiler.phase('h2d'):
+				modif, actual = mod[0].to(device), mod[1].to(device)
 			optimizer.zero_grad()
 
-			output = model(modif)
-			loss = criterion(output, actual)
+			with profiler.phase('forward'):
+				output = model(modif)
+			with profiler.phase('loss'):
+				loss = sampler.weighted_loss(output, actual, mod) if sampler else criterion(output, actual)
 
-			loss.backward()
-			optimizer.step()
+			with profiler.phase('backward'):
+				loss.backward()
+			with profiler.phase('optimizer'):
+				optimizer.step()
 			
 			total_train_loss += loss.item()
+		summary = profiler.end_epoch()
+		print(profiler.format_summary(summary))
 
-		avg_train_loss = total_train_loss / len(train_loader)
-		
-		avg_val_loss, psnr = PSNR(model, test_loader, device, loss_report=True, loss_criterion=criterion)
-		_, ssim = SSIM(model, test_loader, device, loss_report=True, loss_criterion=criterion)
-		# Save model if validation loss decreases
-		if avg_val_loss < check_loss:
-			check_loss = avg_val_loss
-			print('Saving New Best Model')
-			torch.save(model.state_dict(), 'saved_models/SkidNet_3.pth')
+		avg_train_loss = total_train_loss / len(epoch_loader)
 
 		print(f'Time taken for epoch: {time.time() - start}')
-		print(f'Epoch [{epoch + 1}/{num_epochs}]  |  Train Loss: {avg_train_loss}  |  Val Loss: {avg_val_loss}  |  Val PSNR: {psnr}  |  Val SSIM: {ssim}\n')
+		print(f'Epoch [{epoch + 1}/{num_epochs}] at {resizing.resolution(epoch)}px  |  Train Loss: {avg_train_loss}\n')
+		recorder.log_epoch(epoch + 1, loss=avg_train_loss, resolution=resizing.resolution(epoch), **profile_metrics(summary))
+		report_validation(validator.submit(epoch + 1, model))
+	report_validation(validator.close())
 
 	# torch.save(model.state_dict(), 'saved_models/testing.pth')
 
 # Load the model and test the autoencoder on test set
-model = SkidNet()
-model.load_state_dict(torch.load('saved_models/SkidNet_3.pth'))
+model = SkidNet(separable=separable)
+model.load_state_dict(torch.load(model_path))
 model.to(device)
 print('Model Loaded\n')
 
@@ -90,14 +135,16 @@ print(f'Val Loss: {val_loss} | Test loss: {test_loss}\n')
 # ---------------------------- PSNR of Model ---------------------------- #
 print(f'Calculating PSNR of Model:')
 val_psnr = PSNR(model, val_loader, device)
-psnr = PSNR(model, test_loader, device)
-print(f'Val PSNR: {val_psnr} | Test PSNR: {psnr}\n')
+test_psnr = PSNR(model, test_loader, device)
+print(f'Val PSNR: {val_psnr} | Test PSNR: {test_psnr}\n')
 
 # ---------------------------- SSIM of Model ---------------------------- #
 print(f'Calculating SSIM of Model:')
 val_ssim = SSIM(model, val_loader, device)
-psnr = SSIM(model, test_loader, device)
-print(f'Val SSIM: {val_ssim} | Test SSIM: {psnr}\n')
+test_ssim = SSIM(model, test_loader, device)
+print(f'Val SSIM: {val_ssim} | Test SSIM: {test_ssim}\n')
+RunRecorder(model_name, 'eval', config={'batch_size': batch_size, 'device': str(device)}).finish(
+	val_loss=val_loss, loss=test_loss, val_psnr=val_psnr, psnr=test_psnr, val_ssim=val_ssim, ssim=test_ssim)
 
 # ------------------ Generate output for random images ------------------ #
 n = 5
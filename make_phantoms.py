@@ -0,0 +1,24 @@
+import argparse
+import os
+import time
+
+from utility.phantoms import write_phantoms
+
+
+# the worker processes import this module, only the main process parses the arguments
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate chest radiograph-like phantoms to train, evaluate and benchmark without the data directory')
+    parser.add_argument('--output', default='data', help='the data directory the phantoms are written to, or the cache is written for')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--size', type=int, default=256, help='the height and width of the phantoms')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--format', choices=['png', 'cache'], default='png',
+                        help="'cache' writes the array loadData(..., backend='cache', image_size=size) reads, without PNGs")
+    parser.add_argument('--cache-dir', default=None, help='where the cache is written, <output>_cache by default')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = write_phantoms(args.output, args.count, args.size, seed=args.seed, workers=args.workers, format=args.format, cache_dir=args.cache_dir)
+    elapsed = time.perf_counter() - start
+    print(f'{args.count} phantoms of {args.size}x{args.size} written to {path} in {elapsed:.1f} s ({args.count / elapsed:.0f} images/s, {args.workers} workers)')
@@ -1,37 +1,33 @@
-import os
-import numpy as np
-import matplotlib.pyplot as plt
-import time
-import random
-import tqdm
-
 import torch
 import torch.nn as nn
-import torch.optim as optim
-import torchvision.transforms.functional as TF
-
-import cv2
-from sklearn.model_selection import train_test_split
 
 # ----------------------- Basic Autoencoder Model ----------------------- #
 class Autoencoder(nn.Module):
 	'''Class defining the basic encoder-decoder model with shallow encoder and decoder'''
 
-	def __init__(self):
-		'''Initialises the model separate encoder and decoder block'''
+	def __init__(self, widths=(16, 8), channels=1):
+		'''
+		Initialises the model separate encoder and decoder block
+
+		Args:
+			widths: the number of filters in the first and second encoder layers, the default
+				matches the saved baseline checkpoints
+			channels: the number of image channels, 1 for grayscale and 3 for color
+		'''
 		super(Autoencoder, self).__init__()
+		first, second = widths
 		self.encoder = nn.Sequential(
-			nn.Conv2d(1, 16, kernel_size=3, stride=1, padding=1),
+			nn.Conv2d(channels, first, kernel_size=3, stride=1, padding=1),
 			nn.ReLU(),
 			nn.MaxPool2d(kernel_size=2, stride=2),
-			nn.Conv2d(16, 8, kernel_size=3, stride=1, padding=1),
+			nn.Conv2d(first, second, kernel_size=3, stride=1, padding=1),
 			nn.ReLU(),
 			nn.MaxPool2d(kernel_size=2, stride=2)
 		)
 		self.decoder = nn.Sequential(
-			nn.ConvTranspose2d(8, 16, kernel_size=3, stride=2, padding=1, output_padding=1),
+			nn.ConvTranspose2d(second, first, kernel_size=3, stride=2, padding=1, output_padding=1),
 			nn.ReLU(),
-			nn.ConvTranspose2d(16, 1, kernel_size=3, stride=2, padding=1, output_padding=1),
+			nn.ConvTranspose2d(first, channels, kernel_size=3, stride=2, padding=1, output_padding=1),
 			nn.Sigmoid()
 		)
 		
@@ -0,0 +1,30 @@
+import torch.nn as nn
+
+
+# ------------------------- Multi-Stage Denoiser ------------------------ #
+class Cascade(nn.Module):
+    '''Chains denoising models so that each stage refines the output of the previous one'''
+
+    def __init__(self, *stages):
+        '''
+        Initialises the cascade from an ordered list of stages
+
+        Args:
+            stages: the models to run one after another, e.g. SkidNet() followed by UNet()
+        '''
+        super(Cascade, self).__init__()
+        self.stages = nn.ModuleList(stages)
+
+    def forward(self, x):
+        '''
+        Computes a forward iteration through every stage of the cascade
+
+        Args:
+            x: the noisy input batch
+
+        Returns:
+            x: the output of the final stage
+        '''
+        for stage in self.stages:
+            x = stage(x)
+        return x
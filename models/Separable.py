@@ -0,0 +1,116 @@
+import torch
+import torch.nn as nn
+
+
+# ------------------- Depthwise-Separable Convolution ------------------- #
+class SeparableConv2d(nn.Module):
+    '''Depthwise convolution over each input channel followed by a 1x1 pointwise convolution'''
+
+    def __init__(self, in_channels, out_channels, kernel_size=3, padding=1, bias=True):
+        '''
+        Initialises the depthwise and pointwise convolutions
+
+        Args:
+            in_channels: the number of input channels
+            out_channels: the number of output channels
+            kernel_size: the size of the depthwise kernel
+            padding: the padding of the depthwise convolution
+            bias: whether the pointwise convolution has a bias
+        '''
+        super(SeparableConv2d, self).__init__()
+        self.depthwise = nn.Conv2d(in_channels, in_channels, kernel_size, padding=padding, groups=in_channels, bias=False)
+        self.pointwise = nn.Conv2d(in_channels, out_channels, 1, bias=bias)
+
+    def forward(self, x):
+        return self.pointwise(self.depthwise(x))
+
+
+def make_conv(in_channels, out_channels, kernel_size=3, padding=1, bias=True, separable=False):
+    '''
+    Returns a dense or a depthwise-separable convolution with the same interface
+
+    Args:
+        in_channels: the number of input channels
+        out_channels: the number of output channels
+        kernel_size: the size of the kernel
+        padding: the padding of the convolution
+        bias: whether the convolution has a bias
+        separable: build a SeparableConv2d instead of a dense nn.Conv2d. Convolutions over a
+            single input channel stay dense since one depthwise filter cannot feed several outputs
+
+    Returns:
+        conv: the convolution module
+    '''
+    if separable and in_channels > 1:
+        return SeparableConv2d(in_channels, out_channels, kernel_size, padding=padding, bias=bias)
+    return nn.Conv2d(in_channels, out_channels, kernel_size, padding=padding, bias=bias)
+
+
+def decompose_dense_kernel(weight):
+    '''
+    Approximates a dense kernel by a depthwise and a pointwise kernel using a rank-1 SVD per input channel
+
+    Args:
+        weight: the dense kernel of shape (out_channels, in_channels, k, k)
+
+    Returns:
+        depthwise: the depthwise kernel of shape (in_channels, 1, k, k)
+        pointwise: the pointwise kernel of shape (out_channels, in_channels, 1, 1)
+    '''
+    out_channels, in_channels, kh, kw = weight.shape
+    per_channel = weight.permute(1, 0, 2, 3).reshape(in_channels, out_channels, kh * kw)
+    U, S, Vh = torch.linalg.svd(per_channel, full_matrices=False)
+    scale = S[:, 0].sqrt()
+
+    depthwise = (Vh[:, 0, :] * scale[:, None]).reshape(in_channels, 1, kh, kw)
+    pointwise = (U[:, :, 0] * scale[:, None]).t().reshape(out_channels, in_channels, 1, 1)
+    return depthwise, pointwise
+
+
+def load_partial_state_dict(model, state_dict):
+    '''
+    Initialises a model from a checkpoint of a possibly different variant. Tensors with matching
+    names and shapes are copied, and dense kernels are decomposed into the depthwise and pointwise
+    kernels of the matching SeparableConv2d
+
+    Args:
+        model: the model to initialise
+        state_dict: the state dict of the source checkpoint
+
+    Returns:
+        copied: the keys copied as they are
+        decomposed: the keys initialised from a decomposed dense kernel
+        skipped: the keys left at their initial values
+    '''
+    own = model.state_dict()
+    copied, decomposed, skipped = [], [], []
+
+    for key, value in own.items():
+        if key in state_dict and state_dict[key].shape == value.shape:
+            own[key] = state_dict[key].to(value.dtype)
+            copied.append(key)
+            continue
+
+        if key.endswith('.depthwise.weight') or key.endswith('.pointwise.weight'):
+            prefix = key.rsplit('.', 2)[0]
+            dense = state_dict.get(f'{prefix}.weight')
+            depthwise_key, pointwise_key = f'{prefix}.depthwise.weight', f'{prefix}.pointwise.weight'
+            if dense is not None and dense.shape[1] == own[depthwise_key].shape[0] \
+                    and dense.shape[0] == own[pointwise_key].shape[0] \
+                    and dense.shape[2:] == own[depthwise_key].shape[2:]:
+                if key == depthwise_key:
+                    own[depthwise_key], own[pointwise_key] = decompose_dense_kernel(dense.float())
+                decomposed.append(key)
+                continue
+
+        if key.endswith('.pointwise.bias'):
+            dense_bias = state_dict.get(key.rsplit('.', 2)[0] + '.bias')
+            if dense_bias is not None and dense_bias.shape == value.shape:
+                own[key] = dense_bias.to(value.dtype)
+                copied.append(key)
+                continue
+
+        skipped.append(key)
+
+    model.load_state_dict(own)
+    return copied, decomposed, skipped
@@ -33,73 +33,76 @@ l21: Conv2D(7x7, 1 Filter) + input(256, 256)
 
 output(256, 256)
 '''
-import os
-import numpy as np
-import time
-import random
-import tqdm
-import matplotlib.pyplot as plt
-
 import torch
 import torch.nn as nn
-import torch.optim as optim
-import torchvision.transforms.functional as TF
+
+from models.Separable import make_conv
 
 class SkidNet(nn.Module):
-    def __init__(self):
+    def __init__(self, width=32, separable=False):
+        '''
+        Initialises the SkidNet encoder, mediator and decoder
+
+        Args:
+            width: the number of filters in the narrow layers, the wide layers use twice as many.
+                The default of 32 matches the saved SkidNet checkpoints
+            separable: replace the dense 3x3 convolutions by depthwise-separable ones
+        '''
         super(SkidNet, self).__init__()
+        w, w2 = width, 2 * width
+        conv = lambda in_channels, out_channels: make_conv(in_channels, out_channels, 3, padding=1, separable=separable)
         self.relu = nn.ReLU(inplace=True)
         # ------------------------------- Encoder ------------------------------- #
         self.encoder = nn.Sequential(
-            nn.Conv2d(1, 32, 3, padding=1), 
-            nn.BatchNorm2d(32), 
-            nn.Conv2d(32, 64, 3, padding=1), 
-            nn.BatchNorm2d(64), 
-            nn.Conv2d(64, 32, 3, padding=1), 
-            nn.BatchNorm2d(32), 
+            conv(1, w), 
+            nn.BatchNorm2d(w), 
+            conv(w, w2), 
+            nn.BatchNorm2d(w2), 
+            conv(w2, w), 
+            nn.BatchNorm2d(w), 
             nn.MaxPool2d(2, 2),
-            nn.Conv2d(32, 64, 3, padding=1), 
-            nn.BatchNorm2d(64), 
-            nn.Conv2d(64, 32, 3, padding=1), 
-            nn.BatchNorm2d(32), 
+            conv(w, w2), 
+            nn.BatchNorm2d(w2), 
+            conv(w2, w), 
+            nn.BatchNorm2d(w), 
             nn.MaxPool2d(2, 2),
-            nn.Conv2d(32, 64, 3, padding=1),
-            nn.BatchNorm2d(64),
-            nn.Conv2d(64, 32, 3, padding=1), 
-            nn.BatchNorm2d(32),
+            conv(w, w2),
+            nn.BatchNorm2d(w2),
+            conv(w2, w), 
+            nn.BatchNorm2d(w),
             nn.MaxPool2d(2, 2)
         )
-        self.mediator = nn.Conv2d(32, 32, 3, padding=1)
+        self.mediator = conv(w, w)
 
         # ------------------------------- Decoder ------------------------------- #
         self.decoder = nn.Sequential(
             nn.Upsample(scale_factor=2),
             # major block 1
             # minor block 1
-            nn.Conv2d(64, 64, 3, padding=1), # input filters change on the basis of addition/concat
-            nn.BatchNorm2d(64),
+            conv(w2, w2), # input filters change on the basis of addition/concat
+            nn.BatchNorm2d(w2),
             # minor block 2
-            nn.Conv2d(64, 32, 3, padding=1), 
-            nn.BatchNorm2d(32),
+            conv(w2, w), 
+            nn.BatchNorm2d(w),
             nn.Upsample(scale_factor=2),
             
             # major block 2
             # minor block 1
-            nn.Conv2d(64, 64, 3, padding=1), # input filters change on the basis of addition/concat
-            nn.BatchNorm2d(64),
+            conv(w2, w2), # input filters change on the basis of addition/concat
+            nn.BatchNorm2d(w2),
             # minor block 2
-            nn.Conv2d(64, 32, 3, padding=1), 
-            nn.BatchNorm2d(32), 
+            conv(w2, w), 
+            nn.BatchNorm2d(w), 
             nn.Upsample(scale_factor=2),
 
             # major block 3
             # minor block 1
-            nn.Conv2d(64, 64, 3, padding=1), # input filters change on the basis of addition/concat
-            nn.BatchNorm2d(64),
+            conv(w2, w2), # input filters change on the basis of addition/concat
+            nn.BatchNorm2d(w2),
             # minor block 2
-            nn.Conv2d(64, 32, 3, padding=1), 
-            nn.BatchNorm2d(32),
-            nn.Conv2d(32, 1, 7, padding=3)
+            conv(w2, w), 
+            nn.BatchNorm2d(w),
+            nn.Conv2d(w, 1, 7, padding=3)
         )
     
     def forward(self, x):
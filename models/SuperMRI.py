@@ -2,7 +2,6 @@ import torch
 import typing as t
 from torch import nn
 from math import floor
-import torchinfo
 
 
 # ----------------------------------------------------------------------- #
@@ -96,6 +95,8 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from models.Separable import make_conv
+
 class ConvBlock(nn.Module):
     """
     Convolution block consists of 2 blocks of (conv -> norm -> activation )
@@ -112,28 +113,31 @@ class ConvBlock(nn.Module):
         normalization: str = "instancenorm",
         activation: str = "leakyrelu",
         dropout: float = 0.0,
+        separable: bool = False,
     ):
         super(ConvBlock, self).__init__()
         if not mid_channels:
             mid_channels = out_channels
 
-        self.conv1 = nn.Conv2d(
+        self.conv1 = make_conv(
             in_channels,
             mid_channels,
             kernel_size=kernel_size,
             padding=padding,
             bias=bias,
+            separable=separable,
         )
         self.norm1 = essense.normalization(normalization)(mid_channels)
         self.activation1 = essense.activation(activation)()
         self.dropout1 = nn.Dropout2d(p=dropout)
 
-        self.conv2 = nn.Conv2d(
+        self.conv2 = make_conv(
             mid_channels,
             out_channels,
             kernel_size=kernel_size,
             padding=padding,
             bias=bias,
+            separable=separable,
         )
         self.norm2 = essense.normalization(normalization)(out_channels)
         self.activation2 = essense.activation(activation)()
@@ -161,6 +165,7 @@ class DownScale(nn.Module):
         normalization: str = "instancenorm",
         activation: str = "lrelu",
         dropout: float = 0.0,
+        separable: bool = False,
     ):
         super(DownScale, self).__init__()
         self.max_pool = nn.MaxPool2d(kernel_size=2)
@@ -170,6 +175,7 @@ class DownScale(nn.Module):
             normalization=normalization,
             activation=activation,
             dropout=dropout,
+            separable=separable,
         )
 
     def forward(self, x):
@@ -232,6 +238,7 @@ class UpScale(nn.Module):
         activation: str = "lrelu",
         dropout: float = 0.0,
         use_attention_gate: bool = False,
+        separable: bool = False,
     ):
         super(UpScale, self).__init__()
         self.transpose_conv = nn.ConvTranspose2d(
@@ -246,8 +253,8 @@ class UpScale(nn.Module):
             normalization=normalization,
             activation=activation,
             dropout=dropout,
+            separable=separable,
         )
-        self.padding = None
         self.sigmoid = essense.activation("sigmoid")()
 
         self.attention_gate = None
@@ -259,16 +266,19 @@ class UpScale(nn.Module):
     def forward(self, x: torch.Tensor, shortcut: torch.Tensor):
         outputs = self.transpose_conv(x)
 
-        if self.padding is None:
-            h_diff = shortcut.shape[2] - outputs.shape[2]
-            w_diff = shortcut.shape[3] - outputs.shape[3]
-            self.padding = [
-                w_diff // 2,
-                w_diff - (w_diff // 2),
-                h_diff // 2,
-                h_diff - (h_diff // 2),
-            ]
-        outputs = F.pad(outputs, pad=self.padding)
+        # computed on every call, odd sizes need padding at some levels only, so one model takes any input size
+        h_diff = shortcut.shape[2] - outputs.shape[2]
+        w_diff = shortcut.shape[3] - outputs.shape[3]
+        if h_diff or w_diff:
+            outputs = F.pad(
+                outputs,
+                pad=[
+                    w_diff // 2,
+                    w_diff - (w_diff // 2),
+                    h_diff // 2,
+                    h_diff - (h_diff // 2),
+                ],
+            )
 
         if self.attention_gate is not None:
             shortcut = self.attention_gate(outputs, shortcut)
@@ -284,12 +294,13 @@ class UNet(nn.Module):
     reference: https://github.com/milesial/Pytorch-UNet/tree/master/unet
     """
 
-    def __init__(self, max_blocks: int = 6, use_attention_gate: bool = False):
+    def __init__(self, max_blocks: int = 6, use_attention_gate: bool = False, separable: bool = False):
         """initialize UNet model
         Args:
           args
           max_blocks: the maximum number of down scale blocks
           use_attention_gate: use attention gate in residual connection
+          separable: use depthwise-separable 3x3 convolutions in the conv blocks
         """
         super(UNet, self).__init__()
         in_channels = 1
@@ -312,6 +323,7 @@ class UNet(nn.Module):
             normalization=normalization,
             activation=activation,
             dropout=dropout,
+            separable=separable,
         )
 
         self.down_blocks = nn.ModuleList(
@@ -322,6 +334,7 @@ class UNet(nn.Module):
                     normalization=normalization,
                     activation=activation,
                     dropout=dropout,
+                    separable=separable,
                 )
                 for i in range(len(self.filters) - 1)
             ]
@@ -336,6 +349,7 @@ class UNet(nn.Module):
                     activation=activation,
                     dropout=dropout,
                     use_attention_gate=use_attention_gate,
+                    separable=separable,
                 )
                 for i in range(len(self.filters) - 1, 0, -1)
             ]
@@ -363,4 +377,107 @@ class UNet(nn.Module):
         outputs = self.output_conv(outputs)
         if self.sigmoid is not None:
             outputs = self.sigmoid(outputs)
-        return outputs
\ No newline at end of file
+        return outputs
+
+class EarlyExitUNet(UNet):
+    """
+    UNet with lightweight output heads after the shallower decoder levels, so inference can stop
+    before the expensive full resolution up blocks. Every head predicts a correction at the resolution
+    of its level that is upsampled and added to the input
+    """
+
+    def __init__(self, max_blocks: int = 6, use_attention_gate: bool = False, separable: bool = False):
+        """initialize the early exit UNet
+        Args:
+          max_blocks: the maximum number of down scale blocks
+          use_attention_gate: use attention gate in residual connection
+          separable: use depthwise-separable 3x3 convolutions in the conv blocks
+        """
+        super(EarlyExitUNet, self).__init__(max_blocks, use_attention_gate, separable)
+
+        # one head after every up block but the last, which keeps the regular output_conv
+        self.exit_heads = nn.ModuleList(
+            [
+                nn.Conv2d(in_channels=self.filters[i - 1], out_channels=1, kernel_size=1)
+                for i in range(len(self.filters) - 1, 1, -1)
+            ]
+        )
+        # zero heads return the input unchanged until they are trained
+        for head in self.exit_heads:
+            nn.init.zeros_(head.weight)
+            nn.init.zeros_(head.bias)
+        self.exit_latency = None
+
+    @property
+    def num_exits(self):
+        return len(self.up_blocks)
+
+    def _exit(self, i, outputs, x):
+        if i == self.num_exits - 1:
+            return self.output_conv(outputs)
+        correction = self.exit_heads[i](outputs)
+        return x + F.interpolate(correction, size=x.shape[-2:], mode="bilinear", align_corners=False)
+
+    def _decode(self, x):
+        """runs the encoder, then yields the decoder features after every up block"""
+        outputs = self.input_block(x)
+
+        shortcuts = [outputs]
+        for i in range(len(self.down_blocks)):
+            outputs = self.down_blocks[i](outputs)
+            shortcuts.append(outputs)
+
+        shortcuts = shortcuts[-2::-1]
+        for i in range(len(self.up_blocks)):
+            outputs = self.up_blocks[i](outputs, shortcuts[i])
+            yield outputs
+
+    def forward(self, x, exit: int = None):
+        """returns the output of the given exit, the last one by default"""
+        exit = self.num_exits - 1 if exit is None else exit
+        for i, outputs in enumerate(self._decode(x)):
+            if i == exit:
+                return self._exit(i, outputs, x)
+
+    def forward_exits(self, x):
+        """returns the outputs of all exits from the shallowest to the last, used for joint training"""
+        return [self._exit(i, outputs, x) for i, outputs in enumerate(self._decode(x))]
+
+    @torch.no_grad()
+    def calibrate(self, input_shape, iters: int = 5):
+        """measures the seconds needed to reach every exit for inputs of the given shape"""
+        import time
+
+        x = torch.rand(input_shape, device=next(self.parameters()).device)
+        self.forward_exits(x)
+        latency = [0.0] * self.num_exits
+        for _ in range(iters):
+            start = time.perf_counter()
+            for i, outputs in enumerate(self._decode(x)):
+                self._exit(i, outputs, x)
+                latency[i] += time.perf_counter() - start
+        self.exit_latency = [t / iters for t in latency]
+        return self.exit_latency
+
+    @torch.no_grad()
+    def anytime(self, x, budget: float = None, tolerance: float = None):
+        """
+        Stops at the deepest exit whose calibrated latency fits the budget in seconds, or at the first exit
+        whose output changes the previous exit's output by less than tolerance (mean absolute difference)
+        Returns:
+          outputs, exit: the output and the index of the exit it came from
+        """
+        last = self.num_exits - 1
+        if budget is not None:
+            assert self.exit_latency is not None, "call calibrate() before using a latency budget"
+            fitting = [i for i, t in enumerate(self.exit_latency) if t <= budget]
+            last = fitting[-1] if fitting else 0
+
+        previous = None
+        for i, outputs in enumerate(self._decode(x)):
+            if i < last and tolerance is None:
+                continue
+            current = self._exit(i, outputs, x)
+            if i == last or (previous is not None and (current - previous).abs().mean().item() < tolerance):
+                return current, i
+            previous = current
@@ -0,0 +1,28 @@
+'''
+Denoising architectures. The classes are resolved lazily, so `from models import SkidNet`
+only imports the module that defines SkidNet instead of every architecture
+'''
+import importlib
+
+_CLASSES = {
+    'Autoencoder': 'models.AutoEncShallow',
+    'SkidNet': 'models.SkiDwithSkipUnet',
+    'UNet': 'models.SuperMRI',
+    'EarlyExitUNet': 'models.SuperMRI',
+    'ConvBlock': 'models.SuperMRI',
+    'AttentionGate': 'models.SuperMRI',
+    'Cascade': 'models.Cascade',
+    'SeparableConv2d': 'models.Separable',
+    'SkidFCN': 'models.old_archs.SkiDwithSkip',
+    'AutoencoderWithoutSkip': 'models.old_archs.SkiD',
+}
+
+__all__ = list(_CLASSES)
+
+
+def __getattr__(name):
+    if name not in _CLASSES:
+        raise AttributeError(f"module 'models' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_CLASSES[name]), name)
+    globals()[name] = value
+    return value
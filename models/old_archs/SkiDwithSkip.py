@@ -33,17 +33,8 @@ l21: Conv2D(7x7, 1 Filter) + input(256, 256)
 
 output(256, 256)
 '''
-import os
-import numpy as np
-import time
-import random
-import tqdm
-import matplotlib.pyplot as plt
-
 import torch
 import torch.nn as nn
-import torch.optim as optim
-import torchvision.transforms.functional as TF
 
 class SkidFCN(nn.Module):
     def __init__(self):
@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+
+import models
+from utility.inference import load_model
+
+
+def _entry(arch, checkpoint, **kwargs):
+    return {'arch': arch, 'kwargs': kwargs, 'checkpoint': checkpoint}
+
+
+# ------------------------ Checkpoint Registry -------------------------- #
+# Maps every saved checkpoint to the architecture and constructor arguments it was trained with
+REGISTRY = {
+    'SkidNet_3': _entry('SkidNet', 'saved_models/SkidNet_3.pth'),
+    'Unet_3': _entry('UNet', 'saved_models/Unet_3.pth', use_attention_gate=True),
+    'new_Unet_2': _entry('UNet', 'saved_models/new_Unet_2.pth', use_attention_gate=True),
+    'baseline': _entry('Autoencoder', 'saved_models/baseline.pth'),
+
+    'SkidNet_50': _entry('SkidNet', 'saved_models/old_models/SkidNet_50.pth'),
+    'best_SkidNet_50': _entry('SkidNet', 'saved_models/old_models/best_SkidNet_50.pth'),
+    'bSkidNet_0.001': _entry('SkidNet', 'saved_models/old_models/bSkidNet_0.001.pth'),
+    'bSkidNet_50': _entry('SkidNet', 'saved_models/old_models/bSkidNet_50.pth'),
+    'nSkidNet_50': _entry('SkidNet', 'saved_models/old_models/nSkidNet_50.pth'),
+    'testing': _entry('SkidNet', 'saved_models/old_models/testing.pth'),
+    'SkidFCN': _entry('SkidFCN', 'saved_models/old_models/SkidFCN.pth'),
+    'SkidFCN_10': _entry('SkidFCN', 'saved_models/old_models/SkidFCN_10.pth'),
+    'SkidFCN_25': _entry('SkidFCN', 'saved_models/old_models/SkidFCN_25.pth'),
+    '512SuperMRI_50': _entry('UNet', 'saved_models/old_models/512SuperMRI_50.pth', use_attention_gate=True, max_blocks=3),
+    'bSuperMRI_0.001': _entry('UNet', 'saved_models/old_models/bSuperMRI_0.001.pth', use_attention_gate=True, max_blocks=3),
+    'bSuperMRI_10': _entry('UNet', 'saved_models/old_models/bSuperMRI_10.pth', use_attention_gate=True, max_blocks=3),
+    'bSuperMRI_50': _entry('UNet', 'saved_models/old_models/bSuperMRI_50.pth', use_attention_gate=True, max_blocks=3),
+    'nSuperMRI_10': _entry('UNet', 'saved_models/old_models/nSuperMRI_10.pth', use_attention_gate=True, max_blocks=3),
+    'nSuperMRI_50': _entry('UNet', 'saved_models/old_models/nSuperMRI_50.pth', use_attention_gate=True, max_blocks=3),
+    'conv_autoencoder': _entry('Autoencoder', 'saved_models/old_models/conv_autoencoder.pth', channels=3),
+    'conv_autoencoder_without_noise': _entry('Autoencoder', 'saved_models/old_models/conv_autoencoder_without_noise.pth', channels=3),
+    'conv_autoencoder_without': _entry('AutoencoderWithoutSkip', 'saved_models/old_models/conv_autoencoder_without.pth'),
+
+    'SkidNet_1': _entry('SkidNet', 'saved_models/old_pipeline/SkidNet_1.pth'),
+    'SkidNet_2': _entry('SkidNet', 'saved_models/old_pipeline/SkidNet_2.pth'),
+    'new_SkidNet': _entry('SkidNet', 'saved_models/old_pipeline/new_SkidNet.pth'),
+    'Unet_1': _entry('UNet', 'saved_models/old_pipeline/Unet_1.pth', use_attention_gate=True),
+    'Unet_2': _entry('UNet', 'saved_models/old_pipeline/Unet_2.pth', use_attention_gate=True),
+    'new_Unet': _entry('UNet', 'saved_models/old_pipeline/new_Unet.pth', use_attention_gate=True),
+
+    # cascades chain registered models, SkidNet first and UNet second
+    'Cascade_3': {'arch': 'Cascade', 'stages': ['SkidNet_3', 'Unet_3']},
+    'Cascade_2': {'arch': 'Cascade', 'stages': ['SkidNet_2', 'Unet_2']},
+}
+
+
+def build_model(name):
+    '''
+    Constructs the architecture of a registered model without loading its weights
+
+    Args:
+        name: the registry name of the model
+
+    Returns:
+        model: the randomly initialised model
+    '''
+    spec = REGISTRY[name]
+    if spec['arch'] == 'Cascade':
+        return models.Cascade(*[build_model(stage) for stage in spec['stages']])
+    return getattr(models, spec['arch'])(**spec['kwargs'])
+
+
+def load_registered(name, device='cpu'):
+    '''
+    Constructs a registered model and loads its checkpoint
+
+    Args:
+        name: the registry name of the model
+        device: the device to run the model on
+
+    Returns:
+        model: the loaded model in evaluation mode
+    '''
+    spec = REGISTRY[name]
+    if spec['arch'] == 'Cascade':
+        return models.Cascade(*[load_registered(stage, device) for stage in spec['stages']]).eval()
+    return load_model(build_model(name), spec['checkpoint'], device)
+
+
+def model_nbytes(model):
+    '''Returns the memory held by the parameters and buffers of a model in bytes'''
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelCache():
+    '''Keeps loaded models in memory and evicts the least recently used ones beyond a memory budget'''
+
+    def __init__(self, budget_mb=512, device='cpu'):
+        '''
+        Creates an empty cache
+
+        Args:
+            budget_mb: the memory the cached parameters and buffers may use, in megabytes
+            device: the device the models are loaded on
+        '''
+        self.budget = budget_mb * 1024 ** 2
+        self.device = device
+        self.models = OrderedDict()
+        self.sizes = {}
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        '''
+        Returns a loaded model, loading it and evicting older models when needed
+
+        Args:
+            name: the registry name of the model
+
+        Returns:
+            model: the loaded model in evaluation mode
+        '''
+        with self.lock:
+            if name in self.models:
+                self.hits += 1
+                self.models.move_to_end(name)
+                return self.models[name]
+
+            self.misses += 1
+            model = load_registered(name, self.device)
+            self.models[name] = model
+            self.sizes[name] = model_nbytes(model)
+
+            # the model just loaded is kept even if it exceeds the budget on its own
+            while self.nbytes > self.budget and len(self.models) > 1:
+                evicted, _ = self.models.popitem(last=False)
+                del self.sizes[evicted]
+                self.evictions += 1
+            return model
+
+    @property
+    def nbytes(self):
+        '''Returns the memory held by the cached models in bytes'''
+        return sum(self.sizes.values())
+
+    def __contains__(self, name):
+        return name in self.models
+
+    def __len__(self):
+        return len(self.models)
+
+    def stats(self):
+        '''Returns the cached names from least to most recently used with the hit, miss and eviction counts'''
+        return {
+            'models': list(self.models),
+            'mb': self.nbytes / 1024 ** 2,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
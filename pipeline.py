@@ -16,13 +16,16 @@ import torchvision.transforms.functional as TF
 from torchvision import utils
 from skimage.metrics import structural_similarity
 
-from models.AutoEncShallow import *
-from models.SkiDwithSkipUnet import *
-from models.SuperMRI import *
+from models.registry import ModelCache
+from utility.cascade_executor import CascadeExecutor
+from utility.telemetry import RunRecorder
+from utility.planner import apply_plan
+from utility.onnx_backend import ONNXModel
 
 
 # --------------------------- Reading the Data -------------------------- #
-batch_size = 16
+# threads and batch size calibrated for this host by plan.py, 16 without a plan
+batch_size, _ = apply_plan('Cascade_3', 256, 'inference', batch_size=16, device=getDevice())
 train_loader, val_loader, test_loader = loadData('data', batch_size, test_size=0.05, color='gray', noise=True)
 train_original, val_orginal, test_original = loadData('data', batch_size, test_size=0.05, color='gray', noise=False)
 print('Data Loading Complete!')
@@ -34,36 +37,37 @@ print('Data Loading Complete!')
 device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
 print(f'Device: {device}\n')
 
-# Initialize the models
-model1 = SkidNet()
-model1.load_state_dict(torch.load('saved_models/SkidNet_3.pth'))
-model1.to(device)
-
-model2 = UNet(use_attention_gate=True)
-model2.load_state_dict(torch.load('saved_models/Unet_3.pth'))
-model2.to(device)
+# Initialize the models, 'onnx' runs the exports written by export_onnx.py through ONNX Runtime
+backend = 'torch'
+if backend == 'onnx':
+    model1 = ONNXModel('saved_models/onnx/SkidNet_3.onnx')
+    model2 = ONNXModel('saved_models/onnx/Unet_3.onnx')
+else:
+    cache = ModelCache(device=device)
+    model1 = cache.get('SkidNet_3')
+    model2 = cache.get('Unet_3')
 
 # ----------------- Calculating the loss of the pipeline ---------------- #
+# Loading, SkidNet and UNet run as overlapping stages, so batch k+1 is in SkidNet while batch k is in UNet
 print('Calculating the loss of the pipeline:')
 total_loss = 0.0
 num_batches = 0
 criterion = nn.MSELoss()
-with torch.no_grad():
-    for i, (real, mod) in enumerate(tqdm.tqdm(zip(test_original, test_loader), total=len(test_loader))):
-        actual, _ = real
-        modif, _ = mod
-        modif = modif.to(device)
-
-        # Forward pass
-        outputs = model1(modif)
-        outputs = model2(outputs)
-
-        # Calculate reconstruction loss (MSE)
-        loss = criterion(outputs, actual)
-
-        total_loss += loss.item()
-        num_batches += 1
-print(f'Average Loss: {total_loss / num_batches}\n')
+executor = CascadeExecutor([
+    ('SkidNet', lambda batch: (batch[0], model1(batch[1].to(device)))),
+    ('UNet', lambda batch: (batch[0], model2(batch[1]))),
+])
+batches = ((real[0], mod[0]) for real, mod in zip(test_original, test_loader))
+for actual, outputs in tqdm.tqdm(executor.run(batches), total=len(test_loader)):
+    # Calculate reconstruction loss (MSE)
+    loss = criterion(outputs, actual.to(device))
+
+    total_loss += loss.item()
+    num_batches += 1
+average_loss = total_loss / num_batches
+print(f'Average Loss: {average_loss}')
+stats = executor.stats()
+print(' | '.join(f'{name} {stage["utilisation"]:.0%} busy' for name, stage in stats['stages'].items()) + f' | {stats["batches_per_s"] * batch_size:.1f} images/s\n')
 
 # ------------------ Calculating PSNR for the Pipeline ------------------ #
 print('Calculating PSNR for the Pipeline:')
@@ -86,10 +90,11 @@ with torch.no_grad():
             highest = torch.max(actual, dim = (1, 2)).item()
         else: highest = torch.max(actual).item()
 
-        mse = nn.functional.mse_loss(output, actual)
+        mse = nn.functional.mse_loss(output.float(), actual.float())
         psnr = 10 * torch.log10((highest ** 2) / mse)
         total_psnr += psnr.item(); num_batches += 1
-print(f'Average PSNR: {total_psnr / num_batches:.4f}\n')
+average_psnr = total_psnr / num_batches
+print(f'Average PSNR: {average_psnr:.4f}\n')
 
 
 # ------------------ Calculating SSIM for the pipeline ------------------ #
@@ -113,12 +118,15 @@ with torch.no_grad():
             ssim = structural_similarity(actual[j], output[j], data_range=1.0, full=True)
             total_ssim += ssim[0]
             num_batches += 1
-print(f'Average SSIM of the Model: {total_ssim / num_batches}\n')
+average_ssim = total_ssim / num_batches
+print(f'Average SSIM of the Model: {average_ssim}\n')
+RunRecorder('Cascade_3' if backend == 'torch' else 'Cascade_3-onnx', 'eval', config={'batch_size': batch_size, 'threads': torch.get_num_threads(), 'backend': backend, 'device': str(device)}).finish(
+    loss=average_loss, psnr=average_psnr, ssim=average_ssim, images_per_s=stats['batches_per_s'] * batch_size)
 
 
 # ---------------- Pushing the images through the models ---------------- #
 print('Generating images:')
-n = 5
+n = min(5, batch_size)
 original_images, intermediate_images, generated_images, actual_images = [], [], [], []
 random_indices = random.sample(range(batch_size), n)
 
@@ -0,0 +1,44 @@
+import argparse
+import json
+import warnings
+warnings.filterwarnings("ignore")
+
+from models.registry import REGISTRY, build_model
+from utility.planner import PLANS_PATH, MODES, calibrate, save_plan, load_plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate the threads, batch size and loader workers of a model on this host and save the plan '
+                                                 'that main.py, intermediate.py, pipeline.py and serve.py pick up')
+    parser.add_argument('--model', choices=sorted(REGISTRY), default='SkidNet_3')
+    parser.add_argument('--name', default=None, help='the name the plan is saved under, the model by default')
+    parser.add_argument('--resolution', type=int, default=256)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--threads', type=int, nargs='+', default=None, help='intra-op thread counts searched, powers of two up to the cores by default')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4, 8, 16, 32, 64])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, 8])
+    parser.add_argument('--headroom', type=float, default=0.25, help='share of the available memory left free')
+    parser.add_argument('--data', default=None, help='images the loader is timed on, generated phantoms by default')
+    parser.add_argument('--iters', type=int, default=3)
+    parser.add_argument('--path', default=PLANS_PATH)
+    parser.add_argument('--show', action='store_true', help='print the saved plans of the model instead of calibrating')
+    args = parser.parse_args()
+    name = args.name or args.model
+
+    for mode in args.modes:
+        if args.show:
+            print(f'{name} ({mode}): {json.dumps(load_plan(name, args.resolution, mode, args.path), indent=2)}')
+            continue
+        print(f'Calibrating {name} at {args.resolution}x{args.resolution} for {mode}:')
+        plan = calibrate(build_model(args.model), name, args.resolution, mode, threads=args.threads, batch_sizes=args.batch_sizes,
+                         workers=args.workers, headroom=args.headroom, data_dir=args.data, iters=args.iters)
+        save_plan(plan, name, args.resolution, mode, args.path)
+        print(f'Plan: {plan["threads"]} threads, batch size {plan["batch_size"]}, {plan["num_workers"]} workers, '
+              f'{plan["images_per_s"]:.1f} images/s, memory budget {plan["budget_mb"]:.0f} MB\n')
+    if not args.show:
+        print(f'Saved to {args.path}')
+
+
+# DataLoader workers import this module, only the main process calibrates
+if __name__ == '__main__':
+    main()
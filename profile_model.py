@@ -0,0 +1,41 @@
+import argparse
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+import torch.nn as nn
+
+import models
+from models.registry import REGISTRY, build_model
+from utility.profiling import profile_modules, write_profile
+
+
+parser = argparse.ArgumentParser(description='Profile every module of a model: time, MACs, parameters, tensors saved for backward and peak activation memory')
+parser.add_argument('model', help=f'registry name or architecture ({", ".join(models.__all__)})')
+parser.add_argument('--resolution', type=int, default=256)
+parser.add_argument('--batch-size', type=int, default=8)
+parser.add_argument('--iters', type=int, default=3, help='measured passes after one warm-up pass')
+parser.add_argument('--no-backward', action='store_true', help='only profile the forward pass')
+parser.add_argument('--sort', default='forward_ms', choices=['forward_ms', 'backward_ms', 'macs', 'params', 'saved_for_backward_mb', 'peak_activation_mb', 'output_mb'])
+parser.add_argument('--top', type=int, default=25, help='modules shown in the table')
+parser.add_argument('--csv', default=None, help='path of the full table as CSV')
+parser.add_argument('--trace', default=None, help='path of the Chrome trace of the last pass')
+args = parser.parse_args()
+
+model = build_model(args.model) if args.model in REGISTRY else getattr(models, args.model)()
+channels = next(m for m in model.modules() if isinstance(m, nn.Conv2d)).in_channels
+input_shape = (args.batch_size, channels, args.resolution, args.resolution)
+
+rows, trace, peak_mb = profile_modules(model, input_shape, iters=args.iters, backward=not args.no_backward)
+write_profile(rows, trace, args.csv, args.trace)
+
+total = {key: sum(row[key] for row in rows) for key in ['forward_ms', 'backward_ms', 'macs', 'params', 'saved_for_backward_mb', 'output_mb']}
+print(f'{args.model} | input {tuple(input_shape)} | CPU threads: {torch.get_num_threads()}')
+print(f'Forward {total["forward_ms"]:.1f} ms | backward {total["backward_ms"]:.1f} ms | {total["macs"] / 1e9:.2f} GMACs/img | '
+      f'{total["params"]:,} params | {total["saved_for_backward_mb"]:.1f} MB saved for backward | '
+      f'peak {peak_mb:.1f} MB of saved activations alive at once\n')
+
+print(f'{"Module":<40}{"Type":<18}{"Calls":>6}{"Fwd ms":>9}{"Bwd ms":>9}{"MMACs/img":>11}{"Params":>10}{"Out MB":>9}{"Bwd-saved MB":>14}{"Peak MB":>9}')
+for row in sorted(rows, key=lambda row: row[args.sort], reverse=True)[:args.top]:
+    print(f'{row["module"]:<40}{row["type"]:<18}{row["calls"]:>6}{row["forward_ms"]:>9.2f}{row["backward_ms"]:>9.2f}'
+          f'{row["macs"] / 1e6:>11.1f}{row["params"]:>10,}{row["output_mb"]:>9.2f}{row["saved_for_backward_mb"]:>14.2f}{row["peak_activation_mb"]:>9.2f}')
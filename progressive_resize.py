@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import time
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from models.registry import REGISTRY, build_model
+from utility.phantoms import write_phantoms
+from utility.progressive import ProgressiveResizing, parse_schedule
+from utility.utils import loadData, seeded_PSNR
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the wall-clock time to a target validation PSNR of fixed-resolution and progressive-resizing training')
+    parser.add_argument('--model', choices=sorted(REGISTRY), default='SkidNet_3', help='trained from random weights, e.g. SkidNet_3 or Unet_3')
+    parser.add_argument('--data', default=None, help='the data directory, phantoms generated into benchmarks/progressive by default')
+    parser.add_argument('--resolution', type=int, default=256, help='the final resolution, validation always runs at it')
+    parser.add_argument('--schedule', default='64:2,128:2', help="the progressive steps as resolution:epochs, e.g. '64:2,128:2'")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--scale-batch', action='store_true', help='grow the batch at low resolutions, keeping the pixels per step')
+    parser.add_argument('--runs', nargs='+', choices=['fixed', 'progressive'], default=['fixed', 'progressive'])
+    parser.add_argument('--target-psnr', type=float, default=24.0)
+    parser.add_argument('--budget-s', type=float, default=300, help='training seconds per run')
+    parser.add_argument('--eval-every-s', type=float, default=10, help='training seconds between validations')
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON file of the PSNR curves')
+    args = parser.parse_args()
+
+    device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
+    data_dir = args.data or os.path.join('benchmarks', 'progressive')
+    if args.data is None and not os.path.isdir(data_dir):
+        write_phantoms(data_dir, 1000, args.resolution, seed=args.seed)
+    _, val_loader, _ = loadData(data_dir, args.batch_size, test_size=0.2, color='gray', noise=True, backend='cache', image_size=args.resolution)
+
+    def validate(model):
+        # the same noise for every validation, so the curves differ only by the model
+        psnr = seeded_PSNR(model, val_loader, device, args.seed)
+        model.train()
+        return psnr
+
+    results = {}
+    print(f'{len(val_loader.dataset)} validation images at {args.resolution}px, target {args.target_psnr} dB, {args.budget_s:.0f} s per run\n')
+    for name in args.runs:
+        torch.manual_seed(args.seed)
+        model = build_model(args.model).to(device).train()
+        optimizer = optim.Adam(model.parameters(), lr=args.lr)
+        criterion = nn.MSELoss()
+        schedule = parse_schedule(args.schedule) if name == 'progressive' else []
+        progressive = ProgressiveResizing(data_dir, args.batch_size, args.resolution, schedule, scale_batch=args.scale_batch)
+        progressive.check(model)
+        # the caches are built before the clock starts, a later run at the same resolutions would find them on disk
+        progressive.prepare()
+
+        # only training time counts towards the budget and the time to target, validation is excluded
+        trained, since_eval, epoch, steps, curve, reached = 0.0, 0.0, 0, 0, [], None
+        seconds_at = {}
+        while trained < args.budget_s and reached is None:
+            resolution = progressive.resolution(epoch)
+            start = time.perf_counter()
+            for modif, actual in progressive.loader(epoch):
+                modif, actual = modif.to(device), actual.to(device)
+                optimizer.zero_grad()
+                loss = criterion(model(modif), actual)
+                loss.backward()
+                optimizer.step()
+                steps += 1
+                elapsed = time.perf_counter() - start
+                if since_eval + elapsed >= args.eval_every_s:
+                    trained, since_eval = trained + elapsed, 0.0
+                    seconds_at[resolution] = seconds_at.get(resolution, 0.0) + elapsed
+                    curve.append((trained, steps, resolution, validate(model)))
+                    print(f'  {name:<12} epoch {epoch + 1:>3} at {resolution:>4}px | {trained:7.1f} s | val PSNR {curve[-1][3]:.2f} dB')
+                    if curve[-1][3] >= args.target_psnr:
+                        reached = trained
+                    if reached is not None or trained >= args.budget_s:
+                        break
+                    start = time.perf_counter()
+            else:
+                elapsed = time.perf_counter() - start
+                trained, since_eval = trained + elapsed, since_eval + elapsed
+                seconds_at[resolution] = seconds_at.get(resolution, 0.0) + elapsed
+            epoch += 1
+        results[name] = {'time_to_target_s': reached, 'epochs': epoch, 'steps': steps, 'seconds_at': seconds_at,
+                         'best_psnr': max((c[3] for c in curve), default=None), 'curve': curve}
+
+    print(f'\n{"Run":<13}{"Time to " + str(args.target_psnr) + " dB":>18}{"Epochs":>8}{"Steps":>8}{"Best PSNR":>11}')
+    for name, result in results.items():
+        reached = f'{result["time_to_target_s"]:.1f} s' if result['time_to_target_s'] is not None else 'not reached'
+        best = f'{result["best_psnr"]:.2f}' if result['best_psnr'] is not None else '-'
+        print(f'{name:<13}{reached:>18}{result["epochs"]:>8}{result["steps"]:>8}{best:>11}')
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import time
+import warnings
+warnings.filterwarnings("ignore")
+
+import torch
+
+from models.registry import load_registered
+from utility.inference import read_image
+from utility.noise import gaussian_blur, add_poisson_noise, add_salt_and_pepper_noise, add_speckle_noise
+from utility.noise_estimation import noise_score, image_psnr, NoiseRouter, tune_thresholds
+from utility.streaming import iter_sources
+from utility.utils import split_data
+
+
+parser = argparse.ArgumentParser(description='Tune and evaluate noise-based routing of images through the cascade')
+parser.add_argument('--data', default='data', help='directory or tar archive of clean images, split like loadData')
+parser.add_argument('--size', type=int, default=256, help='height and width the images are resized to')
+parser.add_argument('--max-loss', type=float, default=0.5, help='allowed drop of the mean PSNR in dB')
+parser.add_argument('--test-size', type=float, default=0.2, help='the test_size of loadData, thresholds are tuned on its validation set and evaluated on its test set')
+parser.add_argument('--batch-size', type=int, default=16)
+parser.add_argument('--limit', type=int, default=None, help='use at most this many images of each set')
+parser.add_argument('--seed', type=int, default=0)
+args = parser.parse_args()
+
+random.seed(args.seed)
+torch.manual_seed(args.seed)
+
+
+def add_noise(image):
+    '''Applies the noise of the training data, every type with probability 0.4, so some images stay clean'''
+    for noise, p in [(lambda x: gaussian_blur(x, kernel_size=15, sigma=1), 0.4), (lambda x: add_poisson_noise(x, 0.1), 0.4),
+                     (add_speckle_noise, 0.4), (lambda x: add_salt_and_pepper_noise(x, 0.05, 0.05), 0.4)]:
+        if random.random() < p:
+            image = noise(image)
+    return image.clamp(0, 1)
+
+
+# --------------------------- Reading the Data -------------------------- #
+# the held-out validation and test sets of loadData, the models were trained on the rest
+if os.path.isdir(args.data):
+    # listed in the order of loadData, so the split is the same
+    sources = [(name, os.path.join(args.data, name)) for name in os.listdir(args.data)]
+else:
+    sources = list(iter_sources(args.data))
+_, val_sources, test_sources = split_data(sources, args.test_size)
+
+
+def read(sources):
+    clean = torch.cat([read_image(payload, args.size) for _, payload in sources[:args.limit]])
+    return torch.stack([add_noise(image) for image in clean]), clean
+
+
+val_noisy, val_clean = read(val_sources)
+test_noisy, test_clean = read(test_sources)
+print(f'{len(val_clean)} validation images for tuning | {len(test_clean)} test images for evaluation\n')
+
+skidnet, unet = load_registered('SkidNet_3'), load_registered('Unet_3')
+stages = [skidnet, unet]
+
+
+def batches(noisy, clean):
+    for i in range(0, len(clean), args.batch_size):
+        yield noisy[i:i + args.batch_size], clean[i:i + args.batch_size]
+
+
+# -------------------------- Tuning on validation ----------------------- #
+# PSNR after 0, 1 and 2 stages for every image, and the seconds per image of every depth
+scores, psnr, seconds = [], [], torch.zeros(len(stages) + 1)
+with torch.no_grad():
+    for x, target in batches(val_noisy, val_clean):
+        start = time.perf_counter()
+        scores.append(noise_score(x))
+        seconds[0] += time.perf_counter() - start
+
+        row = [image_psnr(x, target)]
+        for k, stage in enumerate(stages):
+            start = time.perf_counter()
+            x = stage(x)
+            seconds[k + 1] += time.perf_counter() - start
+            row.append(image_psnr(x, target))
+        psnr.append(torch.stack(row, dim=1))
+scores, psnr = torch.cat(scores), torch.cat(psnr)
+costs = (seconds.cumsum(0) / len(val_clean)).tolist()
+
+thresholds, loss, cost = tune_thresholds(scores, psnr, costs, args.max_loss)
+print(f'Mean PSNR after 0 / 1 / 2 stages: {" / ".join(f"{p:.2f}" for p in psnr.mean(0).tolist())} dB')
+print(f'Thresholds: {", ".join(f"{t:.4f}" for t in thresholds)} | expected loss {loss:.3f} dB | expected cost {cost * 1000:.1f} ms/img (full cascade {costs[-1] * 1000:.1f} ms/img)\n')
+
+# ------------------------ Evaluating on the test set ------------------- #
+router = NoiseRouter(stages, thresholds)
+results = {}
+for name, run in [('Full cascade', lambda x: unet(skidnet(x))), ('Routed', router)]:
+    total_psnr, elapsed = 0.0, 0.0
+    with torch.no_grad():
+        for x, target in batches(test_noisy, test_clean):
+            start = time.perf_counter()
+            output = run(x)
+            elapsed += time.perf_counter() - start
+            total_psnr += image_psnr(output, target).sum().item()
+    results[name] = (total_psnr / len(test_clean), len(test_clean) / elapsed)
+    print(f'{name:<14} PSNR {results[name][0]:.2f} dB | {results[name][1]:.1f} images/s')
+
+fractions = router.fractions()
+print(f'\nSkipped denoising: {fractions[0]:.0%} | SkidNet only: {fractions[1]:.0%} | full cascade: {fractions[2]:.0%}')
+print(f'Throughput gain: {results["Routed"][1] / results["Full cascade"][1]:.2f}x | PSNR loss: {results["Full cascade"][0] - results["Routed"][0]:.2f} dB')
@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import torch
+
+from models.registry import REGISTRY, ModelCache
+from utility.serving import ServingMetrics, MicroBatcher
+from utility.streaming import decode
+from utility.inference import write_image
+from utility.planner import apply_plan
+
+
+parser = argparse.ArgumentParser(description='Serve the denoisers over HTTP on localhost with dynamic micro-batching')
+parser.add_argument('--host', default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8080)
+parser.add_argument('--models', nargs='+', choices=sorted(REGISTRY), default=['Cascade_3'], help='models loaded and warmed up at start-up')
+parser.add_argument('--size', type=int, default=256, help='height and width the images are resized to')
+parser.add_argument('--max-batch', type=int, default=None, help='largest micro-batch formed, from the plan of the first model or 16')
+parser.add_argument('--max-wait-ms', type=float, default=10.0, help='milliseconds a micro-batch waits for more requests')
+parser.add_argument('--threads', type=int, default=None, help='intra-op threads used for inference, from the plan of the first model by default')
+parser.add_argument('--codec-threads', type=int, default=4, help='threads decoding and encoding images')
+parser.add_argument('--budget-mb', type=int, default=512, help='memory budget of the model cache')
+args = parser.parse_args()
+
+# threads and batch size calibrated for this host by plan.py, the arguments take precedence
+planned_batch, _ = apply_plan(args.models[0], args.size, 'inference', batch_size=16)
+args.max_batch = args.max_batch or planned_batch
+if args.threads:
+    torch.set_num_threads(args.threads)
+
+# ---------------------------- Inference -------------------------------- #
+# every forward pass runs on one dedicated thread, decoding and encoding on a separate pool,
+# so the event loop only parses requests and forms batches
+inference_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+codec_pool = ThreadPoolExecutor(max_workers=args.codec_threads, thread_name_prefix='codec')
+cache = ModelCache(budget_mb=args.budget_mb)
+metrics = ServingMetrics()
+batchers = {}
+
+
+def infer(name, images):
+    model = cache.get(name)
+    with torch.no_grad():
+        return list(model(torch.cat(images)))
+
+
+def warm_up(name):
+    '''Loads a model and runs it on a single image and on a full batch, so the first requests are not slowed down'''
+    for batch_size in [1, args.max_batch]:
+        infer(name, [torch.rand(1, 1, args.size, args.size) for _ in range(batch_size)])
+
+
+def encode(image):
+    buffer = io.BytesIO()
+    write_image(image, buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def batcher(name):
+    if name not in batchers:
+        async def run_batch(images):
+            return await asyncio.get_running_loop().run_in_executor(inference_thread, infer, name, images)
+        batchers[name] = MicroBatcher(run_batch, args.max_batch, args.max_wait_ms / 1000, metrics).start()
+    return batchers[name]
+
+
+# ------------------------------ Routes --------------------------------- #
+async def denoise(query, body):
+    name = query.get('model', [args.models[0]])[0]
+    if name not in REGISTRY:
+        return 404, 'text/plain', f'Unknown model {name}\n'.encode()
+
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        image = await loop.run_in_executor(codec_pool, decode, body, args.size)
+    except Exception as error:
+        metrics.errors += 1
+        return 400, 'text/plain', f'Could not decode the image: {error}\n'.encode()
+
+    output = await batcher(name).submit(image)
+    payload = await loop.run_in_executor(codec_pool, encode, output)
+    metrics.record_request(name, time.perf_counter() - start)
+    return 200, 'image/png', payload
+
+
+async def route(method, target, body):
+    url = urlsplit(target)
+    if url.path == '/denoise' and method == 'POST':
+        return await denoise(parse_qs(url.query), body)
+    if url.path == '/metrics' and method == 'GET':
+        return 200, 'application/json', json.dumps(metrics.summary(), indent=2).encode()
+    if url.path == '/health' and method == 'GET':
+        return 200, 'application/json', json.dumps(cache.stats()).encode()
+    return 404, 'text/plain', b'Not found\n'
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+
+async def handle(reader, writer):
+    '''Answers the HTTP/1.1 requests of one connection, keeping it open unless the client asks otherwise'''
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            try:
+                status, content_type, payload = await route(method, target, body)
+            except Exception as error:
+                metrics.errors += 1
+                status, content_type, payload = 500, 'text/plain', f'{error}\n'.encode()
+
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            writer.write(
+                f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + payload
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    for name in args.models:
+        start = time.time()
+        await loop.run_in_executor(inference_thread, warm_up, name)
+        print(f'Loaded and warmed up {name} in {time.time() - start:.2f} s')
+
+    server = await asyncio.start_server(handle, args.host, args.port)
+    print(f'Serving {", ".join(args.models)} on http://{args.host}:{args.port} (max batch {args.max_batch}, max wait {args.max_wait_ms} ms)')
+    async with server:
+        await server.serve_forever()
+
+
+try:
+    asyncio.run(main())
+except KeyboardInterrupt:
+    print(json.dumps(metrics.summary(), indent=2))
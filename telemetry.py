@@ -0,0 +1,71 @@
+import argparse
+import sys
+import time
+
+from utility.telemetry import TELEMETRY_PATH, load_runs, run_metrics, find_regressions
+
+
+parser = argparse.ArgumentParser(description='Query the run telemetry and flag regressions against previous runs')
+parser.add_argument('--path', default=TELEMETRY_PATH, help='the JSONL telemetry store')
+commands = parser.add_subparsers(dest='command', required=True)
+
+list_parser = commands.add_parser('list', help='list the recorded runs')
+list_parser.add_argument('--model', default=None, help='only runs of this model')
+list_parser.add_argument('--kind', choices=['train', 'eval'], default=None)
+
+show_parser = commands.add_parser('show', help='print the config and every epoch of a run')
+show_parser.add_argument('run_id')
+
+compare_parser = commands.add_parser('compare', help='compare a run with the median of the previous runs of its model')
+compare_parser.add_argument('--run', default=None, help='run id, the latest run if not given')
+compare_parser.add_argument('--model', default=None, help='check the latest run of this model')
+compare_parser.add_argument('--baseline-runs', type=int, default=5)
+compare_parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative change of throughput, time, memory and loss')
+compare_parser.add_argument('--psnr-tolerance', type=float, default=0.5, help='allowed PSNR drop in dB')
+compare_parser.add_argument('--ssim-tolerance', type=float, default=0.01, help='allowed SSIM drop')
+args = parser.parse_args()
+
+runs = load_runs(args.path)
+if not runs:
+    sys.exit(f'No runs recorded in {args.path}')
+
+
+def fmt(value):
+    return f'{value:.4g}' if isinstance(value, float) else str(value)
+
+
+if args.command == 'list':
+    print(f'{"Run":<24}{"Model":<20}{"Kind":<7}{"Git":<14}{"Epochs":>7}{"img/s":>9}{"PSNR":>8}{"SSIM":>8}')
+    for run_id, run in runs.items():
+        if (args.model and run['model'] != args.model) or (args.kind and run['kind'] != args.kind):
+            continue
+        metrics = run_metrics(run)
+        print(f'{run_id:<24}{run["model"]:<20}{run["kind"]:<7}{(run["git"] or "-")[:12]:<14}{len(run["epochs"]):>7}'
+              f'{fmt(metrics.get("images_per_s", "-")):>9}{fmt(metrics.get("psnr", "-")):>8}{fmt(metrics.get("ssim", "-")):>8}')
+
+elif args.command == 'show':
+    run = runs[args.run_id]
+    print(f'{args.run_id} | {run["model"]} | {run["kind"]} | git {run["git"]} | host {run["host"]} | {time.ctime(run["time"])}')
+    print(f'Config: {run["config"]}')
+    for epoch in run['epochs']:
+        print('  ' + ' | '.join(f'{key} {fmt(value)}' for key, value in epoch.items()))
+    if run['result']:
+        print('Result: ' + ' | '.join(f'{key} {fmt(value)}' for key, value in run['result'].items()))
+
+else:
+    run_id = args.run
+    if args.model and not run_id:
+        matching = [r for r, run in runs.items() if run['model'] == args.model]
+        if not matching:
+            sys.exit(f'No runs of {args.model}')
+        run_id = matching[-1]
+    run, rows = find_regressions(runs, run_id, args.baseline_runs, args.tolerance, args.psnr_tolerance, args.ssim_tolerance)
+
+    print(f'{run["run_id"]} ({run["model"]}, {run["kind"]}) against the median of up to {args.baseline_runs} previous runs\n')
+    if not rows:
+        sys.exit('No previous runs of this model to compare with')
+    print(f'{"Metric":<22}{"Value":>12}{"Baseline":>12}{"Change":>12}')
+    for row in rows:
+        print(f'{row["metric"]:<22}{fmt(row["value"]):>12}{fmt(row["baseline"]):>12}{fmt(row["change"]):>12}{"  REGRESSION" if row["regressed"] else ""}')
+    # a non-zero exit status lets scripts stop on a regression
+    sys.exit(1 if any(row['regressed'] for row in rows) else 0)
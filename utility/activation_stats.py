@@ -0,0 +1,188 @@
+import collections
+import json
+import math
+
+import torch
+import torch.nn as nn
+
+LAYER_TYPES = (
+    nn.Conv2d, nn.ConvTranspose2d, nn.Linear,
+    nn.BatchNorm2d, nn.InstanceNorm2d,
+    nn.ReLU, nn.LeakyReLU, nn.ELU, nn.GELU, nn.Sigmoid, nn.Tanh,
+)
+
+
+class ChannelStats():
+    '''
+    Running per-channel statistics of one layer output in constant memory: Welford mean and variance,
+    min, max, the fraction of zeros, and a histogram whose symmetric range doubles when values fall outside
+    '''
+
+    def __init__(self, channels, bins=64):
+        assert bins % 4 == 0, 'the histogram needs a multiple of 4 bins to double its range'
+        self.channels = channels
+        self.bins = bins
+        self.count = 0
+        self.mean = torch.zeros(channels, dtype=torch.float64)
+        self.m2 = torch.zeros(channels, dtype=torch.float64)
+        self.min = torch.full((channels,), math.inf, dtype=torch.float64)
+        self.max = torch.full((channels,), -math.inf, dtype=torch.float64)
+        self.zeros = torch.zeros(channels, dtype=torch.float64)
+        self.histogram = torch.zeros(channels, bins, dtype=torch.float64)
+        self.range = None
+
+    def _double_range(self):
+        # every pair of bins merges into one and the result fills the middle half of the new range
+        merged = self.histogram.view(self.channels, self.bins // 2, 2).sum(dim=2)
+        self.histogram.zero_()
+        self.histogram[:, self.bins // 4:3 * self.bins // 4] = merged
+        self.range *= 2
+
+    def update(self, x):
+        '''
+        Adds a batch of outputs
+
+        Args:
+            x: tensor of shape (N, C, ...) with C equal to channels
+        '''
+        x = x.detach().transpose(0, 1).reshape(self.channels, -1).double().cpu()
+        n = x.shape[1]
+
+        # Chan et al.'s merge of the batch moments into the running moments
+        batch_mean = x.mean(dim=1)
+        batch_m2 = ((x - batch_mean[:, None]) ** 2).sum(dim=1)
+        delta = batch_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        self.min = torch.minimum(self.min, x.amin(dim=1))
+        self.max = torch.maximum(self.max, x.amax(dim=1))
+        self.zeros += (x == 0).sum(dim=1)
+
+        largest = x.abs().max().item()
+        if self.range is None:
+            self.range = 2.0 ** math.ceil(math.log2(largest)) if largest > 0 else 1.0
+        while largest > self.range:
+            self._double_range()
+        index = ((x + self.range) / (2 * self.range) * self.bins).long().clamp(0, self.bins - 1)
+        index += torch.arange(self.channels)[:, None] * self.bins
+        self.histogram += torch.bincount(index.flatten(), minlength=self.channels * self.bins).view(self.channels, self.bins)
+
+    @property
+    def variance(self):
+        return self.m2 / max(self.count - 1, 1)
+
+    def quantile(self, q):
+        '''Returns the q-quantile of the absolute values over all channels, read from the histogram'''
+        edges = torch.linspace(-self.range, self.range, self.bins + 1)
+        width = edges[1] - edges[0]
+        # fold the histogram onto absolute values
+        counts = self.histogram.sum(dim=0)
+        folded = counts[self.bins // 2:] + counts[:self.bins // 2].flip(0)
+        cumulative = folded.cumsum(0) / folded.sum()
+        return ((torch.searchsorted(cumulative, torch.tensor(q, dtype=cumulative.dtype)) + 1) * width).item()
+
+    def summary(self):
+        std = self.variance.sqrt()
+        return {
+            'channels': self.channels,
+            'mean': self.mean.mean().item(),
+            'std': std.mean().item(),
+            'min': self.min.min().item(),
+            'max': self.max.max().item(),
+            'abs_p99.9': self.quantile(0.999),
+            'sparsity': (self.zeros.sum() / (self.count * self.channels)).item(),
+            'dead_channels': int(((self.zeros == self.count) | (std == 0)).sum().item()),
+        }
+
+    def state(self):
+        '''Returns the per-channel statistics as lists, for saving'''
+        return {
+            'count': self.count,
+            'mean': self.mean.tolist(),
+            'var': self.variance.tolist(),
+            'min': self.min.tolist(),
+            'max': self.max.tolist(),
+            'sparsity': (self.zeros / max(self.count, 1)).tolist(),
+            'histogram_range': self.range,
+            'histogram': self.histogram.sum(dim=0).tolist(),
+        }
+
+
+class ActivationStatsCollector():
+    '''Collects ChannelStats for the output of every conv, norm and activation module of a model'''
+
+    def __init__(self, model, layer_types=LAYER_TYPES, bins=64):
+        '''
+        Registers the hooks
+
+        Args:
+            model: any model of models/
+            layer_types: the module types whose outputs are tracked
+            bins: the number of histogram bins per channel
+        '''
+        self.model = model
+        self.bins = bins
+        self.stats = collections.OrderedDict()
+        self.calls = collections.Counter()
+        # modules called more than once per forward pass, such as the shared ReLU of SkidNet,
+        # get one entry per call
+        self.hooks = [model.register_forward_pre_hook(lambda *_: self.calls.clear())]
+        for name, module in model.named_modules():
+            if isinstance(module, layer_types):
+                self.hooks.append(module.register_forward_hook(self._hook(name)))
+
+    def _hook(self, name):
+        def hook_fn(module, input, output):
+            key = (name, self.calls[name])
+            self.calls[name] += 1
+            if key not in self.stats:
+                self.stats[key] = ChannelStats(output.shape[1], self.bins)
+            self.stats[key].update(output)
+        return hook_fn
+
+    def run(self, loader, device='cpu', max_batches=None):
+        '''
+        Runs the model over a DataLoader of (images, _) batches to accumulate the statistics
+
+        Returns:
+            self
+        '''
+        import tqdm
+
+        self.model.eval()
+        with torch.no_grad():
+            for i, (images, _) in enumerate(tqdm.tqdm(loader, total=max_batches or len(loader))):
+                if max_batches is not None and i == max_batches:
+                    break
+                self.model(images.to(device))
+        return self
+
+    def _names(self):
+        repeated = {name for name, call in self.stats if call > 0}
+        return {key: f'{key[0]}[{key[1]}]' if key[0] in repeated else key[0] for key in self.stats}
+
+    def report(self):
+        '''Returns the summary of every tracked layer, in the order the layers ran'''
+        names = self._names()
+        return [{'layer': names[key], **stats.summary()} for key, stats in self.stats.items()]
+
+    def format_report(self):
+        '''Returns the report as a fixed-width table'''
+        lines = [f'{"Layer":<40}{"Ch":>5}{"Mean":>10}{"Std":>10}{"Min":>10}{"Max":>10}{"|x| p99.9":>11}{"Sparsity":>10}{"Dead":>6}']
+        for row in self.report():
+            lines.append(f'{row["layer"]:<40}{row["channels"]:>5}{row["mean"]:>10.3f}{row["std"]:>10.3f}{row["min"]:>10.3f}'
+                         f'{row["max"]:>10.3f}{row["abs_p99.9"]:>11.3f}{row["sparsity"]:>10.1%}{row["dead_channels"]:>6}')
+        return '\n'.join(lines)
+
+    def save(self, path):
+        '''Writes the report and the per-channel statistics of every layer as JSON'''
+        names = self._names()
+        with open(path, 'w') as f:
+            json.dump({'report': self.report(), 'channels': {names[key]: stats.state() for key, stats in self.stats.items()}}, f)
+
+    def close(self):
+        for hook in self.hooks:
+            hook.remove()
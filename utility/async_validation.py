@@ -0,0 +1,162 @@
+import json
+import math
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import torch
+
+SPLITS = {'train': 0, 'val': 1, 'test': 2}
+
+
+class AsyncValidator():
+    '''
+    Validates snapshots of the weights in a separate process while training continues. The worker computes the
+    loss, PSNR and SSIM of every snapshot, and when a result arrives the snapshot replaces the best model if its
+    loss is the lowest so far. Training blocks only when it runs more than max_lag epochs ahead of validation
+    '''
+
+    def __init__(self, arch, data_dir, batch_size, best_path, model_kwargs=None, test_size=0.2, noise=True, split='test',
+                 device='cpu', threads=1, max_lag=1, best_loss=float('inf'), sequential=None, snapshot_dir=None, seed=0):
+        '''
+        Starts the worker, which loads the data once
+
+        Args:
+            arch: the class name in models, e.g. 'SkidNet'
+            data_dir, batch_size, test_size, noise: the arguments of loadData in the worker
+            best_path: where the best snapshot is saved
+            model_kwargs: the arguments of the model class
+            split: the loader validated on, 'train', 'val' or 'test'
+            device: the device the worker runs the model on
+            threads: the intra-op threads of the worker, kept low to leave the cores to training
+            max_lag: the epochs training may run ahead of the last validated epoch, 0 validates synchronously
+            best_loss: the loss a snapshot has to beat to be saved
+            sequential: None validates on the whole split, a dict of sequential_validate arguments (possibly empty)
+                validates shuffled batches only until the confidence intervals decide
+            snapshot_dir: where the snapshots wait for validation, on the filesystem of best_path, by default a
+                temporary directory next to it
+            seed: seeds the noise of the inputs before every validation, so every snapshot sees the same noisy images
+        '''
+        self.best_path = best_path
+        self.best_loss = best_loss
+        self.best_ci = 0.0
+        self.max_lag = max_lag
+        # next to best_path by default, the best snapshot is moved there with os.replace which cannot cross filesystems
+        self._scratch = None if snapshot_dir else tempfile.TemporaryDirectory(prefix='.snapshots_', dir=os.path.dirname(best_path) or '.')
+        self.snapshot_dir = snapshot_dir or self._scratch.name
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.pending = {}
+        self.results = queue.Queue()
+
+        config = {'arch': arch, 'model_kwargs': model_kwargs or {}, 'data_dir': data_dir, 'batch_size': batch_size,
+                  'test_size': test_size, 'noise': noise, 'split': split, 'device': str(device), 'threads': threads, 'sequential': sequential, 'seed': seed}
+        # a fresh interpreter rather than multiprocessing, which would run the unguarded training script again on spawn
+        self.process = subprocess.Popen([sys.executable, '-m', 'utility.async_validation', json.dumps(config)],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.results.put(json.loads(line))
+        self.results.put(None)
+
+    def submit(self, epoch, model):
+        '''
+        Snapshots the weights of an epoch and queues their validation, then waits while more than max_lag epochs are pending
+
+        Returns:
+            results: the results that arrived meanwhile, see poll
+        '''
+        path = os.path.join(self.snapshot_dir, f'epoch_{epoch}.pth')
+        torch.save({name: tensor.detach().to('cpu') for name, tensor in model.state_dict().items()}, path)
+        self.pending[epoch] = path
+        # the best loss known now, a sequential validation stops early once it is clearly above or below it
+        best_loss = self.best_loss if math.isfinite(self.best_loss) else None
+        self.process.stdin.write(json.dumps({'epoch': epoch, 'weights': path, 'best_loss': best_loss, 'best_ci': self.best_ci}) + '\n')
+        self.process.stdin.flush()
+
+        results = self.poll()
+        while len(self.pending) > self.max_lag:
+            results.append(self._receive(block=True))
+        return results
+
+    def poll(self):
+        '''
+        Returns:
+            results: one dict per validated epoch with its epoch, val_loss, psnr, ssim, the seconds it took, how many
+                epochs training had moved on when it arrived (lag), and whether it became the best model. Sequential
+                validations add the confidence interval half widths, the images used and why they stopped
+        '''
+        results = []
+        while True:
+            result = self._receive(block=False)
+            if result is None:
+                return results
+            results.append(result)
+
+    def close(self):
+        '''Waits for the pending validations, stops the worker and returns the remaining results'''
+        results = [self._receive(block=True) for _ in range(len(self.pending))]
+        self.process.stdin.close()
+        self.process.wait()
+        if self._scratch:
+            self._scratch.cleanup()
+        return results
+
+    def _receive(self, block):
+        try:
+            result = self.results.get(block=block)
+        except queue.Empty:
+            return None
+        if result is None:
+            raise RuntimeError(f'The validation worker exited with code {self.process.wait()}')
+        path = self.pending.pop(result['epoch'])
+        result['lag'] = max(self.pending, default=result['epoch']) - result['epoch']
+        result['best'] = result['val_loss'] < self.best_loss
+        if result['best']:
+            self.best_loss, self.best_ci = result['val_loss'], result.get('val_loss_ci', 0.0)
+            os.replace(path, self.best_path)
+        else:
+            os.remove(path)
+        return result
+
+
+def _serve(config):
+    '''The worker: validates every snapshot named on stdin and writes one JSON result per line to stdout'''
+    import numpy as np
+    import torch.nn as nn
+    import models
+    from utility.utils import loadData, PSNR, SSIM
+    from utility.sequential_validation import sequential_validate
+
+    # tqdm and any other output go to stderr, stdout only carries results
+    results, sys.stdout = sys.stdout, sys.stderr
+    torch.set_num_threads(config['threads'])
+    device = torch.device(config['device'])
+    loader = loadData(config['data_dir'], config['batch_size'], test_size=config['test_size'], color='gray', noise=config['noise'])[SPLITS[config['split']]]
+    model = getattr(models, config['arch'])(**config['model_kwargs']).to(device)
+    criterion = nn.MSELoss()
+
+    for line in sys.stdin:
+        job = json.loads(line)
+        start = time.perf_counter()
+        model.load_state_dict(torch.load(job['weights'], map_location=device))
+        # the same noise draws for every job, so results differ only by the weights
+        torch.manual_seed(config['seed'])
+        np.random.seed(config['seed'])
+        if config['sequential'] is None:
+            val_loss, psnr = PSNR(model, loader, device, loss_report=True, loss_criterion=criterion)
+            result = {'val_loss': val_loss, 'psnr': psnr, 'ssim': SSIM(model, loader, device)}
+        else:
+            result = sequential_validate(model, loader, device, best_loss=job['best_loss'], best_ci=job['best_ci'], **config['sequential'])
+        results.write(json.dumps({'epoch': job['epoch'], **result, 'seconds': time.perf_counter() - start}) + '\n')
+        results.flush()
+
+
+if __name__ == '__main__':
+    _serve(json.loads(sys.argv[1]))
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import torch
+
+from models import AttentionGate
+
+
+class AttentionRecorder():
+    '''Captures the attention masks of every AttentionGate of a model in a single forward pass'''
+
+    def __init__(self, model):
+        '''
+        Registers a hook on the sigmoid of every attention gate
+
+        Args:
+            model: the model containing the gates, e.g. UNet(use_attention_gate=True)
+        '''
+        self.masks = {}
+        self.hooks = []
+        for name, module in model.named_modules():
+            if isinstance(module, AttentionGate):
+                self.hooks.append(module.sigmoid.register_forward_hook(self._hook(name)))
+
+    def _hook(self, name):
+        def hook_fn(module, input, output):
+            self.masks[name] = output.detach()
+        return hook_fn
+
+    def close(self):
+        for hook in self.hooks:
+            hook.remove()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_attention_maps(model, loader, output_dir, device='cpu'):
+    '''
+    Streams the attention masks of every gate for a whole dataset to disk as float16 arrays, one
+    .npy file per gate of shape (images, height, width) that can be memory-mapped for auditing
+
+    Args:
+        model: the model containing the gates
+        loader: DataLoader yielding (images, _) batches
+        output_dir: the directory the arrays and the list of image paths are written to
+        device: the device to run the model on
+
+    Returns:
+        paths: dict mapping every gate name to the path of its array
+    '''
+    import tqdm
+    from numpy.lib.format import open_memmap
+
+    os.makedirs(output_dir, exist_ok=True)
+    total = len(loader.dataset)
+    maps, offset = {}, 0
+    model.eval()
+
+    with AttentionRecorder(model) as recorder, torch.no_grad():
+        for images, _ in tqdm.tqdm(loader):
+            model(images.to(device))
+            for name, mask in recorder.masks.items():
+                if name not in maps:
+                    path = os.path.join(output_dir, f'{name}.npy')
+                    maps[name] = open_memmap(path, mode='w+', dtype=np.float16, shape=(total,) + tuple(mask.shape[-2:]))
+                maps[name][offset:offset + len(images)] = mask[:, 0].cpu().half().numpy()
+            offset += len(images)
+
+    for array in maps.values():
+        array.flush()
+    if hasattr(loader.dataset, 'data'):
+        with open(os.path.join(output_dir, 'images.txt'), 'w') as f:
+            f.write('\n'.join(loader.dataset.data[:offset]) + '\n')
+    return {name: array.filename for name, array in maps.items()}
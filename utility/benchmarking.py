@@ -0,0 +1,91 @@
+import time
+
+import torch
+
+
+def measure_latency(model, input_shape, device='cpu', warmup=3, iters=10):
+    '''
+    Times the forward pass of a model on random input
+
+    Args:
+        model: the model to be timed
+        input_shape: the shape of the input batch, e.g. (1, 1, 256, 256)
+        device: the device to run the model on
+        warmup: the number of untimed iterations run first
+        iters: the number of timed iterations
+
+    Returns:
+        latencies: the wall time in seconds of every timed iteration
+    '''
+    model.eval()
+    x = torch.rand(*input_shape, device=device)
+    latencies = []
+
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(x)
+
+        for _ in range(iters):
+            start = time.perf_counter()
+            model(x)
+            latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def percentile(values, q):
+    '''
+    Returns the q-th percentile of a list of values using linear interpolation
+
+    Args:
+        values: the values to summarise
+        q: the percentile in the range [0, 100]
+
+    Returns:
+        the percentile value, or 0.0 for an empty list
+    '''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def measure_train_step(model, input_shape, device='cpu', warmup=3, iters=10, lr=1e-3):
+    '''
+    Times full training steps (forward, MSE loss, backward and Adam step) on random input and target.
+    The steps update the live parameters of the model in place, their values are saved first and restored
+    afterwards, so the model must not be used elsewhere, e.g. by another thread, while it is being timed
+
+    Args:
+        model: the model to be timed
+        input_shape: the shape of the input batch, e.g. (8, 1, 256, 256)
+        device: the device to run the model on
+        warmup: the number of untimed steps run first
+        iters: the number of timed steps
+        lr: the learning rate of the optimizer
+
+    Returns:
+        latencies: the wall time in seconds of every timed step
+    '''
+    state = {key: value.clone() for key, value in model.state_dict().items()}
+    model.train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    criterion = torch.nn.MSELoss()
+    x = torch.rand(*input_shape, device=device)
+    latencies = []
+
+    for i in range(warmup + iters):
+        start = time.perf_counter()
+        optimizer.zero_grad()
+        loss = criterion(model(x), x)
+        loss.backward()
+        optimizer.step()
+        if i >= warmup:
+            latencies.append(time.perf_counter() - start)
+
+    model.load_state_dict(state)
+    model.eval()
+    return latencies
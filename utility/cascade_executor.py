@@ -0,0 +1,164 @@
+import queue
+import threading
+import time
+
+import torch
+
+_DONE = object()
+
+
+class _Failure():
+    def __init__(self, error):
+        self.error = error
+
+
+class CascadeExecutor():
+    '''
+    Runs loading and the stages of a cascade as a pipeline, each on its own thread and connected by bounded
+    queues, so batch k+1 goes through the first stage while batch k is still in the second
+    '''
+
+    def __init__(self, stages, max_pending=2, threads=None):
+        '''
+        Creates the executor, the pipeline is started by run()
+
+        Args:
+            stages: list of (name, fn) pairs, fn maps the item of one batch to the item passed to the next stage
+            max_pending: the number of batches allowed to wait between two stages
+            threads: list with the intra-op threads of every stage, or None to keep the torch default.
+                With OpenMP the count is set per thread, so the stages do not compete for the same cores
+        '''
+        self.stages = stages
+        self.max_pending = max_pending
+        self.threads = threads
+        self.busy, self.items, self.wall = {}, {}, 0.0
+
+    def _put(self, q, item, stop):
+        # gives up once the pipeline is stopped, so no thread stays blocked on a full queue
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _feed(self, source, output, stop):
+        iterator = iter(source)
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                self.busy['load'] += time.perf_counter() - start
+                self.items['load'] += 1
+                self._put(output, item, stop)
+        except Exception as error:
+            self._put(output, _Failure(error), stop)
+        self._put(output, _DONE, stop)
+
+    def _work(self, name, fn, threads, input, output, stop):
+        if threads:
+            torch.set_num_threads(threads)
+        with torch.no_grad():
+            while not stop.is_set():
+                try:
+                    item = input.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is not _DONE and not isinstance(item, _Failure):
+                    start = time.perf_counter()
+                    try:
+                        item = fn(item)
+                    except Exception as error:
+                        item = _Failure(error)
+                    self.busy[name] += time.perf_counter() - start
+                    self.items[name] += 1
+                self._put(output, item, stop)
+                if item is _DONE:
+                    return
+
+    def run(self, source):
+        '''
+        Pushes every batch of the source through the stages
+
+        Args:
+            source: iterable of batches, e.g. a DataLoader, consumed on its own thread
+
+        Yields:
+            item: the output of the last stage for every batch, in the order of the source
+        '''
+        names = ['load'] + [name for name, _ in self.stages]
+        self.busy = dict.fromkeys(names, 0.0)
+        self.items = dict.fromkeys(names, 0)
+        queues = [queue.Queue(maxsize=self.max_pending) for _ in range(len(self.stages) + 1)]
+        threads = self.threads or [None] * len(self.stages)
+        stop = threading.Event()
+
+        workers = [threading.Thread(target=self._feed, args=(source, queues[0], stop), daemon=True)]
+        for k, (name, fn) in enumerate(self.stages):
+            workers.append(threading.Thread(target=self._work, args=(name, fn, threads[k], queues[k], queues[k + 1], stop), daemon=True))
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            self.wall = time.perf_counter() - start
+
+    def stats(self):
+        '''
+        Summarises the last run
+
+        Returns:
+            stats: the busy seconds, utilisation (busy / wall time) and batch count of every stage,
+                with the wall time and the batches per second of the whole pipeline
+        '''
+        wall = self.wall or float('nan')
+        return {
+            'stages': {name: {'busy_s': self.busy[name], 'utilisation': self.busy[name] / wall, 'batches': self.items[name]} for name in self.busy},
+            'wall_s': self.wall,
+            'batches_per_s': self.items.get('load', 0) / wall,
+        }
+
+
+def run_sequential(stages, source):
+    '''
+    Runs the same stages one batch at a time as a reference for the executor
+
+    Returns:
+        outputs, stats: the outputs of the last stage and the stats in the format of CascadeExecutor.stats
+    '''
+    names = ['load'] + [name for name, _ in stages]
+    busy = dict.fromkeys(names, 0.0)
+    outputs = []
+    start = time.perf_counter()
+    iterator = iter(source)
+    with torch.no_grad():
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            busy['load'] += time.perf_counter() - t
+            for name, fn in stages:
+                t = time.perf_counter()
+                item = fn(item)
+                busy[name] += time.perf_counter() - t
+            outputs.append(item)
+    wall = time.perf_counter() - start
+    return outputs, {
+        'stages': {name: {'busy_s': busy[name], 'utilisation': busy[name] / wall, 'batches': len(outputs)} for name in names},
+        'wall_s': wall,
+        'batches_per_s': len(outputs) / wall,
+    }
@@ -0,0 +1,99 @@
+import json
+import os
+import struct
+
+import torch
+
+# dtype names of the safetensors header
+_DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+    'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8,
+    'U8': torch.uint8, 'BOOL': torch.bool,
+}
+
+
+def convert_checkpoint(checkpoint, output=None):
+    '''
+    Converts a pickled state dict into a memory-mappable safetensors file
+
+    Args:
+        checkpoint: the path of the .pth state dict
+        output: the path of the .safetensors file, next to the checkpoint by default
+
+    Returns:
+        output: the path of the written file
+    '''
+    from safetensors.torch import save_file
+
+    if output is None:
+        output = os.path.splitext(checkpoint)[0] + '.safetensors'
+    state_dict = torch.load(checkpoint, map_location='cpu')
+    state_dict = {key: value.contiguous() for key, value in state_dict.items()}
+    save_file(state_dict, output, metadata={'source': os.path.basename(checkpoint)})
+    return output
+
+
+def load_safetensors(path):
+    '''
+    Maps a safetensors file into memory and returns its tensors without copying them. The pages
+    are only read on first access and stay shared with every other process mapping the same file
+
+    Args:
+        path: the path of the .safetensors file
+
+    Returns:
+        state_dict: the tensors as views into the mapped file
+    '''
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop('__metadata__', None)
+
+    # shared=False maps the file copy-on-write, writes never reach the file
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)
+    base = 8 + header_size
+
+    state_dict = {}
+    for key, info in header.items():
+        dtype = _DTYPES[info['dtype']]
+        begin, end = info['data_offsets']
+        raw = data[base + begin:base + end]
+        if (base + begin) % dtype.itemsize:
+            raw = raw.clone()
+        state_dict[key] = raw.view(dtype).reshape(info['shape'])
+    return state_dict
+
+
+def load_checkpoint(path):
+    '''
+    Loads a state dict onto the CPU, memory-mapping it where the format allows
+
+    Args:
+        path: the path of a .safetensors file or a .pth state dict
+
+    Returns:
+        state_dict: the loaded state dict
+    '''
+    if path.endswith('.safetensors'):
+        return load_safetensors(path)
+    return torch.load(path, map_location='cpu', mmap=True)
+
+
+def resolve_checkpoint(path):
+    '''
+    Prefers the converted safetensors file of a checkpoint when one exists and is up to date. Training only
+    saves the .pth, so a sibling older than it is stale and the .pth is loaded instead
+
+    Args:
+        path: the path of the .pth checkpoint
+
+    Returns:
+        path: the .safetensors sibling if it exists and is at least as new as the .pth, otherwise the given path
+    '''
+    converted = os.path.splitext(path)[0] + '.safetensors'
+    if not os.path.exists(converted):
+        return path
+    if os.path.exists(path) and os.path.getmtime(converted) < os.path.getmtime(path):
+        return path
+    return converted
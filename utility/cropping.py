@@ -0,0 +1,117 @@
+import torch
+import torch.nn.functional as F
+
+
+def foreground_mask(images, threshold=0.05, kernel_size=9):
+    '''
+    Finds the anatomy of a batch of radiographs: thresholds the intensity, removes specks with a
+    morphological opening and grows the result by one kernel to keep a margin around it
+
+    Args:
+        images: tensor of shape (N, 1, H, W) in the range [0, 1]
+        threshold: the intensity above which a pixel counts as foreground
+        kernel_size: odd size of the square structuring element
+
+    Returns:
+        mask: boolean tensor of shape (N, 1, H, W)
+    '''
+    padding = kernel_size // 2
+    mask = (images > threshold).float()
+    mask = -F.max_pool2d(-mask, kernel_size, stride=1, padding=padding)       # erosion
+    mask = F.max_pool2d(mask, kernel_size, stride=1, padding=padding)         # dilation, completes the opening
+    mask = F.max_pool2d(mask, kernel_size, stride=1, padding=padding)         # margin
+    return mask.bool()
+
+
+def _span(present, multiple):
+    # first and last index along one axis of every image, widened to a multiple of `multiple`
+    length = present.shape[1]
+    index = torch.arange(length, device=present.device)
+    first = torch.where(present, index, length).amin(dim=1)
+    last = torch.where(present, index, -1).amax(dim=1)
+    empty = last < 0
+    first, last = torch.where(empty, 0, first), torch.where(empty, length - 1, last)
+
+    size = ((last - first + 1 + multiple - 1) // multiple * multiple).clamp(max=length)
+    start = (first - (size - (last - first + 1)) // 2).clamp(min=0)
+    start = torch.minimum(start, length - size)
+    return start, size
+
+
+def bounding_boxes(mask, multiple=32):
+    '''
+    Computes the box around the foreground of every image, with sides that are multiples of `multiple`
+    so the crop passes through all down and up blocks of the UNet without padding
+
+    Args:
+        mask: boolean tensor of shape (N, 1, H, W)
+        multiple: the value the height and width of the boxes are rounded up to
+
+    Returns:
+        boxes: long tensor of shape (N, 4) with top, left, height, width
+    '''
+    top, height = _span(mask.any(dim=3)[:, 0], multiple)
+    left, width = _span(mask.any(dim=2)[:, 0], multiple)
+    return torch.stack([top, left, height, width], dim=1)
+
+
+def denoise_cropped(model, images, threshold=0.05, multiple=32):
+    '''
+    Runs the model only on the union of the foreground boxes of the batch, so the batch stays one
+    forward pass, and pastes the result back into the input
+
+    Args:
+        model: the denoiser
+        images: tensor of shape (N, 1, H, W) in the range [0, 1]
+        threshold: the foreground threshold of foreground_mask
+        multiple: the value the sides of the box are rounded up to
+
+    Returns:
+        outputs, skipped: the denoised batch and the fraction of pixels the model did not process
+    '''
+    height, width = images.shape[-2:]
+    mask = foreground_mask(images, threshold).any(dim=0, keepdim=True)
+    top, left, box_height, box_width = bounding_boxes(mask, multiple)[0].tolist()
+
+    outputs = images.clone()
+    with torch.no_grad():
+        outputs[..., top:top + box_height, left:left + box_width] = model(images[..., top:top + box_height, left:left + box_width])
+    return outputs, 1 - box_height * box_width / (height * width)
+
+
+def denoise_tiled(model, images, tile=64, halo=16, threshold=0.05, min_std=0.01):
+    '''
+    Splits the images into tiles and runs the model, as one batch, only on the tiles that contain
+    foreground and are not uniform. Every tile is processed with a halo of context around it.
+    Skipped tiles keep their input values
+
+    Args:
+        model: the denoiser
+        images: tensor of shape (N, 1, H, W) in the range [0, 1], H and W multiples of tile
+        tile: the side of the tiles, tile + 2 * halo must suit the model (a multiple of 32 for UNet)
+        halo: the context added on every side of a tile and cut off afterwards
+        threshold: the foreground threshold of foreground_mask
+        min_std: tiles whose standard deviation is below this are uniform
+
+    Returns:
+        outputs, skipped: the denoised batch and the fraction of tiles the model did not process
+    '''
+    n, channels, height, width = images.shape
+    rows, cols = height // tile, width // tile
+    mask = F.avg_pool2d(foreground_mask(images, threshold).float(), tile) > 0
+    spread = F.avg_pool2d(images ** 2, tile) - F.avg_pool2d(images, tile) ** 2
+    selected = (mask & (spread > min_std ** 2)).view(-1).nonzero().squeeze(1)
+
+    outputs = images.clone()
+    if len(selected):
+        padded = F.pad(images, [halo] * 4, mode='reflect')
+        # (N, C, rows, cols, tile + 2 halo, tile + 2 halo) view of all tiles with their halo
+        tiles = padded.unfold(2, tile + 2 * halo, tile).unfold(3, tile + 2 * halo, tile)
+        tiles = tiles.permute(0, 2, 3, 1, 4, 5).reshape(n * rows * cols, channels, tile + 2 * halo, tile + 2 * halo)
+        with torch.no_grad():
+            denoised = model(tiles[selected])[..., halo:halo + tile, halo:halo + tile]
+
+        view = outputs.view(n, channels, rows, tile, cols, tile).permute(0, 2, 4, 1, 3, 5).reshape(n * rows * cols, channels, tile, tile).clone()
+        view[selected] = denoised
+        outputs = view.view(n, rows, cols, channels, tile, tile).permute(0, 3, 1, 4, 2, 5).reshape(n, channels, height, width)
+    return outputs, 1 - len(selected) / (n * rows * cols)
@@ -0,0 +1,222 @@
+import io
+import json
+import os
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+BACKENDS = ('png', 'cache', 'shards')
+
+
+def _load_gray(path, image_size):
+    with Image.open(path) as image:
+        return np.asarray(image.convert('L').resize((image_size, image_size), Image.BILINEAR), dtype=np.uint8)
+
+
+def cache_path(data_dir, image_size, cache_dir=None):
+    '''Returns the cache file of a data directory at an image size, kept in <data_dir>_cache by default'''
+    cache_dir = cache_dir or data_dir.rstrip('/\\') + '_cache'
+    return os.path.join(cache_dir, f'images_{image_size}.npy')
+
+
+def cache_index(cache_file):
+    '''Returns the file names of the rows of a cache, or None when there is no complete cache'''
+    if not (os.path.exists(cache_file) and os.path.exists(cache_file + '.json')):
+        return None
+    with open(cache_file + '.json') as f:
+        return json.load(f)
+
+
+def create_cache(cache_file, names, image_size):
+    '''
+    Creates an empty cache to be filled row by row, e.g. from several processes opening it with mode r+
+
+    Returns:
+        images: the writable (len(names), image_size, image_size) uint8 array, rename cache_file + '.tmp'
+            to cache_file and write the index with finish_cache once it is filled
+    '''
+    from numpy.lib.format import open_memmap
+
+    os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+    return open_memmap(cache_file + '.tmp', mode='w+', dtype=np.uint8, shape=(len(names), image_size, image_size))
+
+
+def finish_cache(cache_file, names):
+    '''Publishes a cache filled through create_cache, the index is written last so readers never see a partial cache'''
+    os.replace(cache_file + '.tmp', cache_file)
+    with open(cache_file + '.json', 'w') as f:
+        json.dump(names, f)
+
+
+def build_cache(paths, image_size, cache_file, workers=8):
+    '''
+    Decodes and resizes every image once into a uint8 array on disk that later epochs memory-map,
+    so loading an image becomes a copy of image_size ** 2 bytes. An existing cache holding every
+    file name is reused, whatever the order of its rows
+
+    Args:
+        paths: the image paths
+        image_size: the height and width the images are resized to
+        cache_file: the path of the .npy file, the file names of its rows are kept next to it
+        workers: the threads decoding the images
+
+    Returns:
+        rows: dict mapping every path to its row
+    '''
+    names = [os.path.basename(path) for path in paths]
+    index = cache_index(cache_file)
+    if index is not None:
+        rows = {name: row for row, name in enumerate(index)}
+        if all(name in rows for name in names):
+            return {path: rows[name] for path, name in zip(paths, names)}
+
+    images = create_cache(cache_file, names, image_size)
+
+    def fill(row):
+        images[row] = _load_gray(paths[row], image_size)
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(fill, range(len(paths))))
+    images.flush()
+    del images
+    finish_cache(cache_file, names)
+    return {path: row for row, path in enumerate(paths)}
+
+
+def build_shards(paths, directory, shard_size=1000):
+    '''
+    Packs the encoded images into uncompressed tar shards, so an epoch reads a few large files
+    sequentially instead of opening every image. Existing shards of the same size are reused
+
+    Args:
+        paths: the image paths, in the order they are read
+        directory: the directory the shards are written to
+        shard_size: the images per shard
+
+    Returns:
+        shards: the paths of the shards in order
+    '''
+    marker = os.path.join(directory, 'complete.json')
+    if os.path.exists(marker):
+        with open(marker) as f:
+            meta = json.load(f)
+        # reused only for the same images in the same order, like the names index of a cache
+        if meta.get('names') == [os.path.basename(path) for path in paths] and meta['shard_size'] == shard_size:
+            return [os.path.join(directory, name) for name in meta['shards']]
+
+    os.makedirs(directory, exist_ok=True)
+    shards = []
+    for start in range(0, len(paths), shard_size):
+        shard = os.path.join(directory, f'{start // shard_size:05d}.tar')
+        with tarfile.open(shard, 'w') as archive:
+            for path in paths[start:start + shard_size]:
+                # always a regular member, add() would store a second link to the same file as a hard link without data
+                info = archive.gettarinfo(path, arcname=os.path.basename(path))
+                info.type, info.linkname, info.size = tarfile.REGTYPE, '', os.path.getsize(path)
+                with open(path, 'rb') as f:
+                    archive.addfile(info, f)
+        shards.append(shard)
+    with open(marker, 'w') as f:
+        json.dump({'images': len(paths), 'shard_size': shard_size, 'shards': [os.path.basename(s) for s in shards],
+                   'names': [os.path.basename(path) for path in paths]}, f)
+    return shards
+
+
+class CachedDataset(Dataset):
+    '''Dataset reading the images from a cache written by build_cache'''
+
+    def __init__(self, cache_file, rows, transform_noise=None):
+        '''
+        Args:
+            cache_file: the .npy file of build_cache
+            rows: the rows of the cache that form this dataset
+            transform_noise: the noise applied to the input image
+        '''
+        self.cache_file = cache_file
+        self.rows = rows
+        self.transform_noise = transform_noise
+        self.images = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        # opened on first use, so every DataLoader worker maps the file itself
+        if self.images is None:
+            self.images = np.load(self.cache_file, mmap_mode='r')
+        x = torch.from_numpy(np.array(self.images[self.rows[index]])).float().div_(255).unsqueeze(0)
+        if self.transform_noise:
+            return self.transform_noise(x), x
+        return x, x
+
+
+class ShardDataset(IterableDataset):
+    '''Dataset streaming the images of tar shards written by build_shards, the shards are split between workers'''
+
+    def __init__(self, shards, length, transform, transform_noise=None):
+        '''
+        Args:
+            shards: the shard paths
+            length: the number of images in the shards
+            transform: the transformations applied to the decoded image, e.g. resize and ToTensor
+            transform_noise: the noise applied to the input image
+        '''
+        self.shards = shards
+        self.length = length
+        self.transform = transform
+        self.transform_noise = transform_noise
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        worker = get_worker_info()
+        shards = self.shards if worker is None else self.shards[worker.id::worker.num_workers]
+        for shard in shards:
+            with tarfile.open(shard, 'r|') as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    x = self.transform(Image.open(io.BytesIO(archive.extractfile(member).read())).convert('L'))
+                    if self.transform_noise:
+                        yield self.transform_noise(x), x
+                    else:
+                        yield x, x
+
+
+def backend_datasets(backend, data_dir, splits, image_size, color, transform, transform_noise, test_size, cache_dir=None):
+    '''
+    Creates the train, validation and test datasets of the cache or shards backend for loadData
+
+    Args:
+        backend: 'cache' or 'shards'
+        data_dir: the directory containing the data
+        splits: the image paths of the train, validation and test sets
+        image_size: the height and width of the images
+        color: only 'gray' is supported by these backends
+        transform: the transformations applied to a decoded image
+        transform_noise: the noise applied to the input images
+        test_size: the proportion of the test set, part of the shard directory name
+        cache_dir: where the cache or shards are kept, <data_dir>_cache by default
+
+    Returns:
+        datasets: the train, validation and test datasets
+    '''
+    if color != 'gray':
+        raise ValueError(f'The {backend} backend only supports gray images')
+    if backend == 'cache':
+        paths = [path for split in splits for path in split]
+        cache_file = cache_path(data_dir, image_size, cache_dir)
+        rows = build_cache(paths, image_size, cache_file)
+        return [CachedDataset(cache_file, [rows[path] for path in split], transform_noise) for split in splits]
+
+    if backend == 'shards':
+        cache_dir = cache_dir or data_dir.rstrip('/\\') + '_cache'
+        return [ShardDataset(build_shards(split, os.path.join(cache_dir, f'shards_{test_size}', name)), len(split), transform, transform_noise)
+                for name, split in zip(['train', 'val', 'test'], splits)]
+
+    raise ValueError(f'Unknown backend {backend}, please use one of {", ".join(BACKENDS)}')
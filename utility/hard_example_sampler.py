@@ -0,0 +1,93 @@
+import numpy as np
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+
+class WeightedIndexDataset(Dataset):
+    '''Wraps a dataset so that indexing with the (index, weight) keys of HardExampleSampler returns x, y, index, weight'''
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, key):
+        index, weight = key
+        x, y = self.dataset[index]
+        return x, y, index, weight
+
+
+class HardExampleSampler(Sampler):
+    '''
+    Draws training images with replacement, with probability
+
+        p_i = uniform / n + (1 - uniform) * loss_i ** power / sum_j loss_j ** power
+
+    where loss_i is an exponentially decayed estimate of the loss of image i, updated after every batch. Every
+    draw carries the importance weight 1 / (n * p_i), so the weighted mean loss of a batch is an unbiased
+    estimate of the mean loss over all images, as with uniform sampling. The uniform share keeps every image
+    visited and bounds the weights by 1 / uniform
+    '''
+
+    def __init__(self, num_images, batch_size, uniform=0.3, decay=0.7, power=1.0, epoch_size=None, seed=0):
+        '''
+        Args:
+            num_images: the size of the dataset
+            batch_size: the indices drawn at once, so updates take effect from the next batches
+            uniform: the share of the probability spread evenly over all images
+            decay: the weight of the previous estimate when a new loss of an image arrives
+            power: sharpens (> 1) or flattens (< 1) the tilt towards high losses
+            epoch_size: the draws per epoch, num_images by default
+            seed: the seed of the draws
+        '''
+        self.num_images = num_images
+        self.batch_size = batch_size
+        self.uniform = uniform
+        self.decay = decay
+        self.power = power
+        self.epoch_size = epoch_size or num_images
+        self.rng = np.random.default_rng(seed)
+        # images not seen yet count as the hardest seen, so the first epochs sweep the dataset
+        self.losses = np.full(num_images, np.nan)
+
+    def __len__(self):
+        return self.epoch_size
+
+    def probabilities(self):
+        losses = self.losses.copy()
+        seen = ~np.isnan(losses)
+        losses[~seen] = losses[seen].max() if seen.any() else 1.0
+        tilt = np.maximum(losses, 1e-12) ** self.power
+        return self.uniform / self.num_images + (1 - self.uniform) * tilt / tilt.sum()
+
+    def __iter__(self):
+        for start in range(0, self.epoch_size, self.batch_size):
+            probabilities = self.probabilities()
+            indices = self.rng.choice(self.num_images, size=min(self.batch_size, self.epoch_size - start), p=probabilities)
+            for index in indices.tolist():
+                yield index, 1.0 / (self.num_images * probabilities[index])
+
+    def update(self, indices, losses):
+        '''Folds the per-image losses of a batch into the estimates'''
+        indices = np.asarray(indices)
+        losses = np.asarray(losses, dtype=np.float64)
+        previous = self.losses[indices]
+        self.losses[indices] = np.where(np.isnan(previous), losses, self.decay * previous + (1 - self.decay) * losses)
+
+    def loader(self, loader):
+        '''Returns a DataLoader over the dataset of loader drawing with this sampler, its batches are x, y, index, weight'''
+        return DataLoader(WeightedIndexDataset(loader.dataset), batch_size=self.batch_size, sampler=self, num_workers=loader.num_workers,
+                          pin_memory=loader.pin_memory, persistent_workers=loader.num_workers > 0)
+
+    def weighted_loss(self, outputs, targets, batch):
+        '''
+        Returns the importance weighted MSE of a batch of the loader, and updates the estimates with its per-image losses
+
+        Args:
+            outputs: the model outputs
+            targets: the clean images on the same device
+            batch: the x, y, index, weight batch the outputs were computed from
+        '''
+        per_image = ((outputs - targets) ** 2).mean(dim=tuple(range(1, outputs.dim())))
+        self.update(batch[2].numpy(), per_image.detach().cpu().numpy())
+        return (per_image * batch[3].to(per_image.device, per_image.dtype)).mean()
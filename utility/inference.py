@@ -0,0 +1,76 @@
+import numpy as np
+from PIL import Image
+
+import torch
+
+from utility.checkpoints import load_checkpoint, resolve_checkpoint
+
+
+def load_model(model, checkpoint, device='cpu'):
+    '''
+    Loads a checkpoint into a model and prepares it for inference. A converted .safetensors file
+    next to the checkpoint is preferred, and on the CPU the parameters stay memory-mapped
+
+    Args:
+        model: the freshly constructed model
+        checkpoint: the path of the saved state dict
+        device: the device to run the model on
+
+    Returns:
+        model: the loaded model in evaluation mode
+    '''
+    state_dict = load_checkpoint(resolve_checkpoint(checkpoint))
+    model.load_state_dict(state_dict, assign=torch.device(device).type == 'cpu')
+    model.to(device)
+    model.eval()
+    return model
+
+
+def read_image(path, size=256):
+    '''
+    Reads an image as a grayscale batch of one, matching the preprocessing of loadData
+
+    Args:
+        path: the path or the open binary file of the image
+        size: the height and width the image is resized to, None keeps the original size
+
+    Returns:
+        image: a float tensor of shape (1, 1, size, size) in the range [0, 1]
+    '''
+    image = Image.open(path).convert('L')
+    if size:
+        image = image.resize((size, size), Image.BILINEAR)
+    return torch.from_numpy(np.asarray(image, dtype=np.float32) / 255.0)[None, None]
+
+
+def write_image(image, path, format=None):
+    '''
+    Writes a single-channel image tensor in the range [0, 1] as an 8-bit grayscale file
+
+    Args:
+        image: the image tensor, any leading dimensions of size one are dropped
+        path: the path or the open binary file to write to
+        format: the image format, required for open files and inferred from the extension otherwise
+
+    Returns:
+        None
+    '''
+    array = (image.detach().clamp(0, 1).squeeze().cpu().numpy() * 255).round().astype(np.uint8)
+    Image.fromarray(array).save(path, format=format)
+
+
+def denoise_image(model, path, size=256, device='cpu'):
+    '''
+    Denoises one image file with a loaded model
+
+    Args:
+        model: the model in evaluation mode
+        path: the path of the noisy image
+        size: the height and width the image is resized to
+        device: the device the model runs on
+
+    Returns:
+        output: the denoised image of shape (1, size, size)
+    '''
+    with torch.no_grad():
+        return model(read_image(path, size).to(device))[0]
@@ -1,13 +1,5 @@
 import torch
-import torchvision.transforms.functional as TF
-import random
-from PIL import Image
-import cv2
 import numpy as np
-import torchvision.transforms as transforms
-import torch.nn.functional as F
-from matplotlib import pyplot as plt
-import torch.nn as nn
 
 
 def gaussian_mask(size, std):
@@ -133,6 +125,8 @@ def gaussian_blur(image, kernel_size, sigma):
     Returns:
         PIL.Image: Blurred image
     '''
+    from torchvision import transforms
+
     # Convert PIL image to a PyTorch tensor
     image_tensor = image.unsqueeze(0)
 
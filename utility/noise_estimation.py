@@ -0,0 +1,131 @@
+import itertools
+import math
+
+import torch
+import torch.nn.functional as F
+
+# Immerkaer's kernel, the difference of two Laplacians, cancels image structure up to second order
+_LAPLACIAN_DIFFERENCE = torch.tensor([[1., -2., 1.], [-2., 4., -2.], [1., -2., 1.]]).view(1, 1, 3, 3)
+
+
+def estimate_noise(images, impulse_threshold=0.3):
+    '''
+    Estimates the noise of a batch of images without a reference, at the cost of two small convolutions
+
+    Args:
+        images: tensor of shape (N, 1, H, W) in the range [0, 1]
+        impulse_threshold: how far a saturated pixel must be from the mean of its neighbours to count as an impulse
+
+    Returns:
+        sigma, impulses: the standard deviation of the Gaussian-like noise (Immerkaer, 1996) and the fraction
+            of salt and pepper pixels, both tensors of shape (N,)
+    '''
+    images = images.float()
+    height, width = images.shape[-2:]
+    response = F.conv2d(images, _LAPLACIAN_DIFFERENCE.to(images.device)).abs()
+    sigma = math.sqrt(math.pi / 2) * response.sum(dim=(1, 2, 3)) / (6 * (height - 2) * (width - 2))
+
+    neighbours = (F.avg_pool2d(images, 3, stride=1, padding=1, count_include_pad=False) * 9 - images) / 8
+    saturated = (images <= 1 / 255) | (images >= 254 / 255)
+    impulses = (saturated & ((images - neighbours).abs() > impulse_threshold)).float().mean(dim=(1, 2, 3))
+    return sigma, impulses
+
+
+def noise_score(images):
+    '''
+    Combines both estimates into the expected RMS noise, counting an impulse as an error of about one half
+
+    Args:
+        images: tensor of shape (N, 1, H, W) in the range [0, 1]
+
+    Returns:
+        score: tensor of shape (N,)
+    '''
+    sigma, impulses = estimate_noise(images)
+    return torch.sqrt(sigma ** 2 + 0.25 * impulses)
+
+
+def image_psnr(outputs, targets):
+    '''
+    Returns the PSNR of every image of a batch, with the brightest pixel of the target as the peak
+
+    Args:
+        outputs: tensor of shape (N, C, H, W)
+        targets: tensor of the same shape
+
+    Returns:
+        psnr: tensor of shape (N,) in decibels
+    '''
+    mse = ((outputs.float() - targets.float()) ** 2).mean(dim=(1, 2, 3)).clamp_min(1e-10)
+    peak = targets.float().amax(dim=(1, 2, 3))
+    return 10 * torch.log10(peak ** 2 / mse)
+
+
+class NoiseRouter():
+    '''Runs each image through only as many stages of the cascade as its estimated noise needs'''
+
+    def __init__(self, stages, thresholds):
+        '''
+        Creates the router
+
+        Args:
+            stages: the models of the cascade in order, e.g. [SkidNet, UNet]
+            thresholds: ascending noise scores, one per stage. An image whose score reaches the k-th
+                threshold goes through the first k stages; below the first it is returned unchanged
+        '''
+        assert len(thresholds) == len(stages), 'one threshold is needed per stage'
+        self.stages = stages
+        self.thresholds = torch.tensor(sorted(thresholds))
+        self.counts = torch.zeros(len(stages) + 1, dtype=torch.long)
+
+    def route(self, images):
+        '''Returns the number of stages every image of the batch goes through'''
+        return torch.searchsorted(self.thresholds, noise_score(images).cpu(), right=True)
+
+    def __call__(self, images):
+        depths = self.route(images)
+        self.counts += torch.bincount(depths, minlength=len(self.counts))
+
+        outputs = images.clone()
+        with torch.no_grad():
+            for depth in depths.unique().tolist():
+                index = (depths == depth).nonzero().squeeze(1).to(images.device)
+                x = images[index]
+                for stage in self.stages[:depth]:
+                    x = stage(x)
+                outputs[index] = x
+        return outputs
+
+    def fractions(self):
+        '''Returns the fraction of the routed images that stopped after 0, 1, ... stages'''
+        return (self.counts.float() / max(self.counts.sum().item(), 1)).tolist()
+
+
+def tune_thresholds(scores, psnr, costs, max_loss, candidates=50):
+    '''
+    Picks the routing thresholds with the lowest expected cost whose mean PSNR loss against
+    running every stage stays within max_loss
+
+    Args:
+        scores: tensor of shape (N,) with the noise score of every validation image
+        psnr: tensor of shape (N, S + 1), the PSNR of every image after 0, 1, ..., S stages
+        costs: list of S + 1 seconds per image for stopping after 0, 1, ..., S stages
+        max_loss: the allowed drop of the mean PSNR in decibels
+        candidates: the number of score quantiles tried as thresholds
+
+    Returns:
+        thresholds, loss, cost: the S thresholds, the mean PSNR loss and the mean cost per image they give
+    '''
+    stages = psnr.shape[1] - 1
+    grid = torch.quantile(scores.float(), torch.linspace(0, 1, candidates)).tolist() + [float('inf')]
+    reference = psnr[:, -1].mean().item()
+    costs = torch.tensor(costs, dtype=torch.float)
+
+    best = ([float('-inf')] * stages, 0.0, costs[-1].item())
+    for thresholds in itertools.combinations_with_replacement(sorted(set(grid)), stages):
+        depths = torch.searchsorted(torch.tensor(thresholds), scores.float(), right=True)
+        loss = reference - psnr.gather(1, depths.unsqueeze(1)).mean().item()
+        cost = costs[depths].mean().item()
+        if loss <= max_loss and cost < best[2]:
+            best = (list(thresholds), loss, cost)
+    return best
@@ -1,15 +1,5 @@
-import os
 import numpy as np
-from PIL import Image
-import cv2
-import matplotlib.pyplot as plt
-import numpy as np
-
 import torch
-from torchvision import transforms
-from torch.utils.data import Dataset, DataLoader
-import torchvision.utils as vutils
-from sklearn.model_selection import train_test_split
 
 # ----------------------- Numpy Image Manipulation ---------------------- #
 def addGaussianNoise(image, mean=0, std=25):
@@ -178,6 +168,8 @@ def makeNoisyImages(path):
     Returns:
         None
     '''
+    import cv2
+
     # Read an image from data folder
     img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
     img = cv2.resize(img, (256, 256))
@@ -0,0 +1,140 @@
+import os
+import time
+
+import numpy as np
+import torch
+
+
+def export_onnx(model, path, resolution=256, opset=17):
+    '''
+    Exports a model to ONNX with dynamic batch and spatial axes
+
+    Args:
+        model: the model to export
+        path: the path of the .onnx file to write
+        resolution: the height and width of the example input used for tracing. The exported
+            graph accepts any size the model accepts, i.e. multiples of 8 for SkidNet and
+            multiples of 32 for the default UNet
+        opset: the ONNX opset version to target
+
+    Returns:
+        path: the path of the written file
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    model = model.cpu().eval()
+    example = torch.rand(1, 1, resolution, resolution)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (example,),
+            path,
+            input_names=['input'],
+            output_names=['output'],
+            dynamic_axes={'input': {0: 'batch', 2: 'height', 3: 'width'}, 'output': {0: 'batch', 2: 'height', 3: 'width'}},
+            opset_version=opset,
+            dynamo=False,
+        )
+    return path
+
+
+class ONNXModel():
+    '''Runs an exported model through ONNX Runtime behind the call interface of a torch model'''
+
+    def __init__(self, path, intra_op_threads=None, inter_op_threads=1):
+        '''
+        Creates the ONNX Runtime session for an exported model
+
+        Args:
+            path: the path of the .onnx file
+            intra_op_threads: the threads used inside one operator, None lets ONNX Runtime decide
+            inter_op_threads: the threads used to run independent operators in parallel
+        '''
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        '''
+        Runs a batch through the session
+
+        Args:
+            x: the input batch as a torch tensor
+
+        Returns:
+            output: the output batch as a float32 torch tensor on the CPU
+        '''
+        inputs = np.ascontiguousarray(x.detach().cpu().numpy(), dtype=np.float32)
+        output = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(output)
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+
+def check_parity(model, onnx_model, batches, atol=1e-3):
+    '''
+    Compares the outputs of a torch model and its ONNX export
+
+    Args:
+        model: the torch model
+        onnx_model: the ONNXModel of the export
+        batches: the input batches to compare on
+        atol: the largest absolute difference accepted, the default is a quarter of one 8-bit grey level
+
+    Returns:
+        max_diff: the largest absolute difference over all batches
+        passed: whether max_diff is within atol
+    '''
+    model = model.cpu().eval()
+    max_diff = 0.0
+    with torch.no_grad():
+        for batch in batches:
+            expected = model(batch.cpu())
+            actual = onnx_model(batch)
+            max_diff = max(max_diff, (expected - actual).abs().max().item())
+    return max_diff, max_diff <= atol
+
+
+def tune_intra_op_threads(path, input_shape, candidates=None, iters=5):
+    '''
+    Picks the intra-op thread count with the lowest mean latency for an exported model
+
+    Args:
+        path: the path of the .onnx file
+        input_shape: the shape of the input batch used for timing
+        candidates: the thread counts to try, powers of two up to the CPU count by default
+        iters: the number of timed runs per candidate
+
+    Returns:
+        best_threads: the fastest thread count
+        timings: the mean latency in seconds of every candidate
+    '''
+    if candidates is None:
+        cpus = os.cpu_count() or 1
+        candidates = sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+
+    x = torch.rand(*input_shape)
+    timings = {}
+    for threads in candidates:
+        onnx_model = ONNXModel(path, intra_op_threads=threads)
+        onnx_model(x)
+        start = time.perf_counter()
+        for _ in range(iters):
+            onnx_model(x)
+        timings[threads] = (time.perf_counter() - start) / iters
+
+    best_threads = min(timings, key=timings.get)
+    return best_threads, timings
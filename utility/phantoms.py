@@ -0,0 +1,144 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+def _soft(signed_distance, width):
+    '''1 inside (negative distance), 0 outside, with a smooth edge of about width'''
+    return 0.5 * (1 - np.tanh(signed_distance / width))
+
+
+def _ellipse(x, y, cx, cy, ax, ay, angle=0.0, power=2.0):
+    '''Normalised radius of a rotated super-ellipse, 1 on its outline'''
+    c, s = np.cos(angle), np.sin(angle)
+    u, v = (x - cx) * c + (y - cy) * s, -(x - cx) * s + (y - cy) * c
+    return (np.abs(u / ax) ** power + np.abs(v / ay) ** power) ** (1 / power)
+
+
+def chest_phantom(shape, rng):
+    '''
+    Draws a frontal chest radiograph-like image: a torso with soft tissue thickening towards the middle,
+    two lungs, the heart shadow, the spine with its vertebrae, ribs, clavicles, a smooth exposure falloff
+    and film grain. Every structure is sized in units of the image, so any resolution looks alike
+
+    Args:
+        shape: the (height, width) of the image
+        rng: the numpy Generator the anatomy is varied with
+
+    Returns:
+        image: float32 array in [0, 1], bright where the body absorbs more
+    '''
+    height, width = shape
+    y, x = np.meshgrid(np.linspace(-1, 1, height, dtype=np.float32), np.linspace(-1, 1, width, dtype=np.float32), indexing='ij')
+    jitter = lambda scale: rng.uniform(-scale, scale)
+    edge = 2.0 / min(height, width) + 0.01
+
+    # torso, thicker and so brighter towards its middle
+    r = _ellipse(x, y, jitter(0.03), 0.15 + jitter(0.03), 0.82 + jitter(0.06), 1.05 + jitter(0.05), jitter(0.03), power=2.6)
+    body = _soft(r - 1, edge)
+    image = body * (0.32 + 0.28 * np.sqrt(np.clip(1 - r ** 2, 0, 1)))
+
+    # lungs, darkest in their middle, and the heart shadow overlapping the left lung
+    lungs = np.zeros_like(x)
+    for side in (-1, 1):
+        r = _ellipse(x, y, side * (0.36 + jitter(0.03)), -0.05 + jitter(0.04), 0.25 + jitter(0.03), 0.55 + jitter(0.05), side * (0.12 + jitter(0.05)))
+        lungs = np.maximum(lungs, _soft(r - 1, edge) * (0.55 + 0.45 * np.sqrt(np.clip(1 - r ** 2, 0, 1))))
+    r = _ellipse(x, y, 0.13 + jitter(0.04), 0.28 + jitter(0.04), 0.3 + jitter(0.04), 0.24 + jitter(0.03), 0.3 + jitter(0.1))
+    heart = _soft(r - 1, 6 * edge)
+    image -= 0.3 * lungs * (1 - heart)
+
+    # spine with the vertebrae as a periodic brightening
+    spine = _soft(np.abs(x - jitter(0.02)) - 0.07, edge) * body
+    vertebrae = 0.5 + 0.5 * np.cos(2 * np.pi * (y * (8 + jitter(1)) + rng.uniform()))
+    image += spine * (0.12 + 0.06 * vertebrae)
+
+    # ribs: evenly spaced copies of one arc per side, so the nearest rib is found without a loop over ribs
+    top, spacing, curvature = -0.72 + jitter(0.04), 0.13 + jitter(0.01), 0.55 + jitter(0.1)
+    lateral = np.abs(x) - 0.07
+    u = (y - top - curvature * np.clip(lateral, 0, None) ** 2) / spacing
+    k = np.round(u)
+    ribs = np.exp(-((u - k) * spacing / 0.022) ** 2) * ((k >= 0) & (k < 10) & (lateral > 0) & (np.abs(x) < 0.78))
+    image += 0.13 * ribs * body * _soft(y - 0.45, 0.12)
+
+    # clavicles rising outwards from the top of the spine
+    clavicles = np.exp(-((y - (-0.66 + jitter(0.03) - 0.18 * np.abs(x))) / 0.03) ** 2) * ((np.abs(x) > 0.08) & (np.abs(x) < 0.55))
+    image += 0.15 * clavicles * body
+
+    # exposure falloff towards the edges, low frequency unevenness and grain
+    image *= 1 - 0.25 * (x ** 2 + y ** 2) / 2
+    for _ in range(3):
+        fx, fy, phase = rng.uniform(0.5, 2, 2).tolist() + [rng.uniform(0, 2 * np.pi)]
+        image += 0.015 * np.cos(np.pi * (fx * x + fy * y) + phase)
+    image += rng.normal(0, 0.008, image.shape).astype(np.float32)
+    return np.clip(image, 0, 1)
+
+
+def phantom(index, shape, seed=0):
+    '''Returns phantom number index of a seed as a uint8 array, the same whichever process draws it'''
+    rng = np.random.default_rng((seed, index))
+    return (chest_phantom(shape, rng) * 255 + 0.5).astype(np.uint8)
+
+
+def phantom_name(index):
+    return f'phantom_{index:07d}.png'
+
+
+def _write_pngs(directory, indices, shape, seed):
+    for index in indices:
+        Image.fromarray(phantom(index, shape, seed)).save(os.path.join(directory, phantom_name(index)), compress_level=1)
+    return len(indices)
+
+
+def _write_rows(cache_file, indices, size, seed):
+    images = np.load(cache_file + '.tmp', mmap_mode='r+')
+    for index in indices:
+        images[index] = phantom(index, (size, size), seed)
+    images.flush()
+    return len(indices)
+
+
+def write_phantoms(directory, count, size, seed=0, workers=None, format='png', cache_dir=None, chunk=64):
+    '''
+    Writes count phantoms in parallel, each process drawing chunks of consecutive indices
+
+    Args:
+        directory: the data directory, PNGs are written into it
+        count: the number of phantoms
+        size: the height and width of the phantoms, or (height, width) for PNGs
+        seed: the seed, the same seed gives the same images whatever the number of workers
+        workers: the processes, os.cpu_count() by default, 1 draws them in this process
+        format: 'png' for image files, 'cache' for the memory-mapped array the cache backend of loadData reads
+        cache_dir: where the cache is written, <directory>_cache by default
+        chunk: the phantoms per task
+
+    Returns:
+        path: the directory or the cache file written
+    '''
+    chunks = [range(start, min(start + chunk, count)) for start in range(0, count, chunk)]
+    if format == 'png':
+        shape = (size, size) if isinstance(size, int) else tuple(size)
+        os.makedirs(directory, exist_ok=True)
+        jobs, path = [(_write_pngs, directory, indices, shape, seed) for indices in chunks], directory
+    elif format == 'cache':
+        from utility.datasets import cache_path, create_cache, finish_cache
+        path = cache_path(directory, size, cache_dir)
+        names = [phantom_name(index) for index in range(count)]
+        # the workers fill the rows of the empty array in place
+        create_cache(path, names, size).flush()
+        jobs = [(_write_rows, path, indices, size, seed) for indices in chunks]
+    else:
+        raise ValueError(f'Unknown format {format}, please use either "png" or "cache"')
+
+    if workers == 1:
+        for job in jobs:
+            job[0](*job[1:])
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            for future in [pool.submit(*job) for job in jobs]:
+                future.result()
+
+    if format == 'cache':
+        finish_cache(path, names)
+    return path
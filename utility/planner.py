@@ -0,0 +1,221 @@
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+
+import torch
+import torch.nn as nn
+
+from utility.benchmarking import measure_latency, measure_train_step
+from utility.train_profiler import current_rss
+
+PLANS_PATH = 'console_outputs/plans.json'
+MODES = ('train', 'inference')
+
+
+def available_memory():
+    '''Returns the bytes of memory available to new allocations, read from /proc on Linux, else the physical memory'''
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+
+def thread_candidates(cpus=None):
+    '''Powers of two up to the core count, and the core count itself'''
+    cpus = cpus or os.cpu_count()
+    candidates, threads = [], 1
+    while threads < cpus:
+        candidates.append(threads)
+        threads *= 2
+    return candidates + [cpus]
+
+
+def _with_peak_rss(function, interval=0.01):
+    '''Runs function, returning its result and the peak resident memory in bytes sampled while it ran'''
+    peak, stop = [current_rss()], threading.Event()
+
+    def sample():
+        while not stop.wait(interval):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        result = function()
+    finally:
+        stop.set()
+        sampler.join()
+    return result, max(peak[0], current_rss())
+
+
+def set_interop_threads(threads):
+    '''Sets the inter-op threads if torch still allows it, which is only once and before its first parallel work'''
+    if torch.get_num_interop_threads() == threads:
+        return
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError:
+        pass
+
+
+def _loader_throughput(data_dir, batch_size, num_workers, resolution, batches=20):
+    from utility.special_utils import loadData
+
+    train_loader, _, _ = loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=True, num_workers=num_workers, image_size=resolution)
+    iterator = iter(train_loader)
+    next(iterator)
+    images, start = 0, time.perf_counter()
+    for i, (x, _) in enumerate(iterator):
+        images += len(x)
+        if i + 2 >= batches:
+            break
+    return images / (time.perf_counter() - start)
+
+
+def calibrate(model, name, resolution=256, mode='train', threads=None, batch_sizes=(4, 8, 16, 32, 64), workers=(0, 1, 2, 4, 8),
+              headroom=0.25, data_dir=None, warmup=1, iters=3, tolerance=0.05, log=print):
+    '''
+    Searches the intra-op threads, batch size and DataLoader workers that maximise the throughput of a model on this host
+
+    1. threads: the fewest threads within tolerance of the fastest at batch size 8, leaving the other cores to the workers
+    2. batch size: the fastest of the batch sizes whose peak memory above the process before calibration fits the
+       available memory less the headroom, preferring the smaller of two within tolerance
+    3. workers (train mode only): the fewest workers, with threads + workers not exceeding the cores, whose loader
+       delivers 1.2 times the training throughput, or the fastest loader if none does. data_dir defaults to
+       phantoms generated in a temporary directory
+
+    Inter-op threads are set to 1, the models are a single chain of operators with nothing to run concurrently
+
+    Args:
+        model: the model, e.g. build_model(name)
+        name: the name the plan is saved under
+        resolution: the height and width of the inputs
+        mode: 'train' times training steps, 'inference' times forward passes
+        threads, batch_sizes, workers: the candidates searched, threads defaults to thread_candidates()
+        headroom: the share of the available memory left free
+        data_dir: the images the loader is timed on
+        warmup, iters: the untimed and timed iterations of every measurement
+        tolerance: the relative throughput given up for fewer threads or a smaller batch
+        log: called with a line for every measurement, None for silence
+
+    Returns:
+        plan: dict of the chosen threads, interop_threads, batch_size, num_workers, the expected images_per_s,
+            the memory budget and every measurement
+    '''
+    if mode not in MODES:
+        raise ValueError(f'Unknown mode {mode}, please use either "train" or "inference"')
+    log = log or (lambda line: None)
+    cpus = os.cpu_count()
+    channels = next(m for m in model.modules() if isinstance(m, nn.Conv2d)).in_channels
+    measure = measure_train_step if mode == 'train' else measure_latency
+
+    def throughput(batch_size):
+        latencies = measure(model, (batch_size, channels, resolution, resolution), warmup=warmup, iters=iters)
+        return batch_size * len(latencies) / sum(latencies)
+
+    set_interop_threads(1)
+    measurements = {'threads': {}, 'batch_size': {}, 'workers': {}}
+
+    # ------------------------------ Threads ------------------------------ #
+    probe = min(8, max(batch_sizes))
+    for candidate in threads or thread_candidates(cpus):
+        torch.set_num_threads(candidate)
+        measurements['threads'][candidate] = throughput(probe)
+        log(f'threads {candidate:>3} | batch {probe:>3} | {measurements["threads"][candidate]:.1f} images/s')
+    best = max(measurements['threads'].values())
+    chosen_threads = min(t for t, rate in measurements['threads'].items() if rate >= best * (1 - tolerance))
+    torch.set_num_threads(chosen_threads)
+
+    # ----------------------------- Batch size ---------------------------- #
+    budget = available_memory() * (1 - headroom)
+    baseline = current_rss()
+    for batch_size in sorted(batch_sizes):
+        try:
+            rate, peak = _with_peak_rss(lambda: throughput(batch_size))
+        except RuntimeError as error:
+            # e.g. out of memory
+            log(f'batch {batch_size:>3} | failed: {str(error).splitlines()[0]}')
+            break
+        measurements['batch_size'][batch_size] = {'images_per_s': rate, 'peak_mb': peak / 1024 ** 2}
+        log(f'batch {batch_size:>3} | threads {chosen_threads:>3} | {rate:.1f} images/s | peak {peak / 1024 ** 2:.0f} MB')
+        # memory grows about linearly with the batch, so stop before the next size would cross the budget
+        if baseline + (peak - baseline) * 2 > budget:
+            break
+    fitting = {b: m for b, m in measurements['batch_size'].items() if m['peak_mb'] * 1024 ** 2 - baseline <= budget}
+    if not fitting:
+        raise RuntimeError(f'Not even batch size {min(batch_sizes)} fits in {budget / 1024 ** 2:.0f} MB')
+    best = max(m['images_per_s'] for m in fitting.values())
+    chosen_batch = min(b for b, m in fitting.items() if m['images_per_s'] >= best * (1 - tolerance))
+    rate = fitting[chosen_batch]['images_per_s']
+
+    # ------------------------------ Workers ------------------------------ #
+    chosen_workers = 0
+    if mode == 'train':
+        with tempfile.TemporaryDirectory() as scratch:
+            if data_dir is None:
+                from utility.phantoms import write_phantoms
+                data_dir = os.path.join(scratch, 'phantoms')
+                write_phantoms(data_dir, max(256, 10 * chosen_batch), resolution, workers=1)
+            for candidate in sorted(w for w in workers if w == 0 or w + chosen_threads <= cpus):
+                measurements['workers'][candidate] = _loader_throughput(data_dir, chosen_batch, candidate, resolution)
+                log(f'workers {candidate:>3} | {measurements["workers"][candidate]:.1f} images/s loaded | {rate:.1f} images/s trained')
+            enough = [w for w, loaded in measurements['workers'].items() if loaded >= 1.2 * rate]
+            chosen_workers = min(enough) if enough else max(measurements['workers'], key=measurements['workers'].get)
+
+    return {
+        'threads': chosen_threads, 'interop_threads': 1, 'batch_size': chosen_batch, 'num_workers': chosen_workers,
+        'images_per_s': rate, 'budget_mb': budget / 1024 ** 2, 'headroom': headroom, 'cpu_count': cpus,
+        'torch': torch.__version__, 'time': time.time(), 'measurements': measurements,
+    }
+
+
+def plan_key(name, resolution):
+    return f'{name}@{resolution}'
+
+
+def save_plan(plan, name, resolution=256, mode='train', path=PLANS_PATH):
+    '''Stores a plan under this host, the model name, resolution and mode, replacing an earlier plan'''
+    plans = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            plans = json.load(f)
+    plans.setdefault(platform.node(), {}).setdefault(plan_key(name, resolution), {})[mode] = plan
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(plans, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_plan(name, resolution=256, mode='train', path=PLANS_PATH):
+    '''Returns the plan of this host for a model, or None when there is none or it was made on a different core count'''
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        plan = json.load(f).get(platform.node(), {}).get(plan_key(name, resolution), {}).get(mode)
+    if plan is None or plan['cpu_count'] != os.cpu_count():
+        return None
+    return plan
+
+
+def apply_plan(name, resolution=256, mode='train', batch_size=16, num_workers=0, device='cpu', path=PLANS_PATH):
+    '''
+    Sets the intra-op and inter-op threads of the saved plan of a model, written by plan.py. Plans are
+    calibrated on the CPU, so they are only applied when the model runs there
+
+    Returns:
+        batch_size, num_workers: those of the plan, or the given defaults when this host has no plan for the model
+    '''
+    plan = load_plan(name, resolution, mode, path) if torch.device(device).type == 'cpu' else None
+    if plan is None:
+        return batch_size, num_workers
+    torch.set_num_threads(plan['threads'])
+    set_interop_threads(plan['interop_threads'])
+    print(f'Plan for {name} ({mode}): {plan["threads"]} threads, batch size {plan["batch_size"]}, {plan["num_workers"]} workers')
+    return plan['batch_size'], plan['num_workers']
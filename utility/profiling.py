@@ -0,0 +1,248 @@
+import torch
+import torch.nn as nn
+
+
+def module_macs(module, inputs, output):
+    '''
+    Returns the multiply-accumulate operations of one call of a convolution or linear layer
+
+    Args:
+        module: the layer that was called
+        inputs: the positional inputs of the call
+        output: the output of the call
+
+    Returns:
+        macs: the number of multiply-accumulates, 0 for layers without weights
+    '''
+    if isinstance(module, nn.Conv2d):
+        kh, kw = module.kernel_size
+        return output.numel() * (module.in_channels // module.groups) * kh * kw
+    if isinstance(module, nn.ConvTranspose2d):
+        kh, kw = module.kernel_size
+        return inputs[0].numel() * (module.out_channels // module.groups) * kh * kw
+    if isinstance(module, nn.Linear):
+        return output.numel() * module.in_features
+    return 0
+
+
+def count_macs(model, input_shape, device='cpu'):
+    '''
+    Counts the multiply-accumulate operations of one forward pass per image
+
+    Args:
+        model: the model to be measured
+        input_shape: the shape of the input batch, e.g. (1, 1, 256, 256)
+        device: the device to run the model on
+
+    Returns:
+        macs: the number of multiply-accumulates per image
+    '''
+    total = [0]
+
+    def hook(module, inputs, output):
+        total[0] += module_macs(module, inputs, output)
+
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, (nn.Conv2d, nn.ConvTranspose2d, nn.Linear))]
+    model.eval()
+    with torch.no_grad():
+        model(torch.rand(*input_shape, device=device))
+    for handle in handles:
+        handle.remove()
+
+    return total[0] // input_shape[0]
+
+
+def _leaf_modules(model):
+    return [(name or type(model).__name__, m) for name, m in model.named_modules() if not list(m.children())]
+
+
+def profile_modules(model, input_shape, device='cpu', iters=3, backward=True):
+    '''
+    Profiles every leaf module of a model over forward and, optionally, backward passes
+
+    Args:
+        model: the model to be profiled
+        input_shape: the shape of the input batch, e.g. (8, 1, 256, 256)
+        device: the device to run the model on
+        iters: the number of measured passes, after one warm-up pass
+        backward: whether to run a backward pass of the mean output after every forward pass
+
+    Returns:
+        rows, trace, peak_mb: one dict per module, in the order the modules first ran, with its calls per pass,
+            forward and backward milliseconds per pass, MACs per image, parameters, output megabytes,
+            saved_for_backward_mb, the total size of the distinct tensors autograd saves for the backward
+            pass while the module runs, summed over its calls in a pass, and peak_activation_mb, the most
+            megabytes of saved activations alive at once while the module ran forward or backward; the Chrome
+            trace events of the last pass, with a counter of the live saved activations; and the peak of
+            that counter over all passes. Saved activations are counted from the pack of a tensor until its
+            last unpack in the backward pass, after which autograd frees it
+    '''
+    import time
+
+    model.to(device).train(backward)
+    leaves = _leaf_modules(model)
+    modules = dict(leaves)
+    parameters = {p.data_ptr() for p in model.parameters()}
+    stats = {}
+    trace, stack, backward_starts = [], [], {}
+    state = {'record': False, 'origin': 0.0, 'saved': set(), 'live': 0, 'peak': 0, 'backward': None}
+    # packs not yet unpacked of every live saved tensor, and its size
+    live = {}
+
+    def row(name, module):
+        if name not in stats:
+            stats[name] = {
+                'module': name, 'type': type(module).__name__, 'calls': 0, 'forward_ms': 0.0, 'backward_ms': 0.0,
+                'macs': 0, 'params': sum(p.numel() for p in module.parameters(recurse=False)), 'output_mb': 0.0, 'saved_for_backward_mb': 0.0,
+                'peak_activation_mb': 0.0,
+            }
+        return stats[name]
+
+    def event(name, phase, start, end):
+        trace.append({'name': name, 'cat': phase, 'ph': 'X', 'pid': 0, 'tid': 0 if phase == 'forward' else 1,
+                      'ts': (start - state['origin']) * 1e6, 'dur': (end - start) * 1e6})
+
+    def running():
+        # the leaf module running now, forward or backward
+        return stack[-1][0] if stack else state['backward']
+
+    def peak(name):
+        if state['record'] and name is not None:
+            entry = row(name, modules[name])
+            entry['peak_activation_mb'] = max(entry['peak_activation_mb'], state['live'] / 1024 ** 2)
+
+    def track(size):
+        state['live'] += size
+        if state['record']:
+            state['peak'] = max(state['peak'], state['live'])
+            trace.append({'name': 'saved activations', 'ph': 'C', 'pid': 0, 'ts': (time.perf_counter() - state['origin']) * 1e6,
+                          'args': {'MB': state['live'] / 1024 ** 2}})
+        peak(running())
+
+    def forward_pre(name):
+        def hook(module, inputs):
+            stack.append((name, time.perf_counter()))
+            peak(name)
+        return hook
+
+    def forward_post(name):
+        def hook(module, inputs, output):
+            end = time.perf_counter()
+            _, start = stack.pop()
+            if state['record']:
+                entry = row(name, module)
+                entry['calls'] += 1
+                entry['forward_ms'] += (end - start) * 1000
+                entry['macs'] += module_macs(module, inputs, output)
+                if isinstance(output, torch.Tensor):
+                    entry['output_mb'] += output.numel() * output.element_size() / 1024 ** 2
+                event(name, 'forward', start, end)
+        return hook
+
+    def backward_pre(name):
+        def hook(module, grad_output):
+            backward_starts.setdefault(name, []).append(time.perf_counter())
+            state['backward'] = name
+            peak(name)
+        return hook
+
+    def backward_post(name):
+        def hook(module, grad_input, grad_output):
+            end = time.perf_counter()
+            start = backward_starts[name].pop()
+            state['backward'] = None
+            if state['record']:
+                row(name, module)['backward_ms'] += (end - start) * 1000
+                event(name, 'backward', start, end)
+        return hook
+
+    def pack(tensor):
+        # attributes every tensor autograd keeps for the backward pass to the module running at the time
+        key = (tensor.data_ptr(), tensor.numel())
+        if tensor.data_ptr() in parameters:
+            return None, tensor
+        size = tensor.numel() * tensor.element_size()
+        if state['record'] and stack and key not in state['saved']:
+            state['saved'].add(key)
+            name = stack[-1][0]
+            row(name, modules[name])['saved_for_backward_mb'] += size / 1024 ** 2
+        packs, _ = live.get(key, (0, size))
+        live[key] = (packs + 1, size)
+        if packs == 0:
+            track(size)
+        return key, tensor
+
+    def unpack(packed):
+        key, tensor = packed
+        if key in live:
+            packs, size = live[key]
+            if packs > 1:
+                live[key] = (packs - 1, size)
+            else:
+                del live[key]
+                track(-size)
+        return tensor
+
+    # in-place activations cannot be combined with full backward hooks
+    inplace = [m for _, m in leaves if getattr(m, 'inplace', False)]
+    for m in inplace:
+        m.inplace = False
+
+    handles = []
+    for name, module in leaves:
+        handles.append(module.register_forward_pre_hook(forward_pre(name)))
+        handles.append(module.register_forward_hook(forward_post(name)))
+        if backward:
+            handles.append(module.register_full_backward_pre_hook(backward_pre(name)))
+            handles.append(module.register_full_backward_hook(backward_post(name)))
+
+    try:
+        for i in range(iters + 1):
+            state['record'] = i > 0
+            state['saved'], state['live'] = set(), 0
+            live.clear()
+            trace.clear()
+            x = torch.rand(*input_shape, device=device, requires_grad=backward)
+            state['origin'] = time.perf_counter()
+            if backward:
+                model.zero_grad(set_to_none=True)
+                with torch.autograd.graph.saved_tensors_hooks(pack, unpack):
+                    output = model(x)
+                output.float().mean().backward()
+            else:
+                with torch.no_grad():
+                    model(x)
+    finally:
+        for handle in handles:
+            handle.remove()
+        for m in inplace:
+            m.inplace = True
+        model.eval()
+
+    rows = list(stats.values())
+    for entry in rows:
+        for key in ['calls', 'forward_ms', 'backward_ms', 'output_mb', 'saved_for_backward_mb']:
+            entry[key] /= iters
+        entry['calls'] = int(entry['calls'])
+        entry['macs'] = entry['macs'] // (iters * input_shape[0])
+    return rows, trace, state['peak'] / 1024 ** 2
+
+
+def write_profile(rows, trace, csv_path=None, trace_path=None):
+    '''
+    Writes the rows of profile_modules as CSV and its events as a Chrome trace (chrome://tracing or Perfetto)
+
+    Returns:
+        None
+    '''
+    import csv
+    import json
+
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    if trace_path:
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,83 @@
+from utility.utils import loadData
+
+
+def parse_schedule(text):
+    '''Parses a schedule such as '64:2,128:2' into [(64, 2), (128, 2)], resolutions and their epochs'''
+    if not text:
+        return []
+    schedule = []
+    for step in text.split(','):
+        resolution, epochs = step.split(':')
+        schedule.append((int(resolution), int(epochs)))
+    return schedule
+
+
+def smallest_resolution(model):
+    '''
+    The smallest input a model trains on. A UNet halves its input once per down block and the instance
+    norm of the bottleneck needs more than one pixel, fully convolutional models like SkidNet take any size
+    '''
+    down_blocks = getattr(model, 'down_blocks', None)
+    return 2 ** (len(down_blocks) + 1) if down_blocks is not None else 8
+
+
+class ProgressiveResizing():
+    '''
+    Trains at low resolutions in the first epochs and steps up to the final resolution. Every resolution reads
+    its own cache of the resized images (images_<resolution>.npy, see utility/datasets.py), so each size is
+    decoded once and reused by later epochs and runs
+    '''
+
+    def __init__(self, data_dir, batch_size, resolution=256, schedule=((64, 2), (128, 2)), scale_batch=False, max_batch_size=128,
+                 final_loader=None, test_size=0.2, noise=True, num_workers=0, cache_dir=None):
+        '''
+        Args:
+            data_dir, batch_size, test_size, noise, num_workers, cache_dir: the arguments of loadData
+            resolution: the final resolution, trained on once the schedule has run out
+            schedule: (resolution, epochs) steps in training order, e.g. parse_schedule('64:2,128:2')
+            scale_batch: grows the batch as the resolution shrinks, keeping the pixels per step those of the final resolution
+            max_batch_size: the cap of the scaled batches
+            final_loader: the train loader of the final resolution, by default one of the cache backend
+        '''
+        resolutions = [r for r, _ in schedule]
+        if any(r > resolution for r in resolutions) or resolutions != sorted(resolutions):
+            raise ValueError(f'The schedule {schedule} has to step up towards the final resolution {resolution}')
+        self.data_dir = data_dir
+        self.base_batch_size = batch_size
+        self.final = resolution
+        self.schedule = list(schedule)
+        self.scale_batch = scale_batch
+        self.max_batch_size = max_batch_size
+        self.loader_args = {'test_size': test_size, 'color': 'gray', 'noise': noise, 'backend': 'cache', 'num_workers': num_workers, 'cache_dir': cache_dir}
+        self.loaders = {resolution: final_loader} if final_loader is not None else {}
+
+    def resolution(self, epoch):
+        '''The resolution of an epoch, counted from 0'''
+        for resolution, epochs in self.schedule:
+            if epoch < epochs:
+                return resolution
+            epoch -= epochs
+        return self.final
+
+    def batch_size(self, resolution):
+        if not self.scale_batch:
+            return self.base_batch_size
+        return min(self.max_batch_size, max(self.base_batch_size, self.base_batch_size * (self.final // resolution) ** 2))
+
+    def loader(self, epoch):
+        '''The train loader of an epoch, created with its cache on the first epoch at a resolution'''
+        resolution = self.resolution(epoch)
+        if resolution not in self.loaders:
+            self.loaders[resolution] = loadData(self.data_dir, self.batch_size(resolution), image_size=resolution, **self.loader_args)[0]
+        return self.loaders[resolution]
+
+    def prepare(self):
+        '''Creates the loaders and caches of every resolution up front, so their decoding is not part of training'''
+        for epoch in range(sum(epochs for _, epochs in self.schedule) + 1):
+            self.loader(epoch)
+
+    def check(self, model):
+        '''Raises a ValueError when the schedule starts below the smallest input of the model'''
+        smallest = smallest_resolution(model)
+        if self.schedule and self.schedule[0][0] < smallest:
+            raise ValueError(f'{type(model).__name__} trains on inputs of at least {smallest}px, the schedule starts at {self.schedule[0][0]}px')
@@ -0,0 +1,100 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, IterableDataset, RandomSampler
+
+from utility.noise_estimation import image_psnr
+
+
+class RunningMean():
+    '''Mean and variance of a stream of values, updated one batch at a time with Chan's parallel update'''
+
+    def __init__(self):
+        self.count, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        count, mean = values.size, values.mean()
+        delta = mean - self.mean
+        total = self.count + count
+        self.m2 += ((values - mean) ** 2).sum() + delta ** 2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    def half_width(self, confidence=0.95):
+        '''Half the width of the normal confidence interval of the mean, infinite below two values'''
+        if self.count < 2:
+            return math.inf
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return z * math.sqrt(self.m2 / (self.count - 1) / self.count)
+
+
+def sequential_validate(model, loader, device='cpu', best_loss=None, best_ci=0.0, confidence=0.95, loss_tolerance=0.02, psnr_tolerance=0.1,
+                        min_images=64, seed=0):
+    '''
+    Validates on shuffled batches until the confidence intervals of the means are tight enough, or the loss interval lies
+    entirely above or below that of the best checkpoint so far, instead of always running the whole set. The order is the same for
+    every call with the same seed, so successive checkpoints are compared on the same images first. Noise added by the loader
+    is drawn from the global torch and numpy generators, which the caller seeds to keep the inputs identical as well
+
+    Args:
+        model: the model to validate
+        loader: the validation loader, its dataset is resampled in a shuffled order with the same batch size
+        device: the device to run the model on
+        best_loss: the loss of the best checkpoint so far, None to only stop on a tight interval
+        best_ci: the half width of the interval of best_loss, 0 when it was measured on the whole set
+        confidence: the confidence level of the intervals
+        loss_tolerance: stop once the loss interval half width is at most this fraction of the mean loss ...
+        psnr_tolerance: ... and the PSNR half width at most this many dB
+        min_images: the images validated before stopping is considered
+        seed: the seed of the order
+
+    Returns:
+        result: dict of the mean val_loss, psnr and ssim with their half widths (val_loss_ci, psnr_ci, ssim_ci), the
+            images validated, the fraction of the set they are and why it stopped: 'tight', 'better', 'worse' or 'exhausted'
+    '''
+    from skimage.metrics import structural_similarity
+
+    if isinstance(loader.dataset, IterableDataset):
+        # streamed datasets cannot be resampled, they are read in their own order
+        batches = loader
+    else:
+        sampler = RandomSampler(loader.dataset, generator=torch.Generator().manual_seed(seed))
+        batches = DataLoader(loader.dataset, batch_size=loader.batch_size, sampler=sampler, num_workers=loader.num_workers)
+
+    model.eval()
+    stats = {'val_loss': RunningMean(), 'psnr': RunningMean(), 'ssim': RunningMean()}
+    stopped = 'exhausted'
+    with torch.no_grad():
+        for modif, actual in batches:
+            outputs = model(modif.to(device)).cpu()
+            actual = actual.cpu()
+            stats['val_loss'].update(((outputs - actual) ** 2).mean(dim=(1, 2, 3)).numpy())
+            # PSNR of the 8-bit images, as PSNR does
+            stats['psnr'].update(image_psnr((outputs * 255).to(torch.uint8), (actual * 255).to(torch.uint8)).numpy())
+            stats['ssim'].update([structural_similarity(a.squeeze(0).numpy(), o.squeeze(0).numpy(), data_range=1.0, channel_axis=None if a.shape[0] == 1 else 0)
+                                  for a, o in zip(actual, outputs)])
+
+            loss, count = stats['val_loss'].mean, stats['val_loss'].count
+            if count < min_images:
+                continue
+            loss_ci = stats['val_loss'].half_width(confidence)
+            if best_loss is not None and loss - loss_ci > best_loss + best_ci:
+                stopped = 'worse'
+                break
+            if best_loss is not None and loss + loss_ci < best_loss - best_ci:
+                stopped = 'better'
+                break
+            if loss_ci <= loss_tolerance * loss and stats['psnr'].half_width(confidence) <= psnr_tolerance:
+                stopped = 'tight'
+                break
+
+    result = {'images': stats['val_loss'].count, 'fraction': stats['val_loss'].count / len(loader.dataset), 'stopped': stopped}
+    for name, running in stats.items():
+        result[name] = float(running.mean)
+        result[f'{name}_ci'] = running.half_width(confidence)
+    return result
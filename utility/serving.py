@@ -0,0 +1,118 @@
+import asyncio
+import collections
+
+from utility.benchmarking import percentile
+
+
+class ServingMetrics():
+    '''Keeps request latencies and batch sizes of the inference server over a sliding window'''
+
+    def __init__(self, window=10000):
+        '''
+        Creates empty metrics
+
+        Args:
+            window: the number of most recent latencies kept per model
+        '''
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self.requests = collections.Counter()
+        self.batch_sizes = collections.Counter()
+        self.errors = 0
+
+    def record_request(self, model, seconds):
+        self.requests[model] += 1
+        self.latencies[model].append(seconds)
+
+    def record_batch(self, size):
+        self.batch_sizes[size] += 1
+
+    def summary(self):
+        '''
+        Summarises the metrics for the /metrics endpoint
+
+        Returns:
+            summary: request counts, p50/p90/p99 latency in milliseconds per model and the batch size histogram
+        '''
+        latency = {}
+        for model, values in self.latencies.items():
+            values = list(values)
+            latency[model] = {q: percentile(values, p) * 1000 for q, p in [('p50', 50), ('p90', 90), ('p99', 99)]}
+
+        batches = sum(self.batch_sizes.values())
+        return {
+            'requests': dict(self.requests),
+            'errors': self.errors,
+            'latency_ms': latency,
+            'batch_sizes': {size: self.batch_sizes[size] for size in sorted(self.batch_sizes)},
+            'mean_batch_size': sum(size * n for size, n in self.batch_sizes.items()) / batches if batches else 0.0,
+        }
+
+
+class MicroBatcher():
+    '''Groups concurrent requests for one model into batches, waiting at most max_wait after the first one'''
+
+    def __init__(self, run_batch, max_batch=16, max_wait=0.01, metrics=None):
+        '''
+        Creates the batcher, its loop is started with start()
+
+        Args:
+            run_batch: coroutine function taking a list of inputs and returning the list of outputs
+            max_batch: the largest batch formed
+            max_wait: the seconds a batch may wait for more requests after its first one arrived
+            metrics: the ServingMetrics the batch sizes are recorded in
+        '''
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+        return self
+
+    async def submit(self, item):
+        '''
+        Queues one input and waits for its output
+
+        Args:
+            item: the input of one request
+
+        Returns:
+            output: the output of the model for this input
+        '''
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def collect(self):
+        '''Waits for a first request, then gathers more until the batch is full or the deadline passes'''
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.collect()
+            if self.metrics is not None:
+                self.metrics.record_batch(len(batch))
+            try:
+                outputs = await self.run_batch([item for item, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
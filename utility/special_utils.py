@@ -2,17 +2,10 @@ import os
 import numpy as np
 from PIL import Image
 import random
-import matplotlib.pyplot as plt
-import numpy as np
-import tqdm
 
 import torch
 import torch.nn as nn
-from torchvision import transforms
 from torch.utils.data import Dataset, DataLoader
-import torchvision.utils as vutils
-from skimage.metrics import structural_similarity
-from sklearn.model_selection import train_test_split
 from utility.noise import gaussian_blur, add_poisson_noise, add_salt_and_pepper_noise, add_speckle_noise
 from utility.noise_functions import *
 
@@ -65,7 +58,7 @@ class AutoencoderDataset(Dataset):
 
         return x.to(self.device), x.to(self.device)
 
-def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False):
+def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False, backend='png', num_workers=0, image_size=256, cache_dir=None):
     '''
     Loads the data from the given directory and returns the train and test loaders
     Args:
@@ -73,18 +66,28 @@ def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False):
         batch_size: the batch size for the data loaders
         test_size: the proportion of the data to be assigned to the test set
         color: the color type of the images
+        noise: whether the input images are artificially noised
+        backend: 'png' decodes every image on every epoch, 'cache' reads a memory-mapped array of the resized
+            images and 'shards' streams tar shards of the encoded images, see utility/datasets.py
+        num_workers: the DataLoader worker processes, the batches stay on the CPU when they are used
+        image_size: the height and width the images are resized to
+        cache_dir: where the cache or shards are kept, <data_dir>_cache by default
     
     Returns:
         train_loader: the data loader for the training set
         test_loader: the data loader for the test set
     '''
-    gaussian_noise = transforms.Lambda(lambda x: gaussian_blur(x, kernel_size=15, sigma=1))
-    sap_noise = transforms.Lambda(lambda x: add_salt_and_pepper_noise(x, salt_prob=0.05, pepper_prob=0.05))
-    poisson_noise = transforms.Lambda(lambda x: add_poisson_noise(x, 0.1))
-    speckle_noise = transforms.Lambda(lambda x: add_speckle_noise(x))
+    from functools import partial
+    from torchvision import transforms
+    from sklearn.model_selection import train_test_split
+
+    gaussian_noise = transforms.Lambda(partial(gaussian_blur, kernel_size=15, sigma=1))
+    sap_noise = transforms.Lambda(partial(add_salt_and_pepper_noise, salt_prob=0.05, pepper_prob=0.05))
+    poisson_noise = transforms.Lambda(partial(add_poisson_noise, noise_factor=0.1))
+    speckle_noise = transforms.Lambda(add_speckle_noise)
 
     transform = transforms.Compose([
-        transforms.Resize((256, 256)),
+        transforms.Resize((image_size, image_size)),
         transforms.ToTensor(),
         # transforms.Normalize(mean=[0.456], std=[0.229])
     ])
@@ -98,24 +101,39 @@ def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False):
         ])
     else: transform_noise = None
 
+    if os.path.isdir(data_dir):
+        image_names = os.listdir(data_dir)
+    else:
+        # a cache written without the images, e.g. by make_phantoms.py --format cache
+        from utility.datasets import cache_path, cache_index
+        image_names = cache_index(cache_path(data_dir, image_size, cache_dir)) if backend == 'cache' else None
+        if image_names is None:
+            raise FileNotFoundError(f'No images in {data_dir}')
+
     data = []
-    for image_name in os.listdir(data_dir):
+    for image_name in image_names:
         image_path = os.path.join(data_dir, image_name)
         data.append(image_path)
 
     data_train, data_rem = train_test_split(data, test_size=test_size, random_state=42)
     data_val, data_test = train_test_split(data_rem, test_size=0.5, random_state=42)
-
-    device = getDevice()
+    # worker processes return CPU tensors, the training loops move every batch to the device
+    device = getDevice() if num_workers == 0 else 'cpu'
 
     # ---------------------- Artificially Noised Images --------------------- #
-    train_dataset = AutoencoderDataset(data_train, device=device, color=color, transform=transform, transform_noise=transform_noise)
-    val_dataset = AutoencoderDataset(data_val, device=device, color=color, transform=transform, transform_noise=transform_noise)
-    test_dataset = AutoencoderDataset(data_test, device=device, color=color, transform=transform, transform_noise=transform_noise)
+    if backend == 'png':
+        train_dataset = AutoencoderDataset(data_train, device=device, color=color, transform=transform, transform_noise=transform_noise)
+        val_dataset = AutoencoderDataset(data_val, device=device, color=color, transform=transform, transform_noise=transform_noise)
+        test_dataset = AutoencoderDataset(data_test, device=device, color=color, transform=transform, transform_noise=transform_noise)
+    else:
+        from utility.datasets import backend_datasets
+        train_dataset, val_dataset, test_dataset = backend_datasets(
+            backend, data_dir, [data_train, data_val, data_test], image_size, color, transform, transform_noise, test_size, cache_dir)
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=0)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=0)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=0)
+    loader_args = dict(batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=num_workers, persistent_workers=num_workers > 0)
+    train_loader = DataLoader(train_dataset, **loader_args)
+    val_loader = DataLoader(val_dataset, **loader_args)
+    test_loader = DataLoader(test_dataset, **loader_args)
 
     return train_loader, val_loader, test_loader
 
@@ -128,6 +146,9 @@ def showImages(dataloader, num_images=5):
     Returns:
         None
     '''
+    import matplotlib.pyplot as plt
+    import torchvision.utils as vutils
+
     data_iter = iter(dataloader)
     images, labels = next(data_iter)
 
@@ -161,6 +182,8 @@ def evaluate_model_pipeline(model, original, dataloader, device='cpu'):
     Returns:
         average_loss: the average loss of the model on the dataset
     '''
+    import tqdm
+
     model.eval()
     total_loss = 0.0
     num_batches = 0
@@ -198,6 +221,8 @@ def PSNR_pipeline(model, original, dataloader, device='cpu'):
     Returns:
         average_psnr: the average PSNR of the model on the dataset
     '''
+    import tqdm
+
     model.eval()
     total_psnr = 0.0
     num_batches = 0
@@ -218,7 +243,7 @@ def PSNR_pipeline(model, original, dataloader, device='cpu'):
                 highest = torch.max(actual, dim = (1, 2)).item()
             else: highest = torch.max(actual).item()
 
-            mse = nn.functional.mse_loss(outputs, actual)
+            mse = nn.functional.mse_loss(outputs.float(), actual.float())
             psnr = 10 * torch.log10((highest ** 2) / mse)
             total_psnr += psnr.item()
             num_batches += 1
@@ -238,6 +263,9 @@ def SSIM_pipeline(model, original, dataloader, device='cpu'):
     Returns:
         average_ssim: the average SSIM of the model on the dataset
     '''
+    from skimage.metrics import structural_similarity
+    import tqdm
+
     model.eval()
     total_ssim = 0.0
     num_batches = 0
@@ -273,6 +301,9 @@ def generate_images_pipeline(model, original, dataloader, n, device='cpu', path=
     Returns:
         generated_images: the output images generated by the model
     '''
+    import matplotlib.pyplot as plt
+    import tqdm
+
     model.eval()
     original_images =[]
     generated_images = []
@@ -332,6 +363,8 @@ def create_output(model, input_image, device='cpu', path=None):
     Returns:
         0
     '''
+    import matplotlib.pyplot as plt
+
     model.eval()
     with torch.no_grad():
         input_image = input_image.to(device)
@@ -0,0 +1,143 @@
+import io
+import os
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utility.inference import read_image, write_image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class BoundedExecutor():
+    '''Thread pool whose submit blocks once too many tasks are pending, so a fast producer cannot run ahead'''
+
+    def __init__(self, max_workers, max_pending):
+        '''
+        Creates the thread pool
+
+        Args:
+            max_workers: the number of worker threads
+            max_pending: the number of submitted but unfinished tasks allowed before submit blocks
+        '''
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, fn, *args):
+        '''
+        Schedules fn(*args), waiting for a free slot first
+
+        Returns:
+            future: the future of the task
+        '''
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+def iter_sources(source):
+    '''
+    Lists the images of a directory or a tar archive in a stable order
+
+    Args:
+        source: the path of a directory (searched recursively) or a tar archive, optionally compressed
+
+    Yields:
+        name, payload: the path of the image relative to the source, and either its file path or,
+            for archives, its bytes. Archive members are read sequentially in a single pass
+    '''
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for file in sorted(files):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, file)
+                    yield os.path.relpath(path, source), path
+        return
+
+    with tarfile.open(source, 'r|*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield member.name, archive.extractfile(member).read()
+
+
+def decode(payload, size):
+    '''
+    Decodes an image given as a path or as bytes into a batch of one
+
+    Args:
+        payload: the file path or the encoded bytes of the image
+        size: the height and width the image is resized to
+
+    Returns:
+        image: a float tensor of shape (1, 1, size, size)
+    '''
+    if isinstance(payload, bytes):
+        payload = io.BytesIO(payload)
+    return read_image(payload, size)
+
+
+def write_atomic(image, path):
+    '''
+    Encodes an image as PNG and moves it into place, so an interrupted run never leaves a partial file
+
+    Args:
+        image: the single-channel image tensor in the range [0, 1]
+        path: the path of the output file
+
+    Returns:
+        None
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'wb') as f:
+        write_image(image, f, format='PNG')
+    os.replace(temporary, path)
+
+
+def existing_outputs(output_dir):
+    '''
+    Collects the outputs written by previous runs so they can be skipped
+
+    Args:
+        output_dir: the output directory
+
+    Returns:
+        done: the set of output paths relative to output_dir
+    '''
+    done = set()
+    for root, _, files in os.walk(output_dir):
+        for file in files:
+            if not file.endswith('.tmp'):
+                done.add(os.path.relpath(os.path.join(root, file), output_dir))
+    return done
+
+
+def output_name(output_dir, name):
+    '''
+    Maps the name of a source image to the name of its output, keeping the source extension so that
+    a.jpg and a.png do not both become a.png
+
+    Args:
+        output_dir: the output directory
+        name: the path of the image relative to the source, e.g. an archive member name
+
+    Returns:
+        output: the normalised output path relative to output_dir, or None when the name is absolute or
+            would be written outside output_dir
+    '''
+    output = os.path.normpath(name if name.lower().endswith('.png') else name + '.png')
+    if os.path.isabs(output) or os.path.splitdrive(output)[0]:
+        return None
+    root = os.path.realpath(output_dir)
+    if os.path.commonpath([root, os.path.realpath(os.path.join(root, output))]) != root:
+        return None
+    return output
@@ -0,0 +1,165 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+
+TELEMETRY_PATH = 'console_outputs/telemetry.jsonl'
+
+# metrics compared between runs, and whether higher values are better
+METRICS = {
+    'images_per_s': True,
+    'epoch_time_s': False,
+    'data_wait_fraction': False,
+    'peak_rss_mb': False,
+    'loss': False,
+    'val_loss': False,
+    'psnr': True,
+    'ssim': True,
+}
+
+
+def git_revision():
+    '''Returns the current commit hash, suffixed with -dirty when the tree has local changes, or None outside git'''
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def profile_metrics(summary):
+    '''Converts an epoch summary of StepProfiler into telemetry metrics'''
+    return {
+        'epoch_time_s': summary['wall_s'],
+        'images_per_s': summary['images_per_s'],
+        'data_wait_fraction': summary['phase_fraction'].get('data', 0.0),
+        'peak_rss_mb': summary['peak_rss_mb'],
+    }
+
+
+class RunRecorder():
+    '''Appends the records of one training or evaluation run to the JSONL telemetry store'''
+
+    def __init__(self, model, kind, config=None, path=TELEMETRY_PATH):
+        '''
+        Writes the header record of the run
+
+        Args:
+            model: the name runs are compared by, e.g. the checkpoint name
+            kind: 'train' or 'eval'
+            config: the settings of the run, e.g. batch size, learning rate and epochs
+            path: the JSONL file the records are appended to
+        '''
+        self.path = path
+        self.run_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:6]}'
+        self.model = model
+        self.kind = kind
+        self._append({
+            'type': 'run', 'model': model, 'kind': kind, 'config': config or {},
+            'git': git_revision(), 'host': platform.node(), 'python': platform.python_version(),
+        })
+
+    def _append(self, record):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        record = {'run_id': self.run_id, 'time': time.time(), **record}
+        # one write of one line per record, so concurrent runs never interleave within a line
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def log_epoch(self, epoch, **metrics):
+        '''Appends the metrics of one epoch, e.g. loss, psnr, ssim and the profile_metrics of the epoch'''
+        self._append({'type': 'epoch', 'epoch': epoch, 'metrics': metrics})
+
+    def finish(self, **metrics):
+        '''Appends the final metrics of the run'''
+        self._append({'type': 'result', 'metrics': metrics})
+
+
+def load_runs(path=TELEMETRY_PATH):
+    '''
+    Reads the telemetry store
+
+    Returns:
+        runs: dict from run id to the run header with its 'epochs' list and 'result' metrics, in the order
+            the runs started. Lines that cannot be parsed, e.g. from an interrupted write, are skipped
+    '''
+    runs = {}
+    if not os.path.exists(path):
+        return runs
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record['type'] == 'run':
+                runs[record['run_id']] = {**record, 'epochs': [], 'result': {}}
+            elif record['run_id'] in runs:
+                run = runs[record['run_id']]
+                if record['type'] == 'epoch':
+                    # metrics of one epoch can arrive in several records, e.g. validation finishing after training moved on
+                    epoch = next((e for e in run['epochs'] if e['epoch'] == record['epoch']), None)
+                    if epoch is None:
+                        run['epochs'].append({'epoch': record['epoch'], **record['metrics']})
+                    else:
+                        epoch.update(record['metrics'])
+                else:
+                    run['result'].update(record['metrics'])
+    return runs
+
+
+def run_metrics(run):
+    '''Returns the metrics of the last epoch of a run, overridden by its result record, with throughput averaged over epochs'''
+    metrics = dict(run['epochs'][-1]) if run['epochs'] else {}
+    for key in ['images_per_s', 'epoch_time_s', 'data_wait_fraction']:
+        values = [epoch[key] for epoch in run['epochs'] if key in epoch]
+        if values:
+            metrics[key] = statistics.mean(values)
+    if run['epochs']:
+        metrics['peak_rss_mb'] = max(epoch.get('peak_rss_mb', 0) for epoch in run['epochs'])
+    metrics.update(run['result'])
+    metrics.pop('epoch', None)
+    return metrics
+
+
+def find_regressions(runs, run_id=None, baseline_runs=5, relative_tolerance=0.1, psnr_tolerance=0.5, ssim_tolerance=0.01):
+    '''
+    Compares a run with the median of the previous runs of the same model and kind
+
+    Args:
+        runs: the output of load_runs
+        run_id: the run to check, the latest run if None
+        baseline_runs: how many previous runs form the baseline
+        relative_tolerance: allowed relative change of throughput, time, memory and loss metrics
+        psnr_tolerance: allowed drop of the PSNR in dB
+        ssim_tolerance: allowed drop of the SSIM
+
+    Returns:
+        run, rows: the checked run and one dict per metric present in both with its value, baseline,
+            change and whether it regressed
+    '''
+    run = runs[run_id] if run_id else list(runs.values())[-1]
+    previous = [r for r in runs.values() if r['model'] == run['model'] and r['kind'] == run['kind'] and r['time'] < run['time']]
+    previous = [run_metrics(r) for r in previous[-baseline_runs:]]
+    current = run_metrics(run)
+
+    rows = []
+    for metric, higher_is_better in METRICS.items():
+        history = [p[metric] for p in previous if metric in p]
+        if metric not in current or not history:
+            continue
+        baseline = statistics.median(history)
+        change = current[metric] - baseline
+        worse = -change if higher_is_better else change
+        if metric == 'psnr':
+            regressed = worse > psnr_tolerance
+        elif metric == 'ssim':
+            regressed = worse > ssim_tolerance
+        else:
+            regressed = baseline != 0 and worse / abs(baseline) > relative_tolerance
+        rows.append({'metric': metric, 'value': current[metric], 'baseline': baseline, 'change': change, 'regressed': regressed})
+    return run, rows
@@ -0,0 +1,163 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+
+import torch
+
+PHASES = ('data', 'h2d', 'forward', 'loss', 'backward', 'optimizer')
+
+
+def current_rss():
+    '''
+    Returns the resident memory of this process in bytes, read from /proc on Linux. Elsewhere it falls back
+    to the peak since start-up reported by getrusage, which is only an upper bound for later epochs
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def synchronize(device):
+    '''Waits for the kernels queued on the device, so the host clock measures their run time'''
+    device = torch.device(device)
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elif device.type == 'mps':
+        torch.mps.synchronize()
+
+
+def _batch_size(batch):
+    if isinstance(batch, torch.Tensor):
+        return len(batch)
+    if isinstance(batch, (list, tuple)) and batch:
+        return _batch_size(batch[0])
+    return 0
+
+
+class StepProfiler():
+    '''
+    Times the phases of every training iteration (data wait, host to device copy, forward, loss, backward and
+    optimizer step), samples the peak RSS in the background and summarises every epoch
+    '''
+
+    def __init__(self, device='cpu', trace_steps=None, trace_dir='console_outputs/traces', rss_interval=0.05):
+        '''
+        Creates the profiler
+
+        Args:
+            device: the training device, synchronised before every phase ends
+            trace_steps: optional (first, last) global steps captured with torch.profiler, last excluded
+            trace_dir: the directory the Chrome trace of the captured steps is written to
+            rss_interval: the seconds between two RSS samples
+        '''
+        self.device = device
+        self.trace_steps = trace_steps
+        self.trace_dir = trace_dir
+        self.rss_interval = rss_interval
+        self.step = 0
+        self.history = []
+        self._torch_profiler = None
+        self._sampler = None
+
+    # ------------------------------ Epochs ------------------------------- #
+    def start_epoch(self):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.steps, self.images = 0, 0
+        self.peak_rss = current_rss()
+        self.epoch_start = time.perf_counter()
+
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+        self._sampler.start()
+
+    def _sample_rss(self):
+        while not self._stop.wait(self.rss_interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def end_epoch(self):
+        '''
+        Returns:
+            summary: the seconds spent in every phase, their share of the epoch, the steps, images per second
+                and peak RSS in megabytes of the epoch. Also appended to history
+        '''
+        self._stop.set()
+        self._sampler.join()
+        wall = time.perf_counter() - self.epoch_start
+        summary = {
+            'epoch': len(self.history) + 1,
+            'wall_s': wall,
+            'steps': self.steps,
+            'images': self.images,
+            'images_per_s': self.images / wall if wall else 0.0,
+            'phases_s': dict(self.times),
+            'phase_fraction': {phase: t / wall for phase, t in self.times.items()} if wall else {},
+            'other_s': wall - sum(self.times.values()),
+            'peak_rss_mb': self.peak_rss / 1024 ** 2,
+        }
+        self.history.append(summary)
+        return summary
+
+    # ------------------------------ Phases ------------------------------- #
+    def iterate(self, loader):
+        '''Yields the batches of the loader, timing how long the loop waits for each of them'''
+        iterator = iter(loader)
+        while True:
+            self._update_trace()
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                break
+            self.times['data'] += time.perf_counter() - start
+            self.steps += 1
+            self.images += _batch_size(batch)
+            yield batch
+            self.step += 1
+        self._stop_trace()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Times the enclosed block as one of PHASES'''
+        start = time.perf_counter()
+        with torch.profiler.record_function(name) if self._torch_profiler else contextlib.nullcontext():
+            yield
+            synchronize(self.device)
+        self.times[name] += time.perf_counter() - start
+
+    # --------------------------- torch.profiler -------------------------- #
+    def _update_trace(self):
+        if not self.trace_steps:
+            return
+        first, last = self.trace_steps
+        if self.step == first and self._torch_profiler is None:
+            self._torch_profiler = torch.profiler.profile(record_shapes=True, profile_memory=True)
+            self._torch_profiler.start()
+        elif self.step == last:
+            self._stop_trace()
+
+    def _stop_trace(self):
+        if self._torch_profiler is None:
+            return
+        self._torch_profiler.stop()
+        os.makedirs(self.trace_dir, exist_ok=True)
+        path = os.path.join(self.trace_dir, f'steps_{self.trace_steps[0]}-{self.trace_steps[1]}.json')
+        self._torch_profiler.export_chrome_trace(path)
+        print(f'torch.profiler trace of steps {self.trace_steps[0]} to {self.trace_steps[1] - 1} written to {path}')
+        self._torch_profiler = None
+        self.trace_steps = None
+
+    # ------------------------------ Report ------------------------------- #
+    @staticmethod
+    def format_summary(summary):
+        '''Returns a one-line breakdown of an epoch summary'''
+        steps = max(summary['steps'], 1)
+        phases = ' | '.join(f'{phase} {t / steps * 1000:.0f} ms ({summary["phase_fraction"].get(phase, 0):.0%})'
+                            for phase, t in summary['phases_s'].items())
+        return (f'Per step: {phases} | other {summary["other_s"] / steps * 1000:.0f} ms\n'
+                f'{summary["images_per_s"]:.1f} images/s | peak RSS {summary["peak_rss_mb"]:.0f} MB')
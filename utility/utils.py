@@ -2,20 +2,35 @@ import os
 import numpy as np
 from PIL import Image
 import random
-import matplotlib.pyplot as plt
-import numpy as np
-import tqdm
 
 import torch
 import torch.nn as nn
-from torchvision import transforms
 from torch.utils.data import Dataset, DataLoader
-import torchvision.utils as vutils
-from skimage.metrics import structural_similarity
-from sklearn.model_selection import train_test_split
 from utility.noise import gaussian_blur, add_poisson_noise, add_salt_and_pepper_noise, add_speckle_noise
 from utility.noise_functions import *
 
+# matplotlib, skimage, sklearn, torchvision and tqdm are imported inside the functions that use
+# them, so loading a model to denoise an image does not pay for the plotting and metric libraries
+
+def split_data(data, test_size=0.2):
+    '''
+    Splits images into the train, validation and test sets of loadData, the remainder after the training
+    set is halved between validation and test
+
+    Args:
+        data: the images, in the order loadData lists them
+        test_size: the proportion of the data outside the training set
+
+    Returns:
+        data_train, data_val, data_test: the images of every set
+    '''
+    from sklearn.model_selection import train_test_split
+
+    data_train, data_rem = train_test_split(data, test_size=test_size, random_state=42)
+    data_val, data_test = train_test_split(data_rem, test_size=0.5, random_state=42)
+    return data_train, data_val, data_test
+
+
 class AutoencoderDataset(Dataset):
     '''Class defining the dataset for the autoencoder'''
 
@@ -68,7 +83,7 @@ class AutoencoderDataset(Dataset):
 
         return x.to(self.device), x.to(self.device)
 
-def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False):
+def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False, backend='png', num_workers=0, image_size=256, cache_dir=None):
     '''
     Loads the data from the given directory and returns the train and test loaders
 
@@ -77,23 +92,32 @@ def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False):
         batch_size: the batch size for the data loaders
         test_size: the proportion of the data to be assigned to the test set
         color: the color type of the images
+        noise: whether the input images are artificially noised
+        backend: 'png' decodes every image on every epoch, 'cache' reads a memory-mapped array of the resized
+            images and 'shards' streams tar shards of the encoded images, see utility/datasets.py
+        num_workers: the DataLoader worker processes, the batches stay on the CPU when they are used
+        image_size: the height and width the images are resized to
+        cache_dir: where the cache or shards are kept, <data_dir>_cache by default
     
     Returns:
         train_loader: the data loader for the training set
         test_loader: the data loader for the test set
     '''
+    from functools import partial
+    from torchvision import transforms
+
     # gaussian_noise = transforms.Lambda(lambda x: addGaussianNoiseTensor(x, mean = 0.1, std = 0.05))
     # sap_noise = transforms.Lambda(lambda x: addSaltPepperNoiseTensor(x, salt_prob = 0.015, pepper_prob = 0.015))
     # poisson_noise = transforms.Lambda(lambda x: addPoissonNoiseTensor(x, intensity=0.05))
     # speckle_noise = transforms.Lambda(lambda x: addSpeckleNoiseTensor(x, scale=0.4))
-    gaussian_noise = transforms.Lambda(lambda x: gaussian_blur(x, kernel_size=15, sigma=1))
-    sap_noise = transforms.Lambda(lambda x: add_salt_and_pepper_noise(x, salt_prob=0.05, pepper_prob=0.05))
-    poisson_noise = transforms.Lambda(lambda x: add_poisson_noise(x, 0.1))
-    speckle_noise = transforms.Lambda(lambda x: add_speckle_noise(x))
+    gaussian_noise = transforms.Lambda(partial(gaussian_blur, kernel_size=15, sigma=1))
+    sap_noise = transforms.Lambda(partial(add_salt_and_pepper_noise, salt_prob=0.05, pepper_prob=0.05))
+    poisson_noise = transforms.Lambda(partial(add_poisson_noise, noise_factor=0.1))
+    speckle_noise = transforms.Lambda(add_speckle_noise)
 
 
     transform = transforms.Compose([
-        transforms.Resize((256, 256)),
+        transforms.Resize((image_size, image_size)),
         transforms.ToTensor(),
         # transforms.Normalize(mean=[0.456], std=[0.229])
     ])
@@ -107,23 +131,38 @@ def loadData(data_dir, batch_size, test_size=0.2, color='gray', noise=False):
         ])
     else: transform_noise = None
 
+    if os.path.isdir(data_dir):
+        image_names = os.listdir(data_dir)
+    else:
+        # a cache written without the images, e.g. by make_phantoms.py --format cache
+        from utility.datasets import cache_path, cache_index
+        image_names = cache_index(cache_path(data_dir, image_size, cache_dir)) if backend == 'cache' else None
+        if image_names is None:
+            raise FileNotFoundError(f'No images in {data_dir}')
+
     data = []
-    for image_name in os.listdir(data_dir):
+    for image_name in image_names:
         image_path = os.path.join(data_dir, image_name)
         data.append(image_path)
 
-    data_train, data_rem = train_test_split(data, test_size=test_size, random_state=42)
-    data_val, data_test = train_test_split(data_rem, test_size=0.5, random_state=42)
-    device = getDevice()
+    data_train, data_val, data_test = split_data(data, test_size)
+    # worker processes return CPU tensors, the training loops move every batch to the device
+    device = getDevice() if num_workers == 0 else 'cpu'
 
     # ---------------------- Artificially Noised Images --------------------- #
-    train_dataset = AutoencoderDataset(data_train, device=device, color=color, transform=transform, transform_noise=transform_noise)
-    val_dataset = AutoencoderDataset(data_val, device=device, color=color, transform=transform, transform_noise=transform_noise)
-    test_dataset = AutoencoderDataset(data_test, device=device, color=color, transform=transform, transform_noise=transform_noise)
+    if backend == 'png':
+        train_dataset = AutoencoderDataset(data_train, device=device, color=color, transform=transform, transform_noise=transform_noise)
+        val_dataset = AutoencoderDataset(data_val, device=device, color=color, transform=transform, transform_noise=transform_noise)
+        test_dataset = AutoencoderDataset(data_test, device=device, color=color, transform=transform, transform_noise=transform_noise)
+    else:
+        from utility.datasets import backend_datasets
+        train_dataset, val_dataset, test_dataset = backend_datasets(
+            backend, data_dir, [data_train, data_val, data_test], image_size, color, transform, transform_noise, test_size, cache_dir)
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=0)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=0)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=0)
+    loader_args = dict(batch_size=batch_size, shuffle=False, pin_memory=False, num_workers=num_workers, persistent_workers=num_workers > 0)
+    train_loader = DataLoader(train_dataset, **loader_args)
+    val_loader = DataLoader(val_dataset, **loader_args)
+    test_loader = DataLoader(test_dataset, **loader_args)
 
     return train_loader, val_loader, test_loader
 
@@ -138,6 +177,9 @@ def showImages(dataloader, num_images=5):
     Returns:
         None
     '''
+    import matplotlib.pyplot as plt
+    import torchvision.utils as vutils
+
     data_iter = iter(dataloader)
     images, labels = next(data_iter)
 
@@ -171,6 +213,8 @@ def evaluate_model(model, dataloader, device='cpu'):
     Returns:
         average_loss: the average loss of the model on the dataset
     '''
+    import tqdm
+
     model.eval()
     total_loss = 0.0
     num_batches = 0
@@ -206,6 +250,8 @@ def PSNR(model, dataloader, device='cpu', loss_report=False, loss_criterion=None
     Returns:
         average_psnr: the average PSNR of the model on the dataset
     '''
+    import tqdm
+
     model.eval()
     total_psnr, total_loss = 0.0, 0.0
     num_batches = 0
@@ -218,7 +264,7 @@ def PSNR(model, dataloader, device='cpu', loss_report=False, loss_criterion=None
             outputs = model(modif)
 
             if loss_report:
-                total_loss += loss_criterion(outputs, actual).item()
+                total_loss += loss_criterion(outputs, actual.to(device)).item()
             actual = (actual * 255).to(torch.uint8).to(device)
             outputs = (outputs * 255).to(torch.uint8).to(device)
 
@@ -226,7 +272,7 @@ def PSNR(model, dataloader, device='cpu', loss_report=False, loss_criterion=None
                 highest = torch.max(actual, dim = (1, 2)).item()
             else: highest = torch.max(actual).item()
 
-            mse = nn.functional.mse_loss(outputs, actual)
+            mse = nn.functional.mse_loss(outputs.float(), actual.float())
             psnr = 10 * torch.log10((highest ** 2) / mse)
             total_psnr += psnr.item()
             num_batches += 1
@@ -237,6 +283,29 @@ def PSNR(model, dataloader, device='cpu', loss_report=False, loss_criterion=None
         return average_loss, average_psnr
     return average_psnr
 
+def seeded_PSNR(model, dataloader, device='cpu', seed=0):
+    '''
+    PSNR with the noise of the inputs drawn from seeded torch and numpy generators, whose states are restored
+    afterwards, so successive calls differ only by the model and training keeps its own random stream
+
+    Args:
+        model: the model to generate images
+        dataloader: the dataloader to provide the dataset, without workers so the noise is drawn here
+        device: the device to run the model on
+        seed: the seed of the noise
+
+    Returns:
+        average_psnr: the average PSNR of the model on the dataset
+    '''
+    torch_state, numpy_state = torch.get_rng_state(), np.random.get_state()
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    try:
+        return PSNR(model, dataloader, device)
+    finally:
+        torch.set_rng_state(torch_state)
+        np.random.set_state(numpy_state)
+
 def SSIM(model, dataloader, device='cpu', loss_report=False, loss_criterion=None):
     '''
     Generates images using the model and returns the average SSIM of the images
@@ -249,6 +318,9 @@ def SSIM(model, dataloader, device='cpu', loss_report=False, loss_criterion=None
     Returns:
         average_ssim: the average SSIM of the model on the dataset
     '''
+    from skimage.metrics import structural_similarity
+    import tqdm
+
     model.eval()
     total_ssim, total_loss = 0.0, 0.0
     num_batches = 0
@@ -262,7 +334,7 @@ def SSIM(model, dataloader, device='cpu', loss_report=False, loss_criterion=None
             # Forward pass
             outputs = model(modif)
             if loss_report:
-                total_loss += loss_criterion(outputs, actual).item()
+                total_loss += loss_criterion(outputs, actual.to(device)).item()
             actual = actual.cpu().squeeze().numpy()
             outputs = outputs.cpu().squeeze().numpy()
             
@@ -290,6 +362,9 @@ def generate_images(model, dataloader, n, device='cpu', path=None):
     Returns:
         generated_images: the output images generated by the model
     '''
+    import matplotlib.pyplot as plt
+    import tqdm
+
     model.eval()
     original_images =[]
     generated_images = []
@@ -341,6 +416,8 @@ def create_output(model, input_image, device='cpu', path=None):
     Returns:
         0
     '''
+    import matplotlib.pyplot as plt
+
     model.eval()
     with torch.no_grad():
         input_image = input_image.to(device)